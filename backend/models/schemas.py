@@ -61,6 +61,7 @@ class WebsiteContent(BaseModel):
 class BlogPost(BaseModel):
     title: str
     content: str
+    contentFormat: str = "html"  # or "markdown"
     excerpt: Optional[str] = ""
     author: str = "Admin"
     category: str = "General"
@@ -71,6 +72,11 @@ class BlogPost(BaseModel):
 class BlogPostInDB(BlogPost):
     id: Optional[str] = None
     slug: Optional[str] = None
+    contentHtml: Optional[str] = None
+    readingTime: Optional[int] = None
+    toc: List[dict] = []
+    renderVersion: Optional[int] = None
+    views: int = 0
     createdAt: Optional[datetime] = None
     updatedAt: Optional[datetime] = None
 
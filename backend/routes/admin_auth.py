@@ -25,6 +25,13 @@ def verify_token(token: str):
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+def get_admin_from_request(request: Request):
+    """Token payload of the admin calling this endpoint, or 401"""
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="No token provided")
+    return verify_token(auth_header.replace("Bearer ", ""))
+
 @router.post("/login")
 async def admin_login(request: Request):
     db = request.app.state.db
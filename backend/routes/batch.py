@@ -0,0 +1,115 @@
+from fastapi import APIRouter, HTTPException, Request
+from datetime import datetime
+from urllib.parse import unquote, urlsplit
+import asyncio
+import orjson
+from routes.client_dashboard import verify_token
+from utils.responses import MongoJSONResponse
+
+router = APIRouter()
+
+MAX_BATCH_REQUESTS = 20
+
+def _sub_scope(request, path, query_string, state):
+    parent = request.scope
+    return {
+        "type": "http",
+        "asgi": parent.get("asgi", {"version": "3.0"}),
+        "http_version": parent.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": parent.get("scheme", "http"),
+        "path": unquote(path),
+        "raw_path": path.encode(),
+        "root_path": parent.get("root_path", ""),
+        "query_string": query_string.encode(),
+        "headers": [(name, value) for name, value in parent["headers"] if name not in (b"content-length", b"content-type")],
+        "client": parent.get("client"),
+        "server": parent.get("server"),
+        "app": request.app,
+        "state": state,
+    }
+
+async def _dispatch(request, path, query_string, state):
+    """Run one GET through the full middleware stack and collect its response"""
+    status = None
+    content_type = b""
+    chunks = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, content_type
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await request.app.middleware_stack(_sub_scope(request, path, query_string, dict(state)), receive, send)
+    except Exception as e:
+        # ServerErrorMiddleware has already sent the 500 and re-raises for the server to log
+        print(f"✗ Batch sub-request {path} failed: {e}")
+        if status is None:
+            return 500, {"detail": "Internal Server Error"}
+    body = b"".join(chunks)
+    if not body:
+        return status, None
+    if content_type.startswith(b"application/json"):
+        return status, orjson.loads(body)
+    return status, body.decode("utf-8", "replace")
+
+@router.post("/")
+async def batch(request: Request):
+    """Run several GET requests in one round trip.
+
+    Body: {"requests": [{"id": "overview", "path": "/api/dashboard/overview"},
+                        {"id": "logs", "path": "/api/dashboard/activity-logs?limit=20"}]}
+    Sub-requests run concurrently with the batch's Authorization header, which
+    is verified once. Identical paths run once, and dashboard handlers share
+    the queries they have in common. Each item comes back with its own status.
+    """
+    data = await request.json()
+    items = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="requests must be a non-empty list")
+    if len(items) > MAX_BATCH_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_REQUESTS} requests per batch")
+
+    targets = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+            raise HTTPException(status_code=400, detail=f"requests[{index}] needs a path")
+        if item.get("method", "GET").upper() != "GET":
+            raise HTTPException(status_code=400, detail=f"requests[{index}]: only GET can be batched")
+        url = urlsplit(item["path"])
+        if url.scheme or url.netloc or not url.path.startswith("/api/") or url.path.rstrip("/") == "/api/batch":
+            raise HTTPException(status_code=400, detail=f"requests[{index}]: path must be an /api/ path other than /api/batch")
+        targets.append((item.get("id", str(index)), url.path, url.query))
+
+    state = {"batch_now": datetime.utcnow(), "batch_memo": {}}
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer "):
+        try:
+            state["user"] = verify_token(auth_header[len("Bearer "):])
+        except HTTPException:
+            # Not a client token (or an invalid one): each sub-request authenticates itself
+            pass
+
+    runs = {}
+    for _, path, query in targets:
+        if (path, query) not in runs:
+            runs[(path, query)] = asyncio.ensure_future(_dispatch(request, path, query, state))
+    await asyncio.gather(*runs.values())
+
+    responses = []
+    for item_id, path, query in targets:
+        status, body = runs[(path, query)].result()
+        responses.append({"id": item_id, "status": status, "body": body})
+    return MongoJSONResponse({"responses": responses})
@@ -1,20 +1,30 @@
 from fastapi import APIRouter, HTTPException, Request
 from datetime import datetime
 from bson import ObjectId
-import re
+from pymongo import ReturnDocument
+from utils import stats
+from utils.slugs import slug_registry
+from utils.render import render_post_async, CONTENT_FORMATS, DEFAULT_CONTENT_FORMAT
+from utils.counters import view_counter, decayed_score
+from utils.responses import MongoJSONResponse, find_page, public_id
+import time
 
-router = APIRouter()
+RENDERED_FIELDS = ["contentHtml", "readingTime", "toc", "renderVersion"]
+COUNTER_FIELDS = ["views", "trending", "lastViewedAt"]
+
+# This router is also mounted under /api/admin/blog; only reads here are views
+PUBLIC_PREFIX = "/api/blog/"
 
-def slugify(text):
-    text = text.lower()
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '-', text)
-    return text.strip('-')
+TRENDING_CACHE_SECONDS = 30
+TRENDING_CANDIDATES = 500
+_trending_cache = {"expires": 0, "posts": []}
+
+router = APIRouter()
 
-async def get_blog_stats(db):
-    total = await db.blog_posts.count_documents({})
-    published = await db.blog_posts.count_documents({"status": "published"})
-    return {"total": total, "published": published}
+def check_content_format(content_format):
+    if content_format not in CONTENT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"contentFormat must be one of: {', '.join(CONTENT_FORMATS)}")
+    return content_format
 
 @router.get("/")
 async def get_posts(request: Request, status: str = None, limit: int = 10, offset: int = 0):
@@ -24,40 +34,78 @@ async def get_posts(request: Request, status: str = None, limit: int = 10, offse
     if status:
         query["status"] = status
     
-    cursor = db.blog_posts.find(query).sort("createdAt", -1).skip(offset).limit(limit)
-    posts = await cursor.to_list(length=limit)
+    posts = await find_page(db.blog_posts, query, {"createdAt": -1}, offset, limit)
     total = await db.blog_posts.count_documents(query)
     
-    # Convert ObjectId to string
-    for post in posts:
-        post["id"] = str(post.pop("_id"))
+    return MongoJSONResponse({"posts": posts, "total": total, "hasMore": offset + limit < total})
+
+@router.get("/trending")
+async def get_trending_posts(request: Request, limit: int = 5):
+    db = request.app.state.db
     
-    return {"posts": posts, "total": total, "hasMore": offset + limit < total}
+    if _trending_cache["expires"] < time.monotonic():
+        # Recently viewed posts are the only ones whose decayed score can still be high
+        cursor = db.blog_posts.find(
+            {"status": "published", "trending.updatedAt": {"$exists": True}},
+            {"content": 0, "contentHtml": 0, "toc": 0}
+        ).sort("trending.updatedAt", -1).limit(TRENDING_CANDIDATES)
+        candidates = await cursor.to_list(length=TRENDING_CANDIDATES)
+        
+        now = datetime.utcnow()
+        for post in candidates:
+            public_id(post)
+            post["trendingScore"] = round(decayed_score(post.pop("trending"), now), 4)
+        candidates.sort(key=lambda post: post["trendingScore"], reverse=True)
+        
+        _trending_cache["posts"] = candidates
+        _trending_cache["expires"] = time.monotonic() + TRENDING_CACHE_SECONDS
+    
+    return {"posts": _trending_cache["posts"][:limit]}
 
 @router.get("/{post_id}")
 async def get_post(post_id: str, request: Request):
     db = request.app.state.db
     
-    try:
+    post = None
+    if ObjectId.is_valid(post_id):
         post = await db.blog_posts.find_one({"_id": ObjectId(post_id)})
-    except:
-        post = await db.blog_posts.find_one({"slug": post_id})
+    
+    if not post:
+        target = await slug_registry.resolve(db, post_id)
+        if target:
+            post = await db.blog_posts.find_one({"_id": target})
+            if not post:
+                # Cached entry went stale (post deleted elsewhere); re-check the registry once
+                target = await slug_registry.resolve(db, post_id, refresh=True)
+                if target:
+                    post = await db.blog_posts.find_one({"_id": target})
     
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    post["id"] = str(post.pop("_id"))
-    return {"post": post}
+    public_id(post)
+    if post.get("status") == "published" and request.url.path.startswith(PUBLIC_PREFIX):
+        view_counter.record(post["id"])
+    response = {"post": post}
+    if post_id != post["id"] and post_id != post.get("slug"):
+        # Old slug from before a title change
+        response["redirectTo"] = post.get("slug")
+    return response
 
 @router.post("/")
 async def create_post(request: Request):
     db = request.app.state.db
     data = await request.json()
     
+    post_id = ObjectId()
+    slug = await slug_registry.claim(db, post_id, data.get("title") or "")
+    
     post_doc = {
+        "_id": post_id,
         "title": data.get("title"),
-        "slug": slugify(data.get("title", "")),
+        "slug": slug,
         "content": data.get("content", ""),
+        "contentFormat": check_content_format(data.get("contentFormat") or DEFAULT_CONTENT_FORMAT),
         "excerpt": data.get("excerpt", ""),
         "author": data.get("author", "Admin"),
         "category": data.get("category", "General"),
@@ -67,8 +115,10 @@ async def create_post(request: Request):
         "createdAt": datetime.utcnow(),
         "updatedAt": datetime.utcnow()
     }
+    post_doc.update(await render_post_async(post_doc["content"], post_doc["contentFormat"]))
     
     result = await db.blog_posts.insert_one(post_doc)
+    await stats.record_change(db, "blog", None, post_doc)
     post_doc["id"] = str(result.inserted_id)
     if "_id" in post_doc:
         del post_doc["_id"]
@@ -80,28 +130,55 @@ async def update_post(post_id: str, request: Request):
     db = request.app.state.db
     data = await request.json()
     
-    update_data = {k: v for k, v in data.items() if k not in ["_id", "id"]}
+    update_data = {k: v for k, v in data.items() if k not in ["_id", "id", *RENDERED_FIELDS, *COUNTER_FIELDS]}
     update_data["updatedAt"] = datetime.utcnow()
-    if "title" in update_data:
-        update_data["slug"] = slugify(update_data["title"])
     
-    result = await db.blog_posts.update_one(
-        {"_id": ObjectId(post_id)},
-        {"$set": update_data}
+    if "contentFormat" in update_data:
+        check_content_format(update_data["contentFormat"])
+    # Re-rendering needs whichever of content / contentFormat the update leaves as it is
+    projection = {"_id": 1, "contentFormat": 1}
+    if "contentFormat" in update_data and "content" not in update_data:
+        projection["content"] = 1
+    existing = await db.blog_posts.find_one({"_id": ObjectId(post_id)}, projection)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Post not found")
+    
+    # Previous slugs stay registered as redirects to this post
+    if "title" in update_data:
+        update_data["slug"] = await slug_registry.claim(db, existing["_id"], update_data["title"] or "")
+    elif update_data.get("slug"):
+        update_data["slug"] = await slug_registry.claim(db, existing["_id"], update_data["slug"])
+    
+    if "content" in update_data or "contentFormat" in update_data:
+        update_data.update(await render_post_async(
+            update_data.get("content", existing.get("content", "")),
+            update_data.get("contentFormat", existing.get("contentFormat"))
+        ))
+    
+    before = await db.blog_posts.find_one_and_update(
+        {"_id": existing["_id"]},
+        {"$set": update_data},
+        projection={"status": 1},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="Post not found")
     
+    await stats.record_change(db, "blog", before, stats.apply_set(before, update_data))
+    
     return {"message": "Post updated"}
 
 @router.delete("/{post_id}")
 async def delete_post(post_id: str, request: Request):
     db = request.app.state.db
     
-    result = await db.blog_posts.delete_one({"_id": ObjectId(post_id)})
+    deleted = await db.blog_posts.find_one_and_delete({"_id": ObjectId(post_id)}, projection={"status": 1})
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Post not found")
     
+    await stats.record_change(db, "blog", deleted, None)
+    await slug_registry.release(db, ObjectId(post_id))
+    
     return {"message": "Post deleted"}
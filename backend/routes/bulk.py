@@ -0,0 +1,166 @@
+from fastapi import APIRouter, HTTPException, Request
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+from routes.admin_auth import get_admin_from_request
+from utils import stats
+from utils.importer import normalize_email
+from utils.slugs import slug_registry
+from utils.search import admin_search
+
+router = APIRouter()
+
+MAX_BULK_ITEMS = 1000
+
+# URL name -> collection, the fields a filter may match on and the fields an update may set.
+# Fields derived from others (slugs, rendered HTML, view counters) are never bulk-editable.
+BULK_COLLECTIONS = {
+    "demo-requests": {
+        "collection": "demo_requests",
+        "stats": "demoRequests",
+        "search": "demoRequest",
+        "filter": {"status", "priority", "email", "company", "companySize"},
+        "update": {"status", "priority"}
+    },
+    "clients": {
+        "collection": "client_companies",
+        "stats": "clients",
+        "search": "client",
+        "filter": {"isActive", "subscription", "industry"},
+        "update": {"isActive", "subscription", "industry", "services"}
+    },
+    "blog": {
+        "collection": "blog_posts",
+        "stats": "blog",
+        "filter": {"status", "category", "author", "tags"},
+        "update": {"status", "category", "author", "tags", "featuredImage"}
+    },
+    "notifications": {
+        "collection": "notifications",
+        "stats": None,
+        "filter": {"userId", "type", "read"},
+        "update": {"read", "type"}
+    }
+}
+
+def parse_filter(spec, raw):
+    """Equality (or {"$in": [...]}) matches on whitelisted fields only"""
+    if not isinstance(raw, dict) or not raw:
+        raise HTTPException(status_code=400, detail="filter must be a non-empty object")
+    query = {}
+    for field, value in raw.items():
+        if field not in spec["filter"]:
+            raise HTTPException(status_code=400, detail=f"Cannot filter on '{field}'. Allowed: {', '.join(sorted(spec['filter']))}")
+        if isinstance(value, dict):
+            if list(value) != ["$in"] or not isinstance(value["$in"], list):
+                raise HTTPException(status_code=400, detail=f"Only equality or $in is supported for '{field}'")
+        if field == "email":
+            # Stored normalised, so match the same way
+            value = {"$in": [normalize_email(v) for v in value["$in"]]} if isinstance(value, dict) else normalize_email(value)
+        query[field] = value
+    return query
+
+def parse_update(spec, raw):
+    if not isinstance(raw, dict) or not raw:
+        raise HTTPException(status_code=400, detail="set must be a non-empty object")
+    not_allowed = set(raw) - spec["update"]
+    if not_allowed:
+        raise HTTPException(status_code=400, detail=f"Cannot bulk-update {', '.join(sorted(not_allowed))}. Allowed: {', '.join(sorted(spec['update']))}")
+    return {**raw, "updatedAt": datetime.utcnow()}
+
+async def resolve_targets(db, collection, data, spec):
+    """Target ObjectIds plus per-item results for ids that could not be used"""
+    results = []
+    if "ids" in data:
+        ids = data["ids"]
+        if not isinstance(ids, list) or not ids:
+            raise HTTPException(status_code=400, detail="ids must be a non-empty list")
+        if len(ids) > MAX_BULK_ITEMS:
+            raise HTTPException(status_code=400, detail=f"Too many ids. Maximum is {MAX_BULK_ITEMS} per request")
+        valid = []
+        for item_id in dict.fromkeys(str(i) for i in ids):
+            if ObjectId.is_valid(item_id):
+                valid.append(ObjectId(item_id))
+            else:
+                results.append({"id": item_id, "status": "error", "error": "Invalid id"})
+        cursor = db[collection].find({"_id": {"$in": valid}}, {"_id": 1})
+        found = {doc["_id"] for doc in await cursor.to_list(length=None)}
+        results.extend({"id": str(oid), "status": "error", "error": "Not found"} for oid in valid if oid not in found)
+        return [oid for oid in valid if oid in found], results
+
+    if "filter" in data:
+        query = parse_filter(spec, data["filter"])
+        cursor = db[collection].find(query, {"_id": 1}).limit(MAX_BULK_ITEMS + 1)
+        targets = [doc["_id"] for doc in await cursor.to_list(length=None)]
+        if len(targets) > MAX_BULK_ITEMS:
+            raise HTTPException(status_code=400, detail=f"Filter matches more than {MAX_BULK_ITEMS} documents; narrow it or send ids")
+        return targets, results
+
+    raise HTTPException(status_code=400, detail="Send either ids or filter")
+
+@router.post("/{name}")
+async def bulk_operation(name: str, request: Request):
+    """Update or delete many documents of one admin collection in a single bulk_write.
+
+    Body: {"action": "update" | "delete", "ids": [...] or "filter": {...},
+    "set": {...} (for updates), "dryRun": bool}. Returns one result per item.
+    """
+    get_admin_from_request(request)
+    spec = BULK_COLLECTIONS.get(name)
+    if not spec:
+        raise HTTPException(status_code=404, detail=f"Unknown collection. Available: {', '.join(BULK_COLLECTIONS)}")
+
+    db = request.app.state.db
+    collection = spec["collection"]
+    data = await request.json()
+    action = data.get("action")
+    if action not in ("update", "delete"):
+        raise HTTPException(status_code=400, detail="action must be 'update' or 'delete'")
+    update_data = parse_update(spec, data.get("set")) if action == "update" else None
+
+    targets, results = await resolve_targets(db, collection, data, spec)
+
+    if data.get("dryRun"):
+        results.extend({"id": str(oid), "status": "wouldUpdate" if action == "update" else "wouldDelete"} for oid in targets)
+        return {"dryRun": True, "action": action, "matched": len(targets), "results": results}
+
+    if action == "update":
+        ops = [UpdateOne({"_id": oid}, {"$set": update_data}) for oid in targets]
+        done_status = "updated"
+    else:
+        ops = [DeleteOne({"_id": oid}) for oid in targets]
+        done_status = "deleted"
+
+    failed = {}
+    if ops:
+        try:
+            await db[collection].bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"]: error.get("errmsg", "Write failed") for error in e.details.get("writeErrors", [])}
+
+    succeeded = []
+    for index, oid in enumerate(targets):
+        if index in failed:
+            results.append({"id": str(oid), "status": "error", "error": failed[index]})
+        else:
+            results.append({"id": str(oid), "status": done_status})
+            succeeded.append(oid)
+
+    if succeeded and collection == "blog_posts" and action == "delete":
+        for oid in succeeded:
+            await slug_registry.release(db, oid)
+    if succeeded and spec.get("search"):
+        await admin_search.reload(db, spec["search"], succeeded)
+    if succeeded and spec["stats"]:
+        # Cheaper to recount once than to $inc per document
+        await stats.reconcile(db)
+
+    return {
+        "dryRun": False,
+        "action": action,
+        "matched": len(targets),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "results": results
+    }
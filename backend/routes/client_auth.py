@@ -4,6 +4,8 @@ import bcrypt
 import jwt
 import os
 import secrets
+from utils.high_water import insert_sequenced, notifications_mark
+from utils.search import admin_search
 
 router = APIRouter()
 
@@ -63,6 +65,7 @@ async def register(request: Request):
     
     result = await db.users.insert_one(user_doc)
     user_id = str(result.inserted_id)
+    admin_search.upsert("user", user_doc)
     
     # Generate email verification token
     verification_token = secrets.token_urlsafe(32)
@@ -74,14 +77,14 @@ async def register(request: Request):
     })
     
     # Create welcome notification
-    await db.notifications.insert_one({
+    await insert_sequenced(db.notifications, {
         "userId": user_id,
         "type": "success",
         "title": "Welcome to HavoSec!",
         "message": "Your account has been created. Please verify your email to access all features.",
         "read": False,
         "createdAt": datetime.utcnow()
-    })
+    }, notifications_mark(user_id))
     
     token = create_token(user_id)
     
@@ -132,14 +135,14 @@ async def login(request: Request):
         await db.users.update_one({"_id": user["_id"]}, {"$set": update})
         
         # Create failed login notification
-        await db.notifications.insert_one({
+        await insert_sequenced(db.notifications, {
             "userId": str(user["_id"]),
             "type": "warning",
             "title": "Failed Login Attempt",
             "message": f"Failed login attempt detected at {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC",
             "read": False,
             "createdAt": datetime.utcnow()
-        })
+        }, notifications_mark(str(user["_id"])))
         
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
@@ -153,14 +156,14 @@ async def login(request: Request):
     token = create_token(user_id)
     
     # Create login success notification
-    await db.notifications.insert_one({
+    await insert_sequenced(db.notifications, {
         "userId": user_id,
         "type": "info",
         "title": "New Login",
         "message": f"Successful login at {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC",
         "read": False,
         "createdAt": datetime.utcnow()
-    })
+    }, notifications_mark(user_id))
     
     return {
         "success": True,
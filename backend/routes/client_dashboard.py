@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
 from datetime import datetime, timedelta
 import jwt
 import os
 from bson import ObjectId
+from utils.batch import batch_user, request_now, shared_query
+from utils.high_water import EVENTS_MARK, current_cursor, find_since
+from utils.responses import MongoJSONResponse, find_page
 
 router = APIRouter()
 
@@ -18,30 +21,37 @@ def verify_token(token: str):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 def get_user_from_request(request: Request):
+    payload = batch_user(request)
+    if payload is not None:
+        return payload
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Access denied. No token provided.")
     token = auth_header.replace("Bearer ", "")
     return verify_token(token)
 
+async def count_events(request: Request, query: dict):
+    """count_documents on security_events, run once per batch for the same query"""
+    db = request.app.state.db
+    return await shared_query(request, ("security_events.count", repr(query)), lambda: db.security_events.count_documents(query))
+
 @router.get("/overview")
 async def get_overview(request: Request):
     payload = get_user_from_request(request)
-    db = request.app.state.db
     
-    now = datetime.utcnow()
+    now = request_now(request)
     last_24h = now - timedelta(hours=24)
     last_7d = now - timedelta(days=7)
     
-    total_events = await db.security_events.count_documents({})
-    events_24h = await db.security_events.count_documents({"createdAt": {"$gte": last_24h}})
-    events_7d = await db.security_events.count_documents({"createdAt": {"$gte": last_7d}})
-    critical_events = await db.security_events.count_documents({"severity": "critical", "createdAt": {"$gte": last_7d}})
-    blocked_attacks = await db.security_events.count_documents({"status": "blocked", "createdAt": {"$gte": last_24h}})
+    total_events = await count_events(request, {})
+    events_24h = await count_events(request, {"createdAt": {"$gte": last_24h}})
+    events_7d = await count_events(request, {"createdAt": {"$gte": last_7d}})
+    critical_events = await count_events(request, {"severity": "critical", "createdAt": {"$gte": last_7d}})
+    blocked_attacks = await count_events(request, {"status": "blocked", "createdAt": {"$gte": last_24h}})
     
     # Calculate trends
     prev_week_start = last_7d - timedelta(days=7)
-    prev_week_events = await db.security_events.count_documents({
+    prev_week_events = await count_events(request, {
         "createdAt": {"$gte": prev_week_start, "$lt": last_7d}
     })
     
@@ -110,13 +120,12 @@ async def get_attack_insights(request: Request, period: str = "7d"):
 @router.get("/defense-metrics")
 async def get_defense_metrics(request: Request):
     payload = get_user_from_request(request)
-    db = request.app.state.db
     
-    last_7d = datetime.utcnow() - timedelta(days=7)
+    last_7d = request_now(request) - timedelta(days=7)
     
-    total_blocked = await db.security_events.count_documents({"status": "blocked", "createdAt": {"$gte": last_7d}})
-    total_detected = await db.security_events.count_documents({"createdAt": {"$gte": last_7d}})
-    mitigation_rate = await db.security_events.count_documents({
+    total_blocked = await count_events(request, {"status": "blocked", "createdAt": {"$gte": last_7d}})
+    total_detected = await count_events(request, {"createdAt": {"$gte": last_7d}})
+    mitigation_rate = await count_events(request, {
         "status": {"$in": ["blocked", "resolved"]},
         "createdAt": {"$gte": last_7d}
     })
@@ -136,7 +145,12 @@ async def get_defense_metrics(request: Request):
     }
 
 @router.get("/activity-logs")
-async def get_activity_logs(request: Request, page: int = 1, limit: int = 50, eventType: str = None, severity: str = None):
+async def get_activity_logs(request: Request, page: int = 1, limit: int = 50, eventType: str = None, severity: str = None, since: str = None):
+    """A page of security events, newest first.
+
+    With `since` (the `cursor` from an earlier response) only events inserted
+    after it are returned, oldest first, or 204 when there are none.
+    """
     payload = get_user_from_request(request)
     db = request.app.state.db
     
@@ -146,18 +160,22 @@ async def get_activity_logs(request: Request, page: int = 1, limit: int = 50, ev
     if severity:
         query["severity"] = severity
     
-    skip = (page - 1) * limit
-    cursor = db.security_events.find(query).sort("createdAt", -1).skip(skip).limit(limit)
-    logs = await cursor.to_list(length=limit)
-    total = await db.security_events.count_documents(query)
+    if since is not None:
+        delta = await find_since(db.security_events, EVENTS_MARK, query, since, limit)
+        if delta is None:
+            return Response(status_code=204)
+        logs, cursor, has_more = delta
+        return MongoJSONResponse({"activityLogs": logs, "cursor": cursor, "hasMore": has_more})
     
-    for log in logs:
-        log["id"] = str(log.pop("_id"))
-        if "createdAt" in log:
-            log["createdAt"] = log["createdAt"].isoformat()
+    # Read the mark first: anything inserted while the page loads is newer than the cursor
+    cursor = await current_cursor(db.security_events, EVENTS_MARK)
+    skip = (page - 1) * limit
+    logs = await find_page(db.security_events, query, {"createdAt": -1}, skip, limit)
+    total = await count_events(request, query)
     
-    return {
+    return MongoJSONResponse({
         "activityLogs": logs,
+        "cursor": cursor,
         "pagination": {
             "currentPage": page,
             "totalPages": (total + limit - 1) // limit,
@@ -165,7 +183,7 @@ async def get_activity_logs(request: Request, page: int = 1, limit: int = 50, ev
             "hasNextPage": page * limit < total,
             "hasPrevPage": page > 1
         }
-    }
+    })
 
 @router.get("/system-health")
 async def get_system_health(request: Request):
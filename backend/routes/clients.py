@@ -1,26 +1,23 @@
 from fastapi import APIRouter, HTTPException, Request
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from utils import stats
+from utils.importer import normalize_email
+from utils.search import admin_search
+from utils.responses import MongoJSONResponse, find_page, public_id
 
 router = APIRouter()
 
-async def get_client_stats(db):
-    total = await db.client_companies.count_documents({})
-    active = await db.client_companies.count_documents({"isActive": True})
-    return {"total": total, "active": active}
-
 @router.get("/")
 async def get_clients(request: Request, limit: int = 50, offset: int = 0):
     db = request.app.state.db
     
-    cursor = db.client_companies.find({}).sort("createdAt", -1).skip(offset).limit(limit)
-    clients = await cursor.to_list(length=limit)
+    clients = await find_page(db.client_companies, {}, {"createdAt": -1}, offset, limit)
     total = await db.client_companies.count_documents({})
     
-    for client in clients:
-        client["id"] = str(client.pop("_id"))
-    
-    return {"clients": clients, "total": total}
+    return MongoJSONResponse({"clients": clients, "total": total})
 
 @router.get("/{client_id}")
 async def get_client(client_id: str, request: Request):
@@ -30,8 +27,7 @@ async def get_client(client_id: str, request: Request):
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    client["id"] = str(client.pop("_id"))
-    return client
+    return public_id(client)
 
 @router.post("/")
 async def create_client(request: Request):
@@ -40,7 +36,7 @@ async def create_client(request: Request):
     
     client_doc = {
         "name": data.get("name"),
-        "email": data.get("email"),
+        "email": normalize_email(data.get("email")),
         "phone": data.get("phone"),
         "industry": data.get("industry"),
         "subscription": data.get("subscription", "basic"),
@@ -49,7 +45,12 @@ async def create_client(request: Request):
         "createdAt": datetime.utcnow()
     }
     
-    result = await db.client_companies.insert_one(client_doc)
+    try:
+        result = await db.client_companies.insert_one(client_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A client with this email already exists")
+    await stats.record_change(db, "clients", None, client_doc)
+    admin_search.upsert("client", client_doc)
     client_doc["id"] = str(result.inserted_id)
     
     return {"message": "Client created", "client": client_doc}
@@ -60,25 +61,38 @@ async def update_client(client_id: str, request: Request):
     data = await request.json()
     
     update_data = {k: v for k, v in data.items() if k not in ["_id", "id"]}
+    if "email" in update_data:
+        update_data["email"] = normalize_email(update_data["email"])
     update_data["updatedAt"] = datetime.utcnow()
     
-    result = await db.client_companies.update_one(
-        {"_id": ObjectId(client_id)},
-        {"$set": update_data}
-    )
+    try:
+        before = await db.client_companies.find_one_and_update(
+            {"_id": ObjectId(client_id)},
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A client with this email already exists")
     
-    if result.matched_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="Client not found")
     
+    after = stats.apply_set(before, update_data)
+    await stats.record_change(db, "clients", before, after)
+    admin_search.upsert("client", after)
+    
     return {"message": "Client updated"}
 
 @router.delete("/{client_id}")
 async def delete_client(client_id: str, request: Request):
     db = request.app.state.db
     
-    result = await db.client_companies.delete_one({"_id": ObjectId(client_id)})
+    deleted = await db.client_companies.find_one_and_delete({"_id": ObjectId(client_id)})
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Client not found")
     
+    await stats.record_change(db, "clients", deleted, None)
+    admin_search.remove("client", deleted["_id"])
+    
     return {"message": "Client deleted"}
@@ -1,14 +1,14 @@
 from fastapi import APIRouter, HTTPException, Request
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+from utils import stats
+from utils.importer import normalize_email
+from utils.search import admin_search
+from utils.responses import MongoJSONResponse, find_page, public_id
 
 router = APIRouter()
 
-async def get_demo_stats(db):
-    total = await db.demo_requests.count_documents({})
-    pending = await db.demo_requests.count_documents({"status": "new"})
-    return {"total": total, "pending": pending}
-
 @router.get("/")
 async def get_demo_requests(request: Request, status: str = None, limit: int = 50, offset: int = 0):
     db = request.app.state.db
@@ -17,14 +17,10 @@ async def get_demo_requests(request: Request, status: str = None, limit: int = 5
     if status:
         query["status"] = status
     
-    cursor = db.demo_requests.find(query).sort("createdAt", -1).skip(offset).limit(limit)
-    requests = await cursor.to_list(length=limit)
+    requests = await find_page(db.demo_requests, query, {"createdAt": -1}, offset, limit)
     total = await db.demo_requests.count_documents(query)
     
-    for req in requests:
-        req["id"] = str(req.pop("_id"))
-    
-    return {"requests": requests, "total": total}
+    return MongoJSONResponse({"requests": requests, "total": total})
 
 @router.get("/{request_id}")
 async def get_demo_request(request_id: str, request: Request):
@@ -34,8 +30,7 @@ async def get_demo_request(request_id: str, request: Request):
     if not demo_req:
         raise HTTPException(status_code=404, detail="Demo request not found")
     
-    demo_req["id"] = str(demo_req.pop("_id"))
-    return demo_req
+    return public_id(demo_req)
 
 @router.post("/")
 async def create_demo_request(request: Request):
@@ -45,7 +40,7 @@ async def create_demo_request(request: Request):
     demo_doc = {
         "firstName": data.get("firstName"),
         "lastName": data.get("lastName"),
-        "email": data.get("email"),
+        "email": normalize_email(data.get("email")),
         "company": data.get("company"),
         "phone": data.get("phone"),
         "message": data.get("message"),
@@ -56,6 +51,8 @@ async def create_demo_request(request: Request):
     }
     
     result = await db.demo_requests.insert_one(demo_doc)
+    await stats.record_change(db, "demoRequests", None, demo_doc)
+    admin_search.upsert("demoRequest", demo_doc)
     
     return {
         "message": "Demo request submitted successfully",
@@ -69,25 +66,35 @@ async def update_demo_request(request_id: str, request: Request):
     data = await request.json()
     
     update_data = {k: v for k, v in data.items() if k not in ["_id", "id"]}
+    if "email" in update_data:
+        update_data["email"] = normalize_email(update_data["email"])
     update_data["updatedAt"] = datetime.utcnow()
     
-    result = await db.demo_requests.update_one(
+    before = await db.demo_requests.find_one_and_update(
         {"_id": ObjectId(request_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="Demo request not found")
     
+    after = stats.apply_set(before, update_data)
+    await stats.record_change(db, "demoRequests", before, after)
+    admin_search.upsert("demoRequest", after)
+    
     return {"message": "Demo request updated"}
 
 @router.delete("/{request_id}")
 async def delete_demo_request(request_id: str, request: Request):
     db = request.app.state.db
     
-    result = await db.demo_requests.delete_one({"_id": ObjectId(request_id)})
+    deleted = await db.demo_requests.find_one_and_delete({"_id": ObjectId(request_id)})
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Demo request not found")
     
+    await stats.record_change(db, "demoRequests", deleted, None)
+    admin_search.remove("demoRequest", deleted["_id"])
+    
     return {"message": "Demo request deleted"}
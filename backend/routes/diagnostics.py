@@ -0,0 +1,86 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+from routes.admin_auth import get_admin_from_request
+from utils.admission import admission
+from utils.profiler import profiler, profile_path
+from utils.query_log import query_log, SLOW_QUERY_MS
+import os
+
+router = APIRouter()
+
+QUERY_SORTS = {"total": "totalMs", "max": "maxMs", "count": "count", "slow": "slowCount"}
+
+@router.get("/queries")
+async def get_query_shapes(request: Request, sort: str = "total", limit: int = 20, flagged: bool = False):
+    """Query shapes ranked by total time (or max, count, slow), with explain flags"""
+    get_admin_from_request(request)
+    if sort not in QUERY_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(QUERY_SORTS)}")
+    return {"shapes": query_log.top(limit, QUERY_SORTS[sort], flagged), "slowQueryMs": SLOW_QUERY_MS}
+
+@router.get("/queries/slow")
+async def get_slow_queries(request: Request, limit: int = 50):
+    """Most recent commands over SLOW_QUERY_MS"""
+    get_admin_from_request(request)
+    return {"queries": list(query_log.slow)[-limit:][::-1], "slowQueryMs": SLOW_QUERY_MS}
+
+@router.post("/queries/explain")
+async def explain_queries(request: Request):
+    """Explain the costliest shapes now instead of waiting for the next periodic run"""
+    get_admin_from_request(request)
+    flagged = await query_log.explain_top()
+    return {"flagged": flagged, "shapes": query_log.top(20, "totalMs", True)}
+
+@router.delete("/queries")
+async def reset_query_shapes(request: Request):
+    get_admin_from_request(request)
+    query_log.reset()
+    return {"message": "Query statistics reset"}
+
+@router.get("/admission")
+async def get_admission(request: Request):
+    """Active and queued requests per admission class"""
+    get_admin_from_request(request)
+    return admission.status()
+
+@router.get("/profiler")
+async def get_profiler(request: Request):
+    get_admin_from_request(request)
+    return {**profiler.status(), "stored": await profiler.stored()}
+
+@router.put("/profiler")
+async def configure_profiler(request: Request):
+    """Switch request profiling on or off.
+
+    Body: {"enabled": true, "routePrefix": "/api/admin/", "maxRequests": 20, "sampleEvery": 0}
+    A single request can also be profiled by sending `X-Profile: <admin token>`.
+    """
+    get_admin_from_request(request)
+    data = await request.json()
+    max_requests = data.get("maxRequests")
+    sample_every = data.get("sampleEvery")
+    if max_requests is not None and (not isinstance(max_requests, int) or max_requests < 1):
+        raise HTTPException(status_code=400, detail="maxRequests must be a positive integer")
+    if sample_every is not None and (not isinstance(sample_every, int) or sample_every < 0):
+        raise HTTPException(status_code=400, detail="sampleEvery must be 0 (off) or a positive integer")
+    profiler.configure(bool(data.get("enabled")), data.get("routePrefix") or None, max_requests, sample_every)
+    return {**profiler.status(), "stored": await profiler.stored()}
+
+@router.get("/profiles")
+async def list_profiles(request: Request, limit: int = 50):
+    """Stored request profiles, newest first"""
+    get_admin_from_request(request)
+    return {"profiles": await profiler.list(limit)}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "speedscope"):
+    """A profile as speedscope JSON (open at speedscope.app) or collapsed stacks (flamegraph.pl)"""
+    get_admin_from_request(request)
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="format must be speedscope or collapsed")
+    path = profile_path(profile_id, format)
+    if not await profiler.find(profile_id) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "speedscope":
+        return FileResponse(path, media_type="application/json", filename=f"{profile_id}.speedscope.json")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.collapsed.txt")
@@ -0,0 +1,101 @@
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File
+from fastapi.responses import FileResponse
+from bson import ObjectId
+from starlette.concurrency import run_in_threadpool
+from routes.admin_auth import get_admin_from_request
+from utils import importer
+from utils.responses import public_id
+import asyncio
+import os
+
+router = APIRouter()
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Keep references so running imports aren't garbage-collected
+running_imports = set()
+
+def _write_chunk(out, chunk):
+    out.write(chunk)
+
+async def save_source(file: UploadFile, path):
+    """Copy the uploaded file to disk without holding it in memory"""
+    out = await run_in_threadpool(open, path, "wb")
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(_write_chunk, out, chunk)
+    finally:
+        await run_in_threadpool(out.close)
+
+async def run_job(db, job_id, path, target, fmt):
+    try:
+        await importer.run_import(db, job_id, path, target, fmt)
+    except Exception as e:
+        print(f"✗ Import {job_id} failed: {e}")
+    finally:
+        await run_in_threadpool(os.remove, path)
+
+def serialize_job(job):
+    public_id(job)
+    for field in ("createdAt", "startedAt", "updatedAt", "heartbeatAt", "finishedAt"):
+        if job.get(field):
+            job[field] = job[field].isoformat()
+    if job.get("errorReport"):
+        job["errorReportUrl"] = f"/api/admin/import/jobs/{job['id']}/errors"
+    return job
+
+async def get_job_or_404(db, job_id):
+    job = await db.import_jobs.find_one({"_id": ObjectId(job_id)}) if ObjectId.is_valid(job_id) else None
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@router.post("/{target}", status_code=202)
+async def start_import(target: str, request: Request, file: UploadFile = File(...), format: str = None):
+    """Start importing a CSV or NDJSON file of clients or demo requests.
+    
+    Rows are upserted by email. Poll the returned statusUrl for progress.
+    """
+    admin = get_admin_from_request(request)
+    if target not in importer.IMPORT_TARGETS:
+        raise HTTPException(status_code=404, detail=f"Unknown import target. Available: {', '.join(importer.IMPORT_TARGETS)}")
+    try:
+        fmt = importer.detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    db = request.app.state.db
+    job_id = await importer.create_job(db, target, file.filename, fmt, admin.get("email"))
+    path = importer.source_path(job_id)
+    await save_source(file, path)
+    
+    task = asyncio.create_task(run_job(db, job_id, path, target, fmt))
+    running_imports.add(task)
+    task.add_done_callback(running_imports.discard)
+    
+    return {"jobId": job_id, "state": "queued", "statusUrl": f"/api/admin/import/jobs/{job_id}"}
+
+@router.get("/jobs")
+async def list_import_jobs(request: Request, limit: int = 20):
+    get_admin_from_request(request)
+    cursor = request.app.state.db.import_jobs.find({}).sort("createdAt", -1).limit(limit)
+    jobs = await cursor.to_list(length=limit)
+    return {"jobs": [serialize_job(job) for job in jobs]}
+
+@router.get("/jobs/{job_id}")
+async def get_import_job(job_id: str, request: Request):
+    get_admin_from_request(request)
+    return serialize_job(await get_job_or_404(request.app.state.db, job_id))
+
+@router.get("/jobs/{job_id}/errors")
+async def get_import_errors(job_id: str, request: Request):
+    """NDJSON report of the rows that failed: {line, error, row} per line"""
+    get_admin_from_request(request)
+    await get_job_or_404(request.app.state.db, job_id)
+    path = importer.error_report_path(job_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No errors were recorded for this import")
+    return FileResponse(path, media_type="application/x-ndjson", filename=f"import-{job_id}-errors.ndjson")
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Request
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Request, Response
 from datetime import datetime
 from typing import Dict, List
 from bson import ObjectId
 import json
 import asyncio
+import jwt
+import os
+from utils.batch import batch_user
+from utils.high_water import current_cursor, find_since, insert_sequenced, notifications_mark
+from utils.responses import MongoJSONResponse, find_page
 
 router = APIRouter()
 
@@ -38,6 +43,20 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+def get_user_id(request: Request):
+    """Client user id from the Bearer token (or from the enclosing batch), or 401"""
+    payload = batch_user(request)
+    if payload is None:
+        auth_header = request.headers.get("Authorization", "")
+        if not auth_header.startswith("Bearer "):
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        token = auth_header.replace("Bearer ", "")
+        try:
+            payload = jwt.decode(token, os.environ.get("JWT_SECRET", "havosec-super-secret-jwt-key-2025"), algorithms=["HS256"])
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+    return payload.get("userId")
+
 # WebSocket endpoint for real-time notifications
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
@@ -54,46 +73,41 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
 # REST endpoints for notifications
 
 @router.get("/")
-async def get_notifications(request: Request, limit: int = 50, unread_only: bool = False):
-    """Get user notifications"""
+async def get_notifications(request: Request, limit: int = 50, unread_only: bool = False, since: str = None):
+    """Get user notifications; with `since`, only ones newer than that cursor (204 if none)"""
     db = request.app.state.db
-    
-    # Get user from auth header
-    auth_header = request.headers.get("Authorization", "")
-    if not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.replace("Bearer ", "")
-    
-    # Decode token to get user_id
-    import jwt
-    import os
-    try:
-        payload = jwt.decode(token, os.environ.get("JWT_SECRET", "havosec-super-secret-jwt-key-2025"), algorithms=["HS256"])
-        user_id = payload.get("userId")
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = get_user_id(request)
     
     query = {"userId": user_id}
     if unread_only:
         query["read"] = False
     
-    cursor = db.notifications.find(query).sort("createdAt", -1).limit(limit)
-    notifications = await cursor.to_list(length=limit)
+    if since is not None:
+        delta = await find_since(db.notifications, notifications_mark(user_id), query, since, limit, {"userId": user_id})
+        if delta is None:
+            return Response(status_code=204)
+        notifications, cursor, has_more = delta
+        unread_count = await db.notifications.count_documents({"userId": user_id, "read": False})
+        return MongoJSONResponse({
+            "notifications": notifications,
+            "unreadCount": unread_count,
+            "total": len(notifications),
+            "cursor": cursor,
+            "hasMore": has_more
+        })
+    
+    cursor = await current_cursor(db.notifications, notifications_mark(user_id), {"userId": user_id})
+    notifications = await find_page(db.notifications, query, {"createdAt": -1}, limit=limit)
     
     # Count unread
     unread_count = await db.notifications.count_documents({"userId": user_id, "read": False})
     
-    for n in notifications:
-        n["id"] = str(n.pop("_id"))
-        if "createdAt" in n:
-            n["createdAt"] = n["createdAt"].isoformat()
-    
-    return {
+    return MongoJSONResponse({
         "notifications": notifications,
         "unreadCount": unread_count,
-        "total": len(notifications)
-    }
+        "total": len(notifications),
+        "cursor": cursor
+    })
 
 @router.post("/")
 async def create_notification(request: Request):
@@ -111,7 +125,7 @@ async def create_notification(request: Request):
         "createdAt": datetime.utcnow()
     }
     
-    result = await db.notifications.insert_one(notification)
+    result = await insert_sequenced(db.notifications, notification, notifications_mark(notification["userId"]))
     notification["id"] = str(result.inserted_id)
     if "_id" in notification:
         del notification["_id"]
@@ -147,20 +161,7 @@ async def mark_as_read(notification_id: str, request: Request):
 async def mark_all_as_read(request: Request):
     """Mark all notifications as read for a user"""
     db = request.app.state.db
-    
-    auth_header = request.headers.get("Authorization", "")
-    if not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.replace("Bearer ", "")
-    
-    import jwt
-    import os
-    try:
-        payload = jwt.decode(token, os.environ.get("JWT_SECRET", "havosec-super-secret-jwt-key-2025"), algorithms=["HS256"])
-        user_id = payload.get("userId")
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = get_user_id(request)
     
     result = await db.notifications.update_many(
         {"userId": user_id, "read": False},
@@ -185,61 +186,40 @@ async def delete_notification(notification_id: str, request: Request):
 async def clear_all_notifications(request: Request):
     """Clear all notifications for a user"""
     db = request.app.state.db
-    
-    auth_header = request.headers.get("Authorization", "")
-    if not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = auth_header.replace("Bearer ", "")
-    
-    import jwt
-    import os
-    try:
-        payload = jwt.decode(token, os.environ.get("JWT_SECRET", "havosec-super-secret-jwt-key-2025"), algorithms=["HS256"])
-        user_id = payload.get("userId")
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = get_user_id(request)
     
     result = await db.notifications.delete_many({"userId": user_id})
     
     return {"success": True, "deleted": result.deleted_count}
 
+# Security notification templates: (type, title, message format)
+SECURITY_NOTIFICATION_TEMPLATES = {
+    "login_success": ("info", "New Login", "New login from {ip} at {location}"),
+    "login_failed": ("warning", "Failed Login Attempt", "Failed login attempt from {ip}"),
+    "password_changed": ("success", "Password Changed", "Your password was successfully changed"),
+    "threat_detected": ("error", "Threat Detected", "Security threat detected: {threat_type}"),
+    "attack_blocked": ("success", "Attack Blocked", "Blocked {attack_type} from {source}")
+}
+SECURITY_NOTIFICATION_DEFAULTS = {
+    "ip": "unknown",
+    "location": "unknown",
+    "threat_type": "Unknown threat",
+    "attack_type": "attack",
+    "source": "unknown source"
+}
+
+def format_security_notification(event_type: str, details: dict):
+    """type, title and message for a security event (only the matching template is formatted)"""
+    template = SECURITY_NOTIFICATION_TEMPLATES.get(event_type)
+    if template is None:
+        return {"type": "info", "title": event_type.replace("_", " ").title(), "message": str(details)}
+    kind, title, message = template
+    return {"type": kind, "title": title, "message": message.format_map({**SECURITY_NOTIFICATION_DEFAULTS, **details})}
+
 # Utility function to create security notifications
 async def create_security_notification(db, user_id: str, event_type: str, details: dict):
     """Helper to create security-related notifications"""
-    notification_templates = {
-        "login_success": {
-            "type": "info",
-            "title": "New Login",
-            "message": f"New login from {details.get('ip', 'unknown')} at {details.get('location', 'unknown')}"
-        },
-        "login_failed": {
-            "type": "warning",
-            "title": "Failed Login Attempt",
-            "message": f"Failed login attempt from {details.get('ip', 'unknown')}"
-        },
-        "password_changed": {
-            "type": "success",
-            "title": "Password Changed",
-            "message": "Your password was successfully changed"
-        },
-        "threat_detected": {
-            "type": "error",
-            "title": "Threat Detected",
-            "message": f"Security threat detected: {details.get('threat_type', 'Unknown threat')}"
-        },
-        "attack_blocked": {
-            "type": "success",
-            "title": "Attack Blocked",
-            "message": f"Blocked {details.get('attack_type', 'attack')} from {details.get('source', 'unknown source')}"
-        }
-    }
-    
-    template = notification_templates.get(event_type, {
-        "type": "info",
-        "title": event_type.replace("_", " ").title(),
-        "message": str(details)
-    })
+    template = format_security_notification(event_type, details)
     
     notification = {
         "userId": user_id,
@@ -249,7 +229,7 @@ async def create_security_notification(db, user_id: str, event_type: str, detail
         "createdAt": datetime.utcnow()
     }
     
-    result = await db.notifications.insert_one(notification)
+    result = await insert_sequenced(db.notifications, notification, notifications_mark(user_id))
     notification["id"] = str(result.inserted_id)
     
     # Send via WebSocket
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException, Request
+from routes.admin_auth import get_admin_from_request
+from utils.search import admin_search, SOURCES, SEARCH_MAX_RESULTS
+import time
+
+router = APIRouter()
+
+@router.get("/")
+async def search(request: Request, q: str = "", types: str = None, limit: int = 20):
+    """Ranked matches across clients, demo requests and users.
+    
+    `types` is a comma-separated subset of client, demoRequest, user.
+    """
+    get_admin_from_request(request)
+    wanted = None
+    if types:
+        wanted = {t.strip() for t in types.split(",") if t.strip()}
+        unknown = wanted - set(SOURCES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown type(s): {', '.join(sorted(unknown))}. Available: {', '.join(SOURCES)}")
+    
+    started = time.perf_counter()
+    results = admin_search.search(q, wanted, max(1, min(limit, SEARCH_MAX_RESULTS)))
+    return {
+        "query": q,
+        "results": results,
+        "total": len(results),
+        "tookMs": round((time.perf_counter() - started) * 1000, 2)
+    }
@@ -1,15 +1,84 @@
-from fastapi import APIRouter, HTTPException, Request, UploadFile, File
-from fastapi.responses import FileResponse
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from datetime import datetime, timedelta
+from routes.admin_auth import verify_token as verify_admin_token
+from routes.client_auth import verify_token as verify_client_token
+from utils.images import image_variants, is_resizable, pick_width, negotiate_format, read_dimensions, remove_variants, MEDIA_TYPES, VARIANTS_ON_UPLOAD
+from utils import upload_store
+from utils import resumable
+from utils import evidence
+from utils import upload_stream
+from utils.http_cache import serve_file, IMMUTABLE
+from utils.storage import storage, verify_direct_upload, PRESIGN_EXPIRES
 import os
+import re
+import secrets
 import uuid
-import shutil
-
-router = APIRouter()
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "images")
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg"}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_FILES_PER_REQUEST = 10
+CHUNK_SIZE = 1024 * 1024  # 1MB
+LEGACY_CACHE_CONTROL = "public, max-age=86400"
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries and part headers
+
+# Largest request body each endpoint can legitimately receive
+BODY_LIMITS = {
+    "upload_image": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "upload_multiple_images": MAX_FILES_PER_REQUEST * (MAX_FILE_SIZE + MULTIPART_OVERHEAD),
+    "direct_upload": MAX_FILE_SIZE
+}
+
+class BodyTooLarge(Exception):
+    pass
+
+def limit_body(receive, limit):
+    """Wrap an ASGI receive so the body raises BodyTooLarge once it passes `limit` bytes"""
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise BodyTooLarge()
+        return message
+
+    return limited_receive
+
+class UploadLimitRoute(APIRoute):
+    """Rejects oversized uploads: up front from Content-Length, and while reading for
+    bodies sent without one (chunked transfer encoding)"""
+
+    def get_route_handler(self):
+        original_handler = super().get_route_handler()
+        limit = BODY_LIMITS.get(self.endpoint.__name__)
+
+        def too_large():
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Request too large. Maximum size is {MAX_FILE_SIZE // (1024 * 1024)}MB per file"}
+            )
+
+        async def handler(request: Request):
+            if not limit:
+                return await original_handler(request)
+            content_length = request.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > limit:
+                return too_large()
+            try:
+                return await original_handler(Request(request.scope, limit_body(request.receive, limit)))
+            except BodyTooLarge:
+                return too_large()
+
+        return handler
+
+router = APIRouter(route_class=UploadLimitRoute)
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -23,77 +92,127 @@ def generate_unique_filename(original_filename: str) -> str:
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     return f"{timestamp}_{unique_id}{ext}"
 
+def get_uploader(request: Request):
+    """Who is uploading, taken from an admin or client bearer token when one is sent"""
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    token = auth_header.replace("Bearer ", "")
+    for verify, claim in ((verify_admin_token, "email"), (verify_client_token, "userId")):
+        try:
+            return verify(token).get(claim)
+        except HTTPException:
+            continue
+    return None
+
+def is_admin_request(request: Request):
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return False
+    try:
+        verify_admin_token(auth_header.replace("Bearer ", ""))
+        return True
+    except HTTPException:
+        return False
+
+async def stat_or_404(path):
+    try:
+        return await run_in_threadpool(os.stat, path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+async def pregenerate_variants(name):
+    """Variants for a blob, by its <sha256><ext> name"""
+    await image_variants.pregenerate(await storage.local_copy(upload_store.blob_key(name)), name)
+
+def upload_response(upload):
+    return {
+        "success": True,
+        "filename": upload["name"],
+        "originalName": upload["originalName"],
+        "url": upload_store.blob_url(upload),
+        "hash": upload["hash"],
+        "size": upload["size"],
+        "width": upload["width"],
+        "height": upload["height"],
+        "type": upload["contentType"]
+    }
+
+def rejection_detail(part):
+    if part.rejected == "type":
+        return f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+    return "File too large. Maximum size is 10MB"
+
+async def save_upload(part, db, uploaded_by=None):
+    """Register a file part that upload_stream already wrote and hashed"""
+    upload = await upload_store.commit(
+        db, part.temp_path, part.digest, part.size, part.content_type,
+        generate_unique_filename(part.filename), part.filename, uploaded_by
+    )
+    part.temp_path = None
+    return upload
+
 @router.post("/")
-async def upload_image(file: UploadFile = File(...)):
-    """Upload an image file"""
-    
-    # Validate file extension
-    ext = get_file_extension(file.filename)
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
-        )
-    
-    # Read file content
-    content = await file.read()
+async def upload_image(request: Request, background_tasks: BackgroundTasks):
+    """Upload an image file (multipart field `file`)"""
     
-    # Validate file size
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File too large. Maximum size is 10MB")
+    # Stream to disk, validating type and size as we go
+    files = await upload_stream.receive_files(request, MAX_FILE_SIZE, 1, ALLOWED_EXTENSIONS)
+    if not files:
+        raise HTTPException(status_code=400, detail="No file uploaded")
+    part = files[0]
+    if part.rejected:
+        raise HTTPException(status_code=400, detail=rejection_detail(part))
     
-    # Generate unique filename
-    unique_filename = generate_unique_filename(file.filename)
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+    try:
+        upload = await save_upload(part, request.app.state.db, get_uploader(request))
+    finally:
+        await run_in_threadpool(upload_stream.discard, files)
     
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(content)
+    if VARIANTS_ON_UPLOAD and is_resizable(upload["name"]):
+        background_tasks.add_task(pregenerate_variants, upload_store.public_name(upload))
     
     # Return the URL to access the image
-    return {
-        "success": True,
-        "filename": unique_filename,
-        "originalName": file.filename,
-        "url": f"/api/uploads/images/{unique_filename}",
-        "size": len(content),
-        "type": file.content_type
-    }
+    return upload_response(upload)
 
 @router.post("/multiple")
-async def upload_multiple_images(files: list[UploadFile] = File(...)):
-    """Upload multiple image files"""
+async def upload_multiple_images(request: Request, background_tasks: BackgroundTasks):
+    """Upload multiple image files (multipart fields `files`)"""
     
+    files = await upload_stream.receive_files(request, MAX_FILE_SIZE, MAX_FILES_PER_REQUEST, ALLOWED_EXTENSIONS)
+    
+    db = request.app.state.db
+    uploaded_by = get_uploader(request)
     uploaded_files = []
     errors = []
     
     for file in files:
         try:
-            ext = get_file_extension(file.filename)
-            if ext not in ALLOWED_EXTENSIONS:
+            if file.rejected == "type":
                 errors.append({"filename": file.filename, "error": "File type not allowed"})
                 continue
-            
-            content = await file.read()
-            
-            if len(content) > MAX_FILE_SIZE:
-                errors.append({"filename": file.filename, "error": "File too large"})
+            if file.rejected:
+                errors.append({"filename": file.filename, "error": "File too large. Maximum size is 10MB"})
                 continue
             
-            unique_filename = generate_unique_filename(file.filename)
-            file_path = os.path.join(UPLOAD_DIR, unique_filename)
+            upload = await save_upload(file, db, uploaded_by)
             
-            with open(file_path, "wb") as f:
-                f.write(content)
+            if VARIANTS_ON_UPLOAD and is_resizable(upload["name"]):
+                background_tasks.add_task(pregenerate_variants, upload_store.public_name(upload))
             
             uploaded_files.append({
-                "filename": unique_filename,
+                "filename": upload["name"],
                 "originalName": file.filename,
-                "url": f"/api/uploads/images/{unique_filename}",
-                "size": len(content)
+                "url": upload_store.blob_url(upload),
+                "hash": upload["hash"],
+                "size": upload["size"]
             })
+        except HTTPException as e:
+            errors.append({"filename": file.filename, "error": e.detail})
         except Exception as e:
             errors.append({"filename": file.filename, "error": str(e)})
+    # Temp files of parts that failed to commit
+    await run_in_threadpool(upload_stream.discard, files)
     
     return {
         "success": True,
@@ -104,43 +223,464 @@ async def upload_multiple_images(files: list[UploadFile] = File(...)):
     }
 
 @router.get("/images/{filename}")
-async def get_image(filename: str):
-    """Serve an uploaded image"""
+async def get_image(filename: str, request: Request, w: int = None):
+    """Serve an uploaded image, or a resized/re-encoded variant of it.
     
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    `filename` is either a content-addressed blob name (<sha256><ext>; the
+    extension gives the format, the hash alone is the storage key) or the
+    per-upload filename. `?w=` snaps to the nearest configured width; the
+    encoding is negotiated from the Accept header (AVIF, then WebP, then the
+    original format). Both kinds of name never change content, so responses
+    are immutable and revalidate with ETag / If-None-Match; Range is supported.
+    """
     
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Image not found")
+    key = None
+    source_name = filename
+    if upload_store.is_blob_name(filename):
+        key = upload_store.blob_key(filename)
+    else:
+        upload = await upload_store.find(request.app.state.db, filename)
+        if upload:
+            key = upload["blob"]
+            source_name = upload_store.public_name(upload)
+    
+    resizable = is_resizable(source_name)
+    width = pick_width(w) if resizable else None
+    fmt = negotiate_format(request.headers.get("accept"), source_name) if resizable else None
+    wants_variant = resizable and (width is not None or fmt != negotiate_format(None, source_name))
+    
+    if key and not storage.is_local and not wants_variant:
+        # Let the browser fetch the original straight from object storage
+        return RedirectResponse(
+            storage.presign_get(key), status_code=307,
+            headers={"Cache-Control": f"private, max-age={PRESIGN_EXPIRES // 2}"}
+        )
+    
+    cache_control = IMMUTABLE
+    if key:
+        try:
+            file_path = await storage.local_copy(key)
+        except Exception:
+            raise HTTPException(status_code=404, detail="Image not found")
+    else:
+        # Not reconciled into the catalog yet (see `python -m utils.upload_store reconcile`)
+        file_path = os.path.join(UPLOAD_DIR, filename)
+        cache_control = LEGACY_CACHE_CONTROL
     
-    return FileResponse(file_path)
+    stat = await stat_or_404(file_path)
+    if key:
+        etag = f'"{key}"'
+    else:
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    
+    if not resizable:
+        return await serve_file(request, file_path, stat, etag, cache_control=cache_control)
+    
+    headers = {"Vary": "Accept"}
+    if not wants_variant:
+        return await serve_file(request, file_path, stat, etag, cache_control=cache_control, headers=headers)
+    
+    try:
+        variant = await image_variants.get(file_path, source_name, width, fmt)
+        variant_stat = await run_in_threadpool(os.stat, variant)
+    except Exception as e:
+        print(f"✗ Variant generation failed for {filename}: {e}")
+        return await serve_file(request, file_path, stat, etag, cache_control=cache_control, headers=headers)
+    
+    variant_etag = f'"{os.path.basename(variant)}"' if cache_control == IMMUTABLE else f'"{int(variant_stat.st_mtime):x}-{variant_stat.st_size:x}"'
+    return await serve_file(
+        request, variant, variant_stat, variant_etag,
+        media_type=MEDIA_TYPES[fmt], cache_control=cache_control, headers=headers
+    )
 
 @router.delete("/images/{filename}")
-async def delete_image(filename: str):
-    """Delete an uploaded image"""
+async def delete_image(filename: str, request: Request):
+    """Delete an uploaded image (the blob goes once nothing else references it)"""
     
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    upload = await upload_store.release(request.app.state.db, filename, on_blob_removed=remove_variants)
+    if upload:
+        return {"success": True, "message": "Image deleted successfully"}
     
-    if not os.path.exists(file_path):
+    # Not reconciled into the catalog yet
+    file_path = os.path.join(UPLOAD_DIR, filename)
+    try:
+        await run_in_threadpool(os.remove, file_path)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
         raise HTTPException(status_code=404, detail="Image not found")
-    
-    os.remove(file_path)
+    await run_in_threadpool(remove_variants, filename)
     
     return {"success": True, "message": "Image deleted successfully"}
 
+@router.post("/presign")
+async def presign_upload(request: Request):
+    """Issue a short-lived URL the browser can PUT the file to directly.
+    
+    The client sends filename, contentType, size and the file's sha256; after
+    uploading it calls /complete with the returned uploadId. If the same
+    content is already stored no upload is needed at all.
+    """
+    db = request.app.state.db
+    data = await request.json()
+    
+    filename = data.get("filename") or ""
+    content_type = data.get("contentType") or "application/octet-stream"
+    size = data.get("size")
+    sha256 = (data.get("sha256") or "").lower()
+    
+    ext = get_file_extension(filename)
+    if ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    if not isinstance(size, int) or size <= 0:
+        raise HTTPException(status_code=400, detail="File size is required")
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail="File too large. Maximum size is 10MB")
+    if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        raise HTTPException(status_code=400, detail="A hex sha256 of the file is required")
+    
+    key = upload_store.blob_name(sha256)
+    already_stored = await upload_store.blob_exists(db, key)
+    upload_id = secrets.token_urlsafe(16)
+    await db.pending_uploads.insert_one({
+        "_id": upload_id,
+        "key": key,
+        "size": size,
+        "contentType": content_type,
+        "name": generate_unique_filename(filename),
+        "originalName": filename,
+        "uploadedBy": get_uploader(request),
+        "expiresAt": datetime.utcnow() + timedelta(seconds=PRESIGN_EXPIRES)
+    })
+    
+    return {
+        "uploadId": upload_id,
+        "key": key,
+        "alreadyStored": already_stored,
+        "upload": None if already_stored else storage.presign_put(key, content_type, size, sha256),
+        "expiresIn": PRESIGN_EXPIRES
+    }
+
+@router.post("/complete")
+async def complete_upload(request: Request, background_tasks: BackgroundTasks):
+    """Register a file the browser uploaded with a presigned URL"""
+    db = request.app.state.db
+    data = await request.json()
+    
+    pending = await db.pending_uploads.find_one_and_update(
+        {"_id": data.get("uploadId"), "completing": {"$ne": True}},
+        {"$set": {"completing": True}}
+    )
+    if not pending:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    
+    key = pending["key"]
+    # The key is the SHA-256 the browser announced; check the stored bytes really match it
+    if not await storage.verify(key, pending["size"], upload_store.blob_key(key)):
+        await db.pending_uploads.update_one({"_id": pending["_id"]}, {"$unset": {"completing": ""}})
+        raise HTTPException(status_code=409, detail="File has not been uploaded yet or does not match its size and hash")
+    
+    # Read from the stored object (a node-local copy on object storage)
+    dimensions = await run_in_threadpool(read_dimensions, await storage.local_copy(key))
+    
+    upload = await upload_store.register_stored(
+        db, key, pending["size"], pending["contentType"], pending["name"], pending["originalName"],
+        pending["uploadedBy"], dimensions
+    )
+    if upload is None:
+        await db.pending_uploads.update_one({"_id": pending["_id"]}, {"$unset": {"completing": ""}})
+        raise HTTPException(status_code=409, detail="File has not been uploaded yet")
+    await db.pending_uploads.delete_one({"_id": pending["_id"]})
+    
+    if VARIANTS_ON_UPLOAD and is_resizable(upload["name"]):
+        background_tasks.add_task(pregenerate_variants, upload_store.public_name(upload))
+    
+    return upload_response(upload)
+
+@router.put("/direct/{key}")
+async def direct_upload(key: str, request: Request, size: int, expires: int, signature: str):
+    """Presigned PUT target when blobs live on local disk (object storage takes PUTs itself)"""
+    if not storage.is_local:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not upload_store.is_blob_name(key) or not verify_direct_upload(key, size, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+    
+    try:
+        temp_path, digest, received = await upload_store.stream_chunks_to_temp(request.stream(), size)
+    except upload_store.FileTooLarge:
+        raise HTTPException(status_code=400, detail="Body larger than the signed size")
+    
+    if received != size or digest != key[:64]:
+        await run_in_threadpool(os.remove, temp_path)
+        raise HTTPException(status_code=400, detail="Uploaded content does not match the signed hash")
+    
+    if await storage.exists(key):
+        await run_in_threadpool(os.remove, temp_path)
+    else:
+        await storage.put_file(temp_path, key)
+    
+    return {"success": True, "key": key}
+
+def resumable_headers(upload):
+    ranges = resumable.merge_ranges(upload.get("chunks", []))
+    offset = upload["size"] if upload["state"] == "complete" else resumable.contiguous_offset(ranges)
+    return {
+        "Upload-Offset": str(offset),
+        "Upload-Length": str(upload["size"]),
+        "Upload-Ranges": resumable.format_ranges(ranges),
+        "Upload-Expires": upload["expiresAt"].strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        "Cache-Control": "no-store"
+    }
+
+async def get_resumable_or_404(db, upload_id):
+    upload = await db.resumable_uploads.find_one({"_id": upload_id})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return upload
+
+def evidence_response(record):
+    return {
+        "success": True,
+        "evidenceId": record["_id"],
+        "originalName": record["originalName"],
+        "url": evidence.url(record["_id"]),
+        "hash": record["hash"],
+        "size": record["size"],
+        "type": record["contentType"]
+    }
+
+async def finalize_resumable(db, upload):
+    """Hash the assembled file and commit it to the upload store (evidence goes to private storage)"""
+    upload_id = upload["_id"]
+    path = resumable.partial_path(upload_id)
+    digest = await run_in_threadpool(upload_store.hash_file, path)
+    if upload.get("sha256") and digest != upload["sha256"]:
+        await db.resumable_uploads.delete_one({"_id": upload_id})
+        await run_in_threadpool(resumable.remove_partial, upload_id)
+        raise HTTPException(status_code=400, detail="Checksum mismatch, the upload has been discarded")
+    
+    if upload.get("kind") == "evidence":
+        record = await evidence.store(
+            db, path, digest, upload["size"], upload["contentType"], upload["originalName"], upload["uploadedBy"]
+        )
+        result = evidence_response(record)
+    else:
+        stored = await upload_store.commit(
+            db, path, digest, upload["size"], upload["contentType"],
+            upload["name"], upload["originalName"], upload["uploadedBy"]
+        )
+        result = upload_response(stored)
+    # Keep the finished record until it expires so a retried last chunk gets the same answer
+    await db.resumable_uploads.update_one(
+        {"_id": upload_id},
+        {"$set": {"state": "complete", "upload": result, "expiresAt": resumable.expires_at()}}
+    )
+    return result
+
+@router.post("/resumable", status_code=201)
+async def create_resumable_upload(request: Request, response: Response):
+    """Start a resumable upload.
+    
+    Send the bytes with PATCH /resumable/{uploadId} and an Upload-Offset
+    header, in any order and in parallel; HEAD reports the ranges received so
+    a retry only resends what is missing. Evidence files (captures, logs,
+    archives) need a signed-in uploader and are stored privately.
+    """
+    db = request.app.state.db
+    data = await request.json()
+    
+    filename = data.get("filename") or ""
+    size = data.get("size")
+    sha256 = (data.get("sha256") or "").lower() or None
+    
+    ext = get_file_extension(filename)
+    if ext in ALLOWED_EXTENSIONS:
+        kind, max_size = "image", MAX_FILE_SIZE
+    elif ext in evidence.EVIDENCE_EXTENSIONS:
+        kind, max_size = "evidence", evidence.MAX_EVIDENCE_SIZE
+    else:
+        allowed = sorted(ALLOWED_EXTENSIONS | evidence.EVIDENCE_EXTENSIONS)
+        raise HTTPException(status_code=400, detail=f"File type not allowed. Allowed types: {', '.join(allowed)}")
+    if not isinstance(size, int) or size <= 0:
+        raise HTTPException(status_code=400, detail="File size is required")
+    if size > max_size:
+        raise HTTPException(status_code=400, detail=f"File too large. Maximum size is {max_size // (1024 * 1024)}MB")
+    if sha256 and not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        raise HTTPException(status_code=400, detail="sha256 must be a hex digest")
+    
+    uploaded_by = get_uploader(request)
+    if kind == "evidence" and not uploaded_by:
+        raise HTTPException(status_code=401, detail="Sign in to upload evidence files")
+    caller = uploaded_by or f"ip:{request.client.host if request.client else 'unknown'}"
+    if await resumable.open_upload_count(db, caller) >= resumable.RESUMABLE_MAX_OPEN:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many uploads in progress. Finish or cancel one first (at most {resumable.RESUMABLE_MAX_OPEN})"
+        )
+    
+    upload_id = secrets.token_urlsafe(16)
+    upload = {
+        "_id": upload_id,
+        "kind": kind,
+        "size": size,
+        "sha256": sha256,
+        "contentType": data.get("contentType") or upload_store.CONTENT_TYPES.get(ext, "application/octet-stream"),
+        "name": generate_unique_filename(filename),
+        "originalName": filename,
+        "uploadedBy": uploaded_by,
+        "caller": caller,
+        "state": "uploading",
+        "chunks": [],
+        "version": 0,
+        "createdAt": datetime.utcnow(),
+        "expiresAt": resumable.expires_at()
+    }
+    await db.resumable_uploads.insert_one(upload)
+    
+    location = f"/api/uploads/resumable/{upload_id}"
+    response.headers.update(resumable_headers(upload))
+    response.headers["Location"] = location
+    return {
+        "uploadId": upload_id,
+        "location": location,
+        "maxChunkSize": resumable.RESUMABLE_MAX_CHUNK,
+        "expiresAt": upload["expiresAt"].isoformat()
+    }
+
+@router.head("/resumable/{upload_id}")
+async def resumable_upload_status(upload_id: str, request: Request):
+    """Upload-Offset (contiguous bytes) and Upload-Ranges (everything received) for a resumable upload"""
+    upload = await get_resumable_or_404(request.app.state.db, upload_id)
+    return Response(status_code=200, headers=resumable_headers(upload))
+
+@router.patch("/resumable/{upload_id}")
+async def upload_resumable_chunk(upload_id: str, request: Request, response: Response, background_tasks: BackgroundTasks):
+    """Write one chunk at Upload-Offset; the upload is finalized when the last gap is filled"""
+    db = request.app.state.db
+    upload = await get_resumable_or_404(db, upload_id)
+    if upload["state"] == "complete":
+        response.headers.update(resumable_headers(upload))
+        return {"complete": True, "upload": upload["upload"]}
+    if upload["state"] != "uploading":
+        raise HTTPException(status_code=409, detail="Upload is being finalized")
+    
+    offset = request.headers.get("upload-offset", "")
+    if not offset.isdigit() or int(offset) >= upload["size"]:
+        raise HTTPException(status_code=400, detail="A valid Upload-Offset header is required")
+    start = int(offset)
+    limit = min(resumable.RESUMABLE_MAX_CHUNK, upload["size"] - start)
+    ranges = resumable.merge_ranges(upload.get("chunks", []))
+    if len(ranges) >= resumable.RESUMABLE_MAX_RANGES and not resumable.extends_range(ranges, start):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Too many separate ranges (at most {resumable.RESUMABLE_MAX_RANGES}). Continue one of them first"
+        )
+    
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail=f"Chunk too large. At most {limit} bytes fit at this offset")
+    
+    written = 0
+    buffer = bytearray()
+    fd = await run_in_threadpool(resumable.open_partial, upload_id)
+    try:
+        try:
+            async for piece in request.stream():
+                if written + len(buffer) + len(piece) > limit:
+                    raise HTTPException(status_code=413, detail=f"Chunk too large. At most {limit} bytes fit at this offset")
+                buffer.extend(piece)
+                if len(buffer) >= CHUNK_SIZE:
+                    await run_in_threadpool(resumable.write_at, fd, bytes(buffer), start + written)
+                    written += len(buffer)
+                    buffer.clear()
+        except ClientDisconnect:
+            pass
+        if buffer:
+            await run_in_threadpool(resumable.write_at, fd, bytes(buffer), start + written)
+            written += len(buffer)
+    finally:
+        await run_in_threadpool(os.close, fd)
+        # Whatever made it to disk counts, even from an interrupted chunk
+        if written:
+            upload = await resumable.record_chunk(db, upload_id, start, start + written) or upload
+    
+    ranges = resumable.merge_ranges(upload["chunks"])
+    if ranges == [[0, upload["size"]]]:
+        claimed = await db.resumable_uploads.find_one_and_update(
+            {"_id": upload_id, "state": "uploading"},
+            {"$set": {"state": "finalizing"}}
+        )
+        if claimed:
+            try:
+                result = await finalize_resumable(db, claimed)
+            except HTTPException:
+                raise
+            except Exception:
+                await db.resumable_uploads.update_one({"_id": upload_id}, {"$set": {"state": "uploading"}})
+                raise
+            if VARIANTS_ON_UPLOAD and is_resizable(result["url"]):
+                background_tasks.add_task(pregenerate_variants, os.path.basename(result["url"]))
+            upload = await get_resumable_or_404(db, upload_id)
+            response.headers.update(resumable_headers(upload))
+            return {"complete": True, "upload": result}
+    
+    response.headers.update(resumable_headers(upload))
+    return {
+        "complete": False,
+        "offset": resumable.contiguous_offset(ranges),
+        "received": sum(end - start for start, end in ranges),
+        "size": upload["size"]
+    }
+
+@router.delete("/resumable/{upload_id}")
+async def cancel_resumable_upload(upload_id: str, request: Request):
+    """Abandon a resumable upload and free its partial file"""
+    result = await request.app.state.db.resumable_uploads.delete_one({"_id": upload_id, "state": "uploading"})
+    if not result.deleted_count:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    await run_in_threadpool(resumable.remove_partial, upload_id)
+    return {"success": True, "message": "Upload cancelled"}
+
+@router.get("/evidence/{evidence_id}")
+async def download_evidence(evidence_id: str, request: Request):
+    """Download an evidence file (its uploader or an admin only, never cached)"""
+    uploader = get_uploader(request)
+    if not uploader:
+        raise HTTPException(status_code=401, detail="No token provided")
+    record = await evidence.find(request.app.state.db, evidence_id)
+    if not record or (record["uploadedBy"] != uploader and not is_admin_request(request)):
+        raise HTTPException(status_code=404, detail="Evidence file not found")
+    
+    path = evidence.evidence_path(record["_id"])
+    await stat_or_404(path)
+    return FileResponse(
+        path, media_type=record["contentType"], filename=record["originalName"],
+        headers={"Cache-Control": "private, no-store", "X-Content-Type-Options": "nosniff"}
+    )
+
 @router.get("/")
-async def list_images():
-    """List all uploaded images"""
+async def list_images(request: Request, limit: int = 50, offset: int = 0, type: str = None, uploadedBy: str = None, q: str = None):
+    """List uploaded images from the catalog, newest first"""
+    
+    limit = max(1, min(limit, 200))
+    uploads, total = await upload_store.list_uploads(
+        request.app.state.db, limit=limit, offset=offset, content_type=type, uploaded_by=uploadedBy, search=q
+    )
     
     images = []
-    for filename in os.listdir(UPLOAD_DIR):
-        file_path = os.path.join(UPLOAD_DIR, filename)
-        if os.path.isfile(file_path):
-            stat = os.stat(file_path)
-            images.append({
-                "filename": filename,
-                "url": f"/api/uploads/images/{filename}",
-                "size": stat.st_size,
-                "uploadedAt": datetime.fromtimestamp(stat.st_mtime).isoformat()
-            })
+    for upload in uploads:
+        images.append({
+            "filename": upload["name"],
+            "originalName": upload.get("originalName"),
+            "url": upload_store.blob_url(upload),
+            "hash": upload["hash"],
+            "size": upload["size"],
+            "type": upload.get("contentType"),
+            "width": upload.get("width"),
+            "height": upload.get("height"),
+            "uploadedBy": upload.get("uploadedBy"),
+            "uploadedAt": upload["createdAt"].isoformat()
+        })
     
-    return {"images": images, "total": len(images)}
+    return {"images": images, "total": total, "hasMore": offset + limit < total}
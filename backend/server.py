@@ -1,12 +1,19 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from utils.admission import AdmissionMiddleware
+from utils.metrics import MetricsMiddleware, mongo_listeners, registry, METRICS_TOKEN
+from utils.profiler import ProfilerMiddleware
+from utils.responses import MongoJSONResponse
+
 # Import routes
 from routes.admin_auth import router as admin_auth_router
 from routes.client_auth import router as client_auth_router
@@ -18,6 +25,11 @@ from routes.client_dashboard import router as client_dashboard_router
 from routes.uploads import router as uploads_router
 from routes.password_reset import router as password_reset_router
 from routes.notifications import router as notifications_router
+from routes.bulk import router as bulk_router
+from routes.imports import router as imports_router
+from routes.search import router as search_router
+from routes.diagnostics import router as diagnostics_router
+from routes.batch import router as batch_router
 
 # Database client
 db_client = None
@@ -29,26 +41,85 @@ async def lifespan(app: FastAPI):
     # Startup
     mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
     db_name = os.environ.get("DB_NAME", "havosec")
-    db_client = AsyncIOMotorClient(mongo_url)
+    from utils.query_log import query_log
+    db_client = AsyncIOMotorClient(mongo_url, event_listeners=[*mongo_listeners(), query_log])
     db = db_client[db_name]
     app.state.db = db
     
-    # Seed database
-    from utils.seed import seed_database
-    await seed_database(db)
+    # One read when the seed version marker is current; run `python -m utils.seed` as a deploy step
+    # and set SEED_ON_STARTUP=false to skip even that
+    if os.environ.get("SEED_ON_STARTUP", "true").lower() == "true":
+        from utils.seed import ensure_seeded
+        await ensure_seeded(db)
+    
+    # Slow-query log / periodic explain of the costliest query shapes
+    query_log.start(db)
+    
+    # Index checks and cache loads run after the server starts accepting connections;
+    # /api/health/ready turns 200 once they are all done
+    from utils.warmup import warmup
+    from utils.slugs import slug_registry
+    from utils import upload_store, importer
+    from utils.counters import view_counter
+    from utils.resumable import resumable_sweeper
+    from utils.stats import stats_reconciler
+    from utils.search import admin_search
+    from utils.high_water import ensure_sequenced
+    
+    async def upload_indexes():
+        from utils import evidence
+        await upload_store.ensure_indexes(db)
+        await evidence.ensure_indexes(db)
+    
+    async def load_slugs():
+        await slug_registry.ensure_indexes(db)
+        await slug_registry.load(db)
+    
+    warmup.start([
+        # Blog slug routing table (lookups fall back to the database until it is loaded)
+        ("slugs", load_slugs),
+        # Content-addressed upload store and private evidence files
+        ("upload indexes", upload_indexes),
+        # Blog view counters, flushed in batches
+        ("view counter", lambda: view_counter.start(db)),
+        # Expiry of abandoned resumable uploads
+        ("resumable sweeper", lambda: resumable_sweeper.start(db)),
+        # Bulk import heartbeats (and jobs left behind by processes that died)
+        ("import jobs", lambda: importer.job_heartbeat.start(db)),
+        # Admin dashboard counters
+        ("stats", lambda: stats_reconciler.start(db)),
+        # Admin search index
+        ("search index", lambda: admin_search.start(db)),
+        # Sequence numbers behind since-polling cursors (events, notifications)
+        ("poll cursors", lambda: ensure_sequenced(db))
+    ])
     
     print("✓ HavoSec Backend started")
     yield
     # Shutdown
+    await warmup.stop()
+    await view_counter.stop()
+    await resumable_sweeper.stop()
+    await stats_reconciler.stop()
+    await admin_search.stop()
+    await query_log.stop()
+    await importer.job_heartbeat.stop()
+    from utils.render import shutdown_render_pool
+    shutdown_render_pool()
+    from utils.images import image_variants
+    image_variants.shutdown()
     db_client.close()
 
 app = FastAPI(
     title="HavoSec API",
     description="HavoSec Cybersecurity Platform Backend",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=MongoJSONResponse
 )
 
+# Admission control sits inside CORS so shed requests still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -57,6 +128,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilerMiddleware)
 
 # Include routers
 app.include_router(admin_auth_router, prefix="/api/admin/auth", tags=["Admin Auth"])
@@ -68,30 +141,48 @@ app.include_router(demo_router, prefix="/api/admin/demo-requests", tags=["Admin
 app.include_router(demo_router, prefix="/api/demo", tags=["Public Demo"])
 app.include_router(demo_router, prefix="/api/book-demo", tags=["Book Demo"])
 app.include_router(clients_router, prefix="/api/admin/clients", tags=["Admin Clients"])
+app.include_router(bulk_router, prefix="/api/admin/bulk", tags=["Admin Bulk"])
+app.include_router(imports_router, prefix="/api/admin/import", tags=["Admin Import"])
+app.include_router(search_router, prefix="/api/admin/search", tags=["Admin Search"])
+app.include_router(diagnostics_router, prefix="/api/admin/diagnostics", tags=["Admin Diagnostics"])
 app.include_router(client_auth_router, prefix="/api/auth", tags=["Client Auth"])
 app.include_router(client_dashboard_router, prefix="/api/dashboard", tags=["Client Dashboard"])
 app.include_router(uploads_router, prefix="/api/uploads", tags=["File Uploads"])
 app.include_router(password_reset_router, prefix="/api/auth", tags=["Password Reset & Verification"])
 app.include_router(notifications_router, prefix="/api/notifications", tags=["Notifications"])
+app.include_router(batch_router, prefix="/api/batch", tags=["Batch"])
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "OK", "service": "HavoSec API"}
 
+@app.get("/api/health/live")
+async def liveness():
+    """The process is up and its event loop is responding (no I/O)"""
+    return {"status": "alive"}
+
+@app.get("/api/health/ready")
+async def readiness():
+    """Warm-up finished and MongoDB answers; 503 otherwise so traffic isn't routed here yet"""
+    from utils.warmup import warmup
+    status = warmup.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting", **status})
+    try:
+        await asyncio.wait_for(app.state.db.command("ping"), timeout=2)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "database unavailable", "error": str(e)})
+    return {"status": "ready"}
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint (send METRICS_TOKEN as a bearer token when it is set)"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/admin/dashboard")
 async def admin_dashboard():
-    from routes.blog import get_blog_stats
-    from routes.demo_requests import get_demo_stats
-    from routes.clients import get_client_stats
-    
-    blog_stats = await get_blog_stats(app.state.db)
-    demo_stats = await get_demo_stats(app.state.db)
-    client_stats = await get_client_stats(app.state.db)
+    from utils import stats
     
-    return {
-        "overview": {
-            "blog": blog_stats,
-            "demoRequests": demo_stats,
-            "clients": client_stats
-        }
-    }
+    return {"overview": await stats.read(app.state.db)}
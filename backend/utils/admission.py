@@ -0,0 +1,166 @@
+"""Admission control: per-class concurrency limits with bounded wait queues.
+
+Requests are put in a class by method and path prefix before routing:
+
+- auth: logins, registration and password resets (bcrypt, ~100ms of CPU each)
+- dashboard: client dashboard analytics (aggregations)
+- uploads: uploads and image variants
+- public: blog and site content
+
+Each class admits up to `limit` requests at once. Later ones wait in a FIFO
+queue of at most `queue` entries for at most ADMISSION_QUEUE_TIMEOUT seconds.
+When the queue is full, or the wait runs out, the request gets an immediate
+503 with Retry-After instead of adding to the pile-up. Requests outside these
+classes (health checks, admin API, everything cheap) are never queued, and
+requests carrying a valid admin token skip the queue of any class.
+
+Queue time and rejections are exported on /api/metrics.
+"""
+from collections import deque
+import asyncio
+import math
+import os
+import time
+
+from utils.metrics import Counter, Histogram, FAST_BUCKETS, registry
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "2"))
+
+# name -> (methods or None for all, path prefixes, concurrency limit, queue size)
+ADMISSION_CLASSES = {
+    "auth": ({"POST"}, ("/api/auth/", "/api/admin/auth/"), 8, 32),
+    "dashboard": (None, ("/api/dashboard/",), 16, 64),
+    "uploads": (None, ("/api/uploads",), 8, 16),
+    "public": ({"GET", "HEAD"}, ("/api/blog", "/api/content"), 64, 256),
+}
+
+admission_queue_time = registry.register(Histogram(
+    "admission_queue_seconds", "Time requests waited for admission", ("class",), FAST_BUCKETS
+))
+admission_rejections = registry.register(Counter(
+    "admission_rejections_total", "Requests shed with 503 by admission control", ("class", "reason")
+))
+
+class Limiter:
+    def __init__(self, name, limit, queue):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue
+        self.active = 0
+        self.waiters = deque()
+
+    def retry_after(self):
+        """Seconds a rejected client should wait, from how deep the backlog is"""
+        return max(1, math.ceil(ADMISSION_QUEUE_TIMEOUT * len(self.waiters) / max(self.queue_size, 1)))
+
+    async def acquire(self):
+        """Take a slot; returns None, or the reason the request was shed"""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return None
+        if len(self.waiters) >= self.queue_size:
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), ADMISSION_QUEUE_TIMEOUT)
+            return None
+        except asyncio.TimeoutError:
+            # release() may have handed over the slot just as the wait ran out
+            return None if waiter.done() else "timeout"
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+                self.waiters.remove(waiter)
+
+    def bypass(self):
+        """Admit without queueing (priority traffic); still counted as active"""
+        self.active += 1
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                # The slot passes straight to the next waiter; active stays the same
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def status(self):
+        return {"active": self.active, "limit": self.limit, "queued": len(self.waiters), "queueSize": self.queue_size}
+
+class Admission:
+    def __init__(self, classes):
+        self.enabled = ADMISSION_ENABLED
+        self.rules = [(name, methods, prefixes) for name, (methods, prefixes, _, _) in classes.items()]
+        self.limiters = {name: Limiter(name, limit, queue) for name, (_, _, limit, queue) in classes.items()}
+
+    def classify(self, scope):
+        path = scope["path"]
+        for name, methods, prefixes in self.rules:
+            if (methods is None or scope["method"] in methods) and path.startswith(prefixes):
+                return self.limiters[name]
+        return None
+
+    def status(self):
+        return {"enabled": self.enabled, "classes": {name: limiter.status() for name, limiter in self.limiters.items()}}
+
+admission = Admission(ADMISSION_CLASSES)
+
+def _is_admin(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            value = value.decode("latin-1")
+            if not value.startswith("Bearer "):
+                return False
+            from fastapi import HTTPException
+            from routes.admin_auth import verify_token
+            try:
+                verify_token(value[len("Bearer "):])
+                return True
+            except HTTPException:
+                return False
+    return False
+
+async def _reject(send, retry_after):
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": b'{"detail":"Server busy, retry shortly"}'})
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying `admission` to HTTP requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not admission.enabled:
+            return await self.app(scope, receive, send)
+        limiter = admission.classify(scope)
+        if limiter is None:
+            return await self.app(scope, receive, send)
+
+        if _is_admin(scope):
+            limiter.bypass()
+        else:
+            started = time.perf_counter()
+            rejected = await limiter.acquire()
+            admission_queue_time.observe(time.perf_counter() - started, limiter.name)
+            if rejected:
+                admission_rejections.inc(1, limiter.name, rejected)
+                return await _reject(send, limiter.retry_after())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,28 @@
+"""Request state shared by the sub-requests of one POST /api/batch.
+
+The batch endpoint runs each sub-request through the app with `request.state`
+pre-filled: `user` is the caller's token payload, verified once for the whole
+batch; `batch_now` is a single timestamp, so time windows computed by
+different handlers line up; and `batch_memo` holds query results that several
+handlers share. Outside a batch these helpers fall back to doing the work.
+"""
+from datetime import datetime
+import asyncio
+
+def batch_user(request):
+    """Token payload verified by the enclosing batch, or None"""
+    return getattr(request.state, "user", None)
+
+def request_now(request):
+    return getattr(request.state, "batch_now", None) or datetime.utcnow()
+
+async def shared_query(request, key, make):
+    """Await make() once per batch for each key; outside a batch, just await it"""
+    memo = getattr(request.state, "batch_memo", None)
+    if memo is None:
+        return await make()
+    task = memo.get(key)
+    if task is None:
+        task = memo[key] = asyncio.ensure_future(make())
+    # Shielded so one sub-request being cancelled doesn't cancel the query for the others
+    return await asyncio.shield(task)
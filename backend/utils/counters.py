@@ -0,0 +1,107 @@
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+import asyncio
+import math
+import os
+
+VIEW_FLUSH_INTERVAL = float(os.environ.get("VIEW_FLUSH_INTERVAL", "2"))
+VIEW_FLUSH_MAX_POSTS = int(os.environ.get("VIEW_FLUSH_MAX_POSTS", "500"))
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get("TRENDING_HALF_LIFE_HOURS", "24"))
+
+# Time constant (ms) for score * exp(-age / tau), i.e. halving every half-life
+TRENDING_TAU_MS = TRENDING_HALF_LIFE_HOURS * 3600 * 1000 / math.log(2)
+
+def decayed_score(trending, now=None):
+    """Current value of a stored {score, updatedAt} trending record"""
+    if not trending or not trending.get("updatedAt"):
+        return 0.0
+    now = now or datetime.utcnow()
+    age_ms = (now - trending["updatedAt"]).total_seconds() * 1000
+    return trending.get("score", 0) * math.exp(-max(age_ms, 0) / TRENDING_TAU_MS)
+
+def _view_update(count, now):
+    """Pipeline update adding `count` views and folding them into the decayed score"""
+    decay = {"$exp": {"$divide": [
+        {"$subtract": [{"$ifNull": ["$trending.updatedAt", now]}, now]},
+        TRENDING_TAU_MS
+    ]}}
+    return [{"$set": {
+        "views": {"$add": [{"$ifNull": ["$views", 0]}, count]},
+        "trending.score": {"$add": [count, {"$multiply": [{"$ifNull": ["$trending.score", 0]}, decay]}]},
+        "trending.updatedAt": now,
+        "lastViewedAt": now
+    }}]
+
+class ViewCounter:
+    """Aggregates blog post views in memory and writes them as one bulk_write per flush"""
+
+    def __init__(self, flush_interval=VIEW_FLUSH_INTERVAL, max_posts=VIEW_FLUSH_MAX_POSTS):
+        self.flush_interval = flush_interval
+        self.max_posts = max_posts
+        self.pending = {}
+        self.db = None
+        self.task = None
+        self.lock = asyncio.Lock()
+        self.flush_scheduled = False
+
+    def record(self, post_id: str, count: int = 1):
+        self.pending[post_id] = self.pending.get(post_id, 0) + count
+        if len(self.pending) >= self.max_posts and self.db is not None and not self.flush_scheduled:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        async with self.lock:
+            self.flush_scheduled = False
+            if not self.pending or self.db is None:
+                return 0
+            batch, self.pending = self.pending, {}
+            now = datetime.utcnow()
+            items = list(batch.items())
+            ops = [UpdateOne({"_id": ObjectId(post_id)}, _view_update(count, now)) for post_id, count in items]
+            try:
+                await self.db.blog_posts.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: every op not listed in writeErrors was applied, so only
+                # the failed ones go back (re-adding the rest would count them twice)
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                self._requeue(items[index] for index in failed)
+                print(f"✗ View counter flush: {len(failed)} of {len(ops)} updates failed, retrying them next flush")
+                return len(ops) - len(failed)
+            except PyMongoError as e:
+                # Keep the counts for the next flush rather than dropping them
+                self._requeue(items)
+                print(f"✗ View counter flush failed: {e}")
+                return 0
+            except asyncio.CancelledError:
+                self._requeue(items)
+                raise
+            return len(ops)
+
+    def _requeue(self, items):
+        for post_id, count in items:
+            self.pending[post_id] = self.pending.get(post_id, 0) + count
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self, db):
+        self.db = db
+        await db.blog_posts.create_index([("status", 1), ("trending.updatedAt", -1)])
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+
+view_counter = ViewCounter()
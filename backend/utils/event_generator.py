@@ -0,0 +1,324 @@
+"""Synthetic security events at benchmark scale.
+
+Events are spread over the last --days in hourly buckets. Each bucket's share
+of the total follows a diurnal curve (peak mid-afternoon UTC, trough before
+dawn), a quieter weekend and some per-hour noise. Attack bursts add 5-25x
+traffic for a few hours, coming from a small attacker subnet. Outside bursts,
+source IPs are drawn from a fixed pool with Zipfian popularity, so a few
+addresses account for most events, as in real logs. Severity depends on the
+event type (and runs higher during bursts); status depends on severity and age.
+
+Every bucket has its own RNG derived from --seed, so the same arguments always
+produce the same events whatever the number of workers. The time range ends
+at --end (default: the current hour), which is part of those arguments: each
+run prints them and records them, in manifest.json next to the part files
+or in the `event_generator_runs` collection, so it can be reproduced exactly:
+
+    python -m utils.event_generator --count 1000000 --seed 7 --end 2025-06-01T00:00
+
+Buckets are shared
+among worker processes that either insert_many straight into MongoDB or write
+NDJSON part files (dates as {"$date": ...}, loadable with mongoimport):
+
+    python -m utils.event_generator --count 20000000 --days 90 --workers 8 --drop
+    python -m utils.event_generator --count 5000000 --out /data/events
+
+Inserted events get `seq` numbers for since polling (see utils.high_water);
+after loading part files, number them with `python -m utils.high_water backfill`.
+"""
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+import itertools
+import json
+import math
+import os
+import random
+
+EVENT_TYPES = ["attack_blocked", "intrusion_attempt", "malware_detected", "phishing_blocked", "ddos_mitigated", "vulnerability_scan"]
+TYPE_WEIGHTS = [30, 12, 8, 15, 5, 30]
+SEVERITIES = ["low", "medium", "high", "critical"]
+# Likelihood of each severity per event type
+SEVERITY_WEIGHTS = {
+    "attack_blocked": [40, 40, 15, 5],
+    "intrusion_attempt": [10, 35, 40, 15],
+    "malware_detected": [5, 25, 45, 25],
+    "phishing_blocked": [30, 45, 20, 5],
+    "ddos_mitigated": [10, 30, 40, 20],
+    "vulnerability_scan": [70, 25, 5, 0]
+}
+STATUSES = ["detected", "blocked", "investigating", "resolved"]
+# Likelihood of each status per severity for recent events
+STATUS_WEIGHTS = {
+    "low": [25, 55, 5, 15],
+    "medium": [20, 50, 15, 15],
+    "high": [15, 40, 35, 10],
+    "critical": [10, 30, 50, 10]
+}
+DESCRIPTIONS = {
+    "attack_blocked": ["SQL injection attack blocked", "Cross-site scripting attempt blocked", "Path traversal attempt blocked"],
+    "intrusion_attempt": ["Brute force attack on admin panel", "Suspicious login attempt detected", "Credential stuffing detected"],
+    "malware_detected": ["Malware signature detected in upload", "Suspicious executable quarantined"],
+    "phishing_blocked": ["Phishing attempt blocked", "Spoofed sender domain rejected"],
+    "ddos_mitigated": ["DDoS attack mitigated", "Request flood rate limited"],
+    "vulnerability_scan": ["Vulnerability scan detected", "Port scan detected"]
+}
+ENDPOINTS = {
+    "attack_blocked": ["/api/search", "/api/upload", "/api/dashboard"],
+    "intrusion_attempt": ["/api/login", "/api/admin"],
+    "malware_detected": ["/api/upload"],
+    "phishing_blocked": ["/api/login", "/api/dashboard"],
+    "ddos_mitigated": ["/api/login", "/api/search", "/api/dashboard"],
+    "vulnerability_scan": ["/api/admin", "/api/search", "/api/upload", "/api/login"]
+}
+SERVICES = {"/api/login": "auth", "/api/admin": "web", "/api/upload": "api", "/api/search": "api", "/api/dashboard": "web"}
+BURST_TYPES = ["ddos_mitigated", "intrusion_attempt", "attack_blocked", "vulnerability_scan"]
+COUNTRIES = ["US", "CN", "RU", "KP", "IR", "TR", "BR", "IN", "DE", "NL", "VN", "UA"]
+COUNTRY_WEIGHTS = [25, 18, 14, 3, 5, 4, 8, 8, 5, 4, 3, 3]
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+TYPE_CUM = _cumulative(TYPE_WEIGHTS)
+SEVERITY_CUM = {event_type: _cumulative(weights) for event_type, weights in SEVERITY_WEIGHTS.items()}
+# Bursts shift severity up by one step
+BURST_SEVERITY_CUM = {event_type: _cumulative([0] + weights[:-2] + [weights[-2] + weights[-1]]) for event_type, weights in SEVERITY_WEIGHTS.items()}
+STATUS_CUM = {severity: _cumulative(weights) for severity, weights in STATUS_WEIGHTS.items()}
+
+def _pick(rng, population, cum_weights):
+    return population[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+def _choice(rng, population):
+    # Cheaper than rng.choice(), which goes through _randbelow() on every call
+    return population[int(rng.random() * len(population))]
+
+def hour_anchor(end=None):
+    """End of the time range, on the hour (the current hour by default)"""
+    return (end or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+class EventModel:
+    """Deterministic description of the event stream; cheap to rebuild in each worker"""
+
+    def __init__(self, seed=0, days=30, end=None, ip_pool=50000, zipf_s=1.1, bursts=None):
+        self.seed = seed
+        self.end = hour_anchor(end)
+        self.start = self.end - timedelta(days=days)
+        self.hours = days * 24
+
+        rng = random.Random(f"{seed}:ips")
+        self.ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(ip_pool)]
+        self.ip_countries = rng.choices(COUNTRIES, weights=COUNTRY_WEIGHTS, k=ip_pool)
+        self.ip_cum = _cumulative(1 / rank ** zipf_s for rank in range(1, ip_pool + 1))
+
+        rng = random.Random(f"{seed}:bursts")
+        self.bursts = {}
+        for burst_id in range(days // 3 if bursts is None else bursts):
+            start = rng.randrange(self.hours)
+            subnet = f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}."
+            burst = {
+                "id": burst_id,
+                "type": rng.choice(BURST_TYPES),
+                "multiplier": rng.uniform(5, 25),
+                "ips": [subnet + str(host) for host in rng.sample(range(1, 255), 16)],
+                "country": _pick(rng, COUNTRIES, _cumulative(COUNTRY_WEIGHTS))
+            }
+            for hour in range(start, min(start + rng.randint(1, 6), self.hours)):
+                self.bursts[hour] = burst
+
+    def hour_weight(self, hour):
+        at = self.start + timedelta(hours=hour)
+        diurnal = 1 + 0.6 * math.sin(2 * math.pi * (at.hour - 9) / 24)
+        weekly = 0.7 if at.weekday() >= 5 else 1.0
+        noise = random.Random(f"{self.seed}:noise:{hour}").lognormvariate(0, 0.15)
+        burst = self.bursts.get(hour)
+        return diurnal * weekly * noise * (burst["multiplier"] if burst else 1)
+
+    def bucket_counts(self, total):
+        """Events per hour, summing exactly to `total` (largest remainder)"""
+        weights = [self.hour_weight(hour) for hour in range(self.hours)]
+        scale = total / sum(weights)
+        exact = [w * scale for w in weights]
+        counts = [int(x) for x in exact]
+        by_remainder = sorted(range(self.hours), key=lambda hour: counts[hour] - exact[hour])
+        for hour in by_remainder[:total - sum(counts)]:
+            counts[hour] += 1
+        return counts
+
+    def generate_hour(self, hour, count):
+        rng = random.Random(f"{self.seed}:hour:{hour}")
+        bucket_start = self.start + timedelta(hours=hour)
+        burst = self.bursts.get(hour)
+        # Share of this hour's events that belong to the burst rather than background traffic
+        burst_share = 1 - 1 / burst["multiplier"] if burst else 0
+        offsets = sorted(rng.random() * 3600 for _ in range(count))
+        ip_ranks = iter(rng.choices(range(len(self.ips)), cum_weights=self.ip_cum, k=count))
+        age = self.end - bucket_start
+
+        events = []
+        for offset in offsets:
+            rank = next(ip_ranks)
+            if burst and rng.random() < burst_share:
+                event_type = burst["type"]
+                ip, country = _choice(rng, burst["ips"]), burst["country"]
+                severity = _pick(rng, SEVERITIES, BURST_SEVERITY_CUM[event_type])
+                tags = ["automated", "burst", f"burst-{burst['id']}"]
+            else:
+                event_type = _pick(rng, EVENT_TYPES, TYPE_CUM)
+                ip, country = self.ips[rank], self.ip_countries[rank]
+                severity = _pick(rng, SEVERITIES, SEVERITY_CUM[event_type])
+                tags = ["automated"]
+            status = _pick(rng, STATUSES, STATUS_CUM[severity])
+            if status in ("detected", "investigating") and age > timedelta(days=3) and rng.random() < 0.8:
+                status = "resolved"
+            endpoint = _choice(rng, ENDPOINTS[event_type])
+            created = bucket_start + timedelta(seconds=offset)
+            events.append({
+                "eventType": event_type,
+                "severity": severity,
+                "status": status,
+                "description": _choice(rng, DESCRIPTIONS[event_type]),
+                "source": {"ip": ip, "country": country},
+                "target": {"endpoint": endpoint, "service": SERVICES[endpoint], "port": 443 if rng.random() < 0.85 else 80},
+                "tags": tags,
+                "createdAt": created,
+                "updatedAt": created
+            })
+        return events
+
+def generate_events(count, **model_args):
+    """A list of `count` events; for small volumes (seeding, tests)"""
+    model = EventModel(**model_args)
+    events = []
+    for hour, hour_count in enumerate(model.bucket_counts(count)):
+        if hour_count:
+            events.extend(model.generate_hour(hour, hour_count))
+    return events
+
+def parse_end(value):
+    """--end as a naive UTC datetime (ISO 8601; an offset is converted to UTC)"""
+    end = datetime.fromisoformat(value)
+    if end.tzinfo is not None:
+        end = end.astimezone(timezone.utc).replace(tzinfo=None)
+    return end
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat(timespec="milliseconds") + "Z"}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _insert_batch(db, collection, batch):
+    from utils.high_water import reserve_seq_sync
+    with reserve_seq_sync(db, collection, len(batch)) as first:
+        for i, event in enumerate(batch):
+            event["seq"] = first + i
+        db[collection].insert_many(batch, ordered=False)
+
+def _run_task(task):
+    """Generate a range of hours in a worker process and insert or write them; returns the event count"""
+    model = EventModel(**task["model"])
+    written = 0
+    if task["out"]:
+        path = os.path.join(task["out"], f"part-{task['hours'][0][0]:05d}.ndjson")
+        with open(path, "w") as f:
+            for hour, count in task["hours"]:
+                for event in model.generate_hour(hour, count):
+                    f.write(json.dumps(event, default=_json_default) + "\n")
+                written += count
+        return written
+
+    from pymongo import MongoClient
+    client = MongoClient(task["mongo_url"])
+    db = client[task["db_name"]]
+    batch = []
+    for hour, count in task["hours"]:
+        for event in model.generate_hour(hour, count):
+            batch.append(event)
+            if len(batch) >= task["batch_size"]:
+                _insert_batch(db, task["collection"], batch)
+                written += len(batch)
+                batch = []
+    if batch:
+        _insert_batch(db, task["collection"], batch)
+        written += len(batch)
+    client.close()
+    return written
+
+def plan_tasks(counts, batch_size):
+    """Consecutive hours grouped into tasks of at least a few batches each"""
+    tasks, current, size = [], [], 0
+    for hour, count in enumerate(counts):
+        if not count:
+            continue
+        current.append((hour, count))
+        size += count
+        if size >= batch_size * 5:
+            tasks.append(current)
+            current, size = [], 0
+    if current:
+        tasks.append(current)
+    return tasks
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Generate synthetic security events")
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", type=parse_end, help="end of the time range, ISO 8601 UTC (default: the current hour)")
+    parser.add_argument("--ip-pool", type=int, default=50000, help="distinct background source IPs")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of source IP popularity")
+    parser.add_argument("--bursts", type=int, help="attack bursts (default: one per 3 days)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--collection", default="security_events")
+    parser.add_argument("--drop", action="store_true", help="drop the collection first")
+    parser.add_argument("--out", help="write NDJSON part files to this directory instead of MongoDB")
+    args = parser.parse_args()
+
+    load_dotenv()
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    db_name = os.environ.get("DB_NAME", "havosec")
+    # Pin the time range so every worker builds the same model
+    model_args = {
+        "seed": args.seed, "days": args.days, "end": hour_anchor(args.end),
+        "ip_pool": args.ip_pool, "zipf_s": args.zipf, "bursts": args.bursts
+    }
+    model = EventModel(**model_args)
+    counts = model.bucket_counts(args.count)
+    reproduce = (
+        f"--count {args.count} --days {args.days} --seed {args.seed} --end {model.end.isoformat(timespec='minutes')} "
+        f"--ip-pool {args.ip_pool} --zipf {args.zipf}" + (f" --bursts {args.bursts}" if args.bursts is not None else "")
+    )
+    run = {**model_args, "count": args.count, "reproduce": reproduce, "createdAt": datetime.utcnow()}
+    print(f"  Generating with {reproduce}", flush=True)
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        with open(os.path.join(args.out, "manifest.json"), "w") as f:
+            json.dump(run, f, default=_json_default, indent=2)
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_url)
+        if args.drop:
+            client[db_name][args.collection].drop()
+        client[db_name].event_generator_runs.insert_one({"collection": args.collection, **run})
+        client.close()
+
+    tasks = [{
+        "model": model_args, "hours": hours, "out": args.out, "mongo_url": mongo_url,
+        "db_name": db_name, "collection": args.collection, "batch_size": args.batch_size
+    } for hours in plan_tasks(counts, args.batch_size)]
+
+    started = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for future in as_completed([pool.submit(_run_task, task) for task in tasks]):
+            done += future.result()
+            elapsed = time.perf_counter() - started
+            print(f"  {done}/{args.count} events ({done / elapsed:,.0f}/s)", flush=True)
+
+    target = args.out or f"{db_name}.{args.collection}"
+    print(f"✓ Generated {done} events into {target} in {time.perf_counter() - started:.1f}s ({len(model.bursts)} burst hours)")
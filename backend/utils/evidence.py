@@ -0,0 +1,45 @@
+"""Private storage for evidence files (packet captures, logs, archives).
+
+Evidence never enters the public upload store. Files live under
+uploads/evidence, which /api/uploads/images does not serve, and are listed in
+`evidence_files`. Only their uploader or an admin can download them, and the
+responses are never cached.
+"""
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+import os
+import uuid
+
+EVIDENCE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "evidence")
+EVIDENCE_EXTENSIONS = {".pcap", ".pcapng", ".log", ".txt", ".json", ".zip", ".gz", ".pdf"}
+MAX_EVIDENCE_SIZE = int(os.environ.get("MAX_EVIDENCE_SIZE", str(1024 * 1024 * 1024)))  # 1GB
+
+os.makedirs(EVIDENCE_DIR, exist_ok=True)
+
+def evidence_path(evidence_id):
+    return os.path.join(EVIDENCE_DIR, evidence_id)
+
+async def ensure_indexes(db):
+    await db.evidence_files.create_index([("uploadedBy", 1), ("createdAt", -1)])
+
+async def store(db, temp_path, digest, size, content_type, original_name, uploaded_by):
+    """Move a finished file into the evidence directory and record it"""
+    evidence_id = uuid.uuid4().hex
+    await run_in_threadpool(os.replace, temp_path, evidence_path(evidence_id))
+    record = {
+        "_id": evidence_id,
+        "originalName": original_name,
+        "hash": digest,
+        "size": size,
+        "contentType": content_type,
+        "uploadedBy": uploaded_by,
+        "createdAt": datetime.utcnow()
+    }
+    await db.evidence_files.insert_one(record)
+    return record
+
+async def find(db, evidence_id):
+    return await db.evidence_files.find_one({"_id": evidence_id})
+
+def url(evidence_id):
+    return f"/api/uploads/evidence/{evidence_id}"
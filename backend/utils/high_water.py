@@ -0,0 +1,276 @@
+"""Sequence cursors and in-memory high-water marks for `since` polling.
+
+Documents that can be polled carry `seq`, a number reserved from the
+`sequences` collection with an atomic $inc just before they are inserted
+(reserve_seq, insert_sequenced). MongoDB hands the numbers out, so they are
+ordered across every process that writes, whatever its clock or ObjectId
+counter says. They are not *committed* in that order, though: writer A can
+reserve 5, writer B 6, and B's insert land first. A poll that returned 6
+would never see 5. So every reservation is also listed in its counter's
+`open` list until the insert has finished (or failed), and a cursor never
+moves past the lowest open reservation (settled_seq). A writer that dies
+mid-insert leaves its entry behind; after SEQ_RESERVATION_TIMEOUT seconds
+it no longer holds readers back. That timeout is compared across processes'
+clocks, so it must be much longer than both an insert and any clock skew.
+
+Documents stored without a seq (older data, NDJSON loaded with mongoimport)
+are numbered in _id order by ensure_sequenced() during warm-up, or with:
+
+    python -m utils.high_water backfill
+
+A mark is the largest seq in a collection (or in one user's slice of it).
+Inserts bump() it, so the mark follows this process's writes without a
+query. A poll whose `since` cursor is already at the mark is answered with
+204 without touching Mongo. Marks are re-read from Mongo once they are
+HIGH_WATER_TTL seconds old, which is the only way they see documents written
+by other processes (other server workers, the event generator, imports).
+That is the trade-off: a single-writer deployment can set it very high and
+almost never query, while with several writers a poll may answer 204 for up
+to HIGH_WATER_TTL seconds after another process inserted. At most
+HIGH_WATER_MAX_KEYS marks are kept; the least recently used go first.
+"""
+from bson import ObjectId
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from pymongo import ReturnDocument, UpdateOne
+import os
+import time
+
+from utils.responses import find_page
+
+HIGH_WATER_TTL = float(os.environ.get("HIGH_WATER_TTL", "300"))
+HIGH_WATER_MAX_KEYS = int(os.environ.get("HIGH_WATER_MAX_KEYS", "10000"))
+SEQ_RESERVATION_TIMEOUT = float(os.environ.get("SEQ_RESERVATION_TIMEOUT", "60"))
+
+EVENTS_MARK = "security_events"
+# Cursor for a collection with nothing in it yet
+START_CURSOR = "0"
+# Collection -> index that serves its `since` queries and mark reads
+SEQUENCED = {
+    "security_events": [("seq", 1)],
+    "notifications": [("userId", 1), ("seq", 1)]
+}
+
+def notifications_mark(user_id):
+    return f"notifications:{user_id}"
+
+def parse_cursor(since: str):
+    if not since.isdigit():
+        raise HTTPException(status_code=400, detail="since must be a cursor returned by this endpoint")
+    return int(since)
+
+def _reservation(count):
+    """Token and counter update reserving `count` numbers and listing them as open"""
+    token = ObjectId()
+    return token, {
+        "$inc": {"seq": count},
+        "$push": {"open": {"token": token, "count": count, "at": datetime.utcnow()}}
+    }
+
+def _closed(entry, now):
+    return entry.get("done") or now - entry["at"] > timedelta(seconds=SEQ_RESERVATION_TIMEOUT)
+
+def settled_seq(counter):
+    """Largest seq below every open reservation of a `sequences` document.
+
+    Entries are pushed in reservation order and only closed ones are removed,
+    and only from the head, so the numbers after an entry are exactly the
+    counts of the entries behind it.
+    """
+    if counter is None:
+        return 0
+    now = datetime.utcnow()
+    settled = last = counter["seq"]
+    for entry in reversed(counter.get("open", [])):
+        last -= entry["count"]
+        if not _closed(entry, now):
+            settled = last
+    return settled
+
+def _head_release(counter):
+    """Filter and update popping the head of `open` if it is closed, else None"""
+    if not counter or not counter.get("open") or not _closed(counter["open"][0], datetime.utcnow()):
+        return None
+    return {"_id": counter["_id"], "open.0.token": counter["open"][0]["token"]}, {"$pop": {"open": -1}}
+
+async def _trim(counters, counter):
+    # Drop closed entries from the head; anything behind an open one has to stay
+    release = _head_release(counter)
+    while release:
+        counter = await counters.find_one_and_update(*release, return_document=ReturnDocument.AFTER)
+        release = _head_release(counter)
+
+def _trim_sync(counters, counter):
+    release = _head_release(counter)
+    while release:
+        counter = counters.find_one_and_update(*release, return_document=ReturnDocument.AFTER)
+        release = _head_release(counter)
+
+async def _release(counters, name, token):
+    """Close reservation `token`: popped if it heads the list, else marked done for a later trim"""
+    counter = await counters.find_one_and_update(
+        {"_id": name, "open.0.token": token}, {"$pop": {"open": -1}}, return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        await counters.update_one({"_id": name, "open.token": token}, {"$set": {"open.$.done": True}})
+    else:
+        await _trim(counters, counter)
+
+def _release_sync(counters, name, token):
+    counter = counters.find_one_and_update(
+        {"_id": name, "open.0.token": token}, {"$pop": {"open": -1}}, return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        counters.update_one({"_id": name, "open.token": token}, {"$set": {"open.$.done": True}})
+    else:
+        _trim_sync(counters, counter)
+
+@asynccontextmanager
+async def reserve_seq(collection, count=1):
+    """Reserve `count` consecutive sequence numbers for `collection`; yields the first.
+
+    Readers stay below them until the block exits, so insert them inside it.
+    """
+    counters = collection.database.sequences
+    token, update = _reservation(count)
+    counter = await counters.find_one_and_update(
+        {"_id": collection.name}, update, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    await _trim(counters, counter)
+    try:
+        yield counter["seq"] - count + 1
+    finally:
+        await _release(counters, collection.name, token)
+
+@contextmanager
+def reserve_seq_sync(db, name, count):
+    """reserve_seq for a synchronous pymongo database (the event generator's workers)"""
+    token, update = _reservation(count)
+    counter = db.sequences.find_one_and_update({"_id": name}, update, upsert=True, return_document=ReturnDocument.AFTER)
+    _trim_sync(db.sequences, counter)
+    try:
+        yield counter["seq"] - count + 1
+    finally:
+        _release_sync(db.sequences, name, token)
+
+async def insert_sequenced(collection, doc, mark=None):
+    """insert_one with the next `seq`, bumping high-water mark `mark` if given"""
+    async with reserve_seq(collection) as seq:
+        doc["seq"] = seq
+        result = await collection.insert_one(doc)
+    if mark:
+        high_water.bump(mark, seq)
+    return result
+
+async def assign_missing(collection, batch_size=1000):
+    """Number documents stored without a seq, in _id order; returns how many were numbered"""
+    assigned = 0
+    while True:
+        docs = await collection.find({"seq": {"$exists": False}}, {"_id": 1}).sort("_id", 1).to_list(length=batch_size)
+        if not docs:
+            return assigned
+        async with reserve_seq(collection, len(docs)) as first:
+            # Another process numbering the same documents leaves them as it set them
+            await collection.bulk_write([
+                UpdateOne({"_id": doc["_id"], "seq": {"$exists": False}}, {"$set": {"seq": first + i}})
+                for i, doc in enumerate(docs)
+            ], ordered=False)
+        assigned += len(docs)
+
+async def ensure_sequenced(db):
+    for name, keys in SEQUENCED.items():
+        await db[name].create_index(keys)
+        assigned = await assign_missing(db[name])
+        if assigned:
+            print(f"✓ Numbered {assigned} {name} for since polling")
+
+class HighWaterMarks:
+    def __init__(self, max_keys=HIGH_WATER_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> (largest seq or None, monotonic time it was read from Mongo), least recently used first
+        self.marks = OrderedDict()
+
+    def _set(self, key, mark):
+        self.marks[key] = mark
+        self.marks.move_to_end(key)
+        while len(self.marks) > self.max_keys:
+            self.marks.popitem(last=False)
+
+    def bump(self, key, seq):
+        """Record an inserted seq. Marks not loaded yet are read on the next poll."""
+        mark = self.marks.get(key)
+        if mark is not None and (mark[0] is None or seq > mark[0]):
+            self._set(key, (seq, mark[1]))
+
+    async def current(self, key, collection, query=None):
+        mark = self.marks.get(key)
+        if mark is None or time.monotonic() - mark[1] > HIGH_WATER_TTL:
+            if mark is None:
+                # Expired placeholder, so inserts during the first read are still bumped
+                self._set(key, (None, float("-inf")))
+            doc = await collection.find_one({**(query or {}), "seq": {"$exists": True}}, {"seq": 1}, sort=[("seq", -1)])
+            latest = doc["seq"] if doc else None
+            # Keep a newer bump that landed while the query was running
+            mark = self.marks.get(key)
+            if mark is not None and mark[0] is not None and (latest is None or mark[0] > latest):
+                latest = mark[0]
+            mark = (latest, time.monotonic())
+        self._set(key, mark)
+        return mark[0]
+
+high_water = HighWaterMarks()
+
+async def settled(collection):
+    return settled_seq(await collection.database.sequences.find_one({"_id": collection.name}))
+
+def cursor_of(mark):
+    return str(mark) if mark else START_CURSOR
+
+async def current_cursor(collection, key, mark_query=None):
+    """Cursor for a full page read now: the mark, held below any insert still in flight"""
+    mark = await high_water.current(key, collection, mark_query)
+    if mark is None:
+        return START_CURSOR
+    return cursor_of(min(mark, await settled(collection)))
+
+async def find_since(collection, key, query, since, limit, mark_query=None):
+    """Documents matching `query` inserted after cursor `since`, oldest first.
+
+    Returns (documents, next cursor, more waiting), or None when the mark says
+    nothing is newer, without querying, or when nothing newer has settled.
+    `mark_query` selects the slice of the collection the mark `key` covers.
+    """
+    since_seq = parse_cursor(since)
+    mark = await high_water.current(key, collection, mark_query)
+    if mark is None or mark <= since_seq:
+        return None
+    # A seq above an open reservation may be committed before it, so stop short of those
+    upto = await settled(collection)
+    if upto <= since_seq:
+        return None
+    docs = await find_page(collection, {**query, "seq": {"$gt": since_seq, "$lte": upto}}, {"seq": 1}, limit=limit)
+    has_more = len(docs) == limit
+    # With more waiting, resume after the last one returned; otherwise everything up to `upto` was seen
+    return docs, str(docs[-1]["seq"] if has_more else upto), has_more
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Sequence numbers for since polling")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        await ensure_sequenced(client[os.environ.get("DB_NAME", "havosec")])
+        client.close()
+        print("✓ Polled collections are fully numbered")
+
+    asyncio.run(main())
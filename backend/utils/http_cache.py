@@ -0,0 +1,177 @@
+"""Cache-friendly file serving: ETag/Last-Modified validators, 304s, byte ranges
+and an optional in-memory LRU for small hot files.
+
+File bodies are handed to the server for a zero-copy sendfile when it offers
+the ASGI `http.response.zerocopysend` extension (whole files also via
+`http.response.pathsend`), and are streamed from a worker thread otherwise.
+"""
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+import anyio
+import mimetypes
+import os
+
+IMAGE_CACHE_BYTES = int(os.environ.get("IMAGE_CACHE_BYTES", str(32 * 1024 * 1024)))
+IMAGE_CACHE_MAX_ITEM = int(os.environ.get("IMAGE_CACHE_MAX_ITEM", str(512 * 1024)))
+IMMUTABLE = "public, max-age=31536000, immutable"
+STREAM_CHUNK = 256 * 1024
+
+class ByteLRU:
+    """LRU of file bodies bounded by total size"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self.items = OrderedDict()
+
+    def get(self, key):
+        body = self.items.get(key)
+        if body is not None:
+            self.items.move_to_end(key)
+        return body
+
+    def put(self, key, body):
+        if len(body) > self.capacity:
+            return
+        if key in self.items:
+            self.size -= len(self.items.pop(key))
+        self.items[key] = body
+        self.size += len(body)
+        while self.size > self.capacity:
+            _, evicted = self.items.popitem(last=False)
+            self.size -= len(evicted)
+
+file_cache = ByteLRU(IMAGE_CACHE_BYTES)
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def _etag_matches(header, etag):
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _parse_range(header, size):
+    """(start, end) inclusive for a single `bytes=` range, None to ignore, or "invalid" for a 416"""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None  # multipart ranges aren't worth it for images; send the whole file
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start == "":
+            length = int(end)
+            if length == 0:
+                return "invalid"
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "invalid"
+    return start, min(end, size - 1)
+
+class FileRangeResponse(Response):
+    """Sends [start, end] of a file (or of an already-loaded body)"""
+
+    def __init__(self, path, start, end, status_code, headers, media_type, body=None):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.cached_body = body
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        count = self.end - self.start + 1
+        if self.cached_body is not None:
+            await send({"type": "http.response.body", "body": self.cached_body[self.start:self.end + 1]})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            # The server sendfile()s from the file object, so it stays open until send returns
+            f = await run_in_threadpool(open, self.path, "rb")
+            try:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self.start, "count": count})
+            finally:
+                await run_in_threadpool(f.close)
+            return
+        if "http.response.pathsend" in extensions and self.start == 0 and count == os.path.getsize(self.path):
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await f.read(min(STREAM_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+
+async def serve_file(request, path, stat, etag, media_type=None, cache_control=IMMUTABLE, headers=None):
+    """Serve path with validators, 304/206/416 handling and the LRU in front of disk"""
+    mtime = stat.st_mtime
+    size = stat.st_size
+    media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    response_headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        **(headers or {})
+    }
+
+    if _not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=response_headers)
+
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and size and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range == "invalid":
+            response_headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=response_headers)
+        if byte_range:
+            start, end = byte_range
+            status = 206
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    body = None
+    if size <= IMAGE_CACHE_MAX_ITEM and IMAGE_CACHE_BYTES > 0:
+        key = (path, stat.st_mtime_ns, size)
+        body = file_cache.get(key)
+        if body is None:
+            body = await run_in_threadpool(_read_file, path)
+            file_cache.put(key, body)
+
+    if size == 0:
+        return Response(status_code=200, headers=response_headers, media_type=media_type)
+    return FileRangeResponse(path, start, end, status, response_headers, media_type, body)
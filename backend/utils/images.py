@@ -0,0 +1,136 @@
+"""Resized / re-encoded variants of uploaded images.
+
+Variants are produced on a process pool, either right after upload
+(IMAGE_VARIANTS_ON_UPLOAD=true) or lazily on the first request that needs
+one, and are cached on disk next to the originals.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import glob
+import os
+
+VARIANT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "variants")
+VARIANT_WIDTHS = sorted(int(w) for w in os.environ.get("IMAGE_VARIANT_WIDTHS", "320,640,1024,1600").split(",") if w.strip())
+VARIANTS_ON_UPLOAD = os.environ.get("IMAGE_VARIANTS_ON_UPLOAD", "false").lower() == "true"
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "80"))
+
+# Only raster formats Pillow can re-encode without losing animation/vector data
+SOURCE_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp"}
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp", "avif": "image/avif"}
+
+os.makedirs(VARIANT_DIR, exist_ok=True)
+
+_avif = None
+
+def avif_supported():
+    """Whether Pillow can encode AVIF; checked on first use rather than at import"""
+    global _avif
+    if _avif is None:
+        try:
+            from PIL import features
+            _avif = bool(features.check("avif"))
+        except Exception:
+            _avif = False
+    return _avif
+
+def is_resizable(filename):
+    return os.path.splitext(filename)[1].lower() in SOURCE_FORMATS
+
+def pick_width(requested):
+    """Snap a requested width to the nearest configured width at or above it"""
+    if not requested or not VARIANT_WIDTHS:
+        return None
+    for width in VARIANT_WIDTHS:
+        if width >= requested:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+def negotiate_format(accept, filename):
+    """Best encoding the client accepts, falling back to the original format"""
+    accept = accept or ""
+    if avif_supported() and "image/avif" in accept:
+        return "avif"
+    if "image/webp" in accept:
+        return "webp"
+    return SOURCE_FORMATS[os.path.splitext(filename)[1].lower()]
+
+def variant_path(filename, width, fmt):
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(VARIANT_DIR, f"{stem}.{'w' + str(width) if width else 'full'}.{fmt}")
+
+def read_dimensions(path):
+    """(width, height) from the image header, or (None, None) for non-raster files"""
+    try:
+        from PIL import Image
+        with Image.open(path) as img:
+            return img.width, img.height
+    except Exception:
+        return None, None
+
+def remove_variants(filename):
+    stem = os.path.splitext(filename)[0]
+    for path in glob.glob(os.path.join(VARIANT_DIR, glob.escape(stem) + ".*")):
+        os.remove(path)
+
+def generate_variant(source, dest, width, fmt):
+    """Resize (never upscale) and encode source into dest. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if width and img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        temp = f"{dest}.{os.getpid()}.part"
+        options = {"quality": IMAGE_QUALITY}
+        if fmt in ("jpeg", "png"):
+            options["optimize"] = True
+        img.save(temp, format=fmt.upper(), **options)
+    os.replace(temp, dest)
+    return dest
+
+class VariantGenerator:
+    """Produces variants on a process pool, coalescing concurrent requests for the same one"""
+
+    def __init__(self):
+        self.pool = None
+        self.in_flight = {}
+
+    def _get_pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return self.pool
+
+    async def get(self, source, filename, width, fmt):
+        dest = variant_path(filename, width, fmt)
+        if os.path.exists(dest):
+            return dest
+
+        future = self.in_flight.get(dest)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._get_pool(), generate_variant, source, dest, width, fmt)
+            self.in_flight[dest] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(dest, None))
+        # Shield so one client disconnecting doesn't cancel the work for the others
+        return await asyncio.shield(future)
+
+    async def pregenerate(self, source, filename):
+        """Build every configured width in every modern format the server can encode"""
+        formats = ["webp"] + (["avif"] if avif_supported() else [])
+        jobs = [self.get(source, filename, width, fmt) for width in [None, *VARIANT_WIDTHS] for fmt in formats]
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"✗ Variant generation failed for {filename}: {result}")
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+image_variants = VariantGenerator()
@@ -0,0 +1,370 @@
+"""Streaming CSV / NDJSON import of client companies and demo requests.
+
+Rows are read lazily, validated against the pydantic models in
+models/schemas.py and upserted by email in batches of IMPORT_BATCH_SIZE, so
+memory stays flat whatever the file size. Emails are matched and stored
+normalised (normalize_email), as the admin routes store them, and client
+emails are unique. Progress is kept on an
+`import_jobs` document; rows that fail validation or the write are appended
+to an NDJSON error report next to the job's source file.
+
+Each job records the process that owns it (`owner`) and a `heartbeatAt`
+that the owner's job_heartbeat refreshes every JOB_HEARTBEAT_INTERVAL
+seconds. A queued or running job whose heartbeat is older than
+JOB_STALE_AFTER lost its process and is marked interrupted by whichever
+process notices first; jobs of other live processes are left alone.
+
+Run from the command line with:
+
+    python -m utils.importer clients partners.csv
+    python -m utils.importer demo-requests leads.ndjson
+"""
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from models.schemas import ClientCompany, DemoRequest
+from utils import stats
+from utils.search import admin_search
+import asyncio
+import csv
+import json
+import os
+import socket
+import uuid
+
+IMPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "imports")
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+JOB_HEARTBEAT_INTERVAL = int(os.environ.get("JOB_HEARTBEAT_INTERVAL", "15"))
+JOB_STALE_AFTER = int(os.environ.get("JOB_STALE_AFTER", str(JOB_HEARTBEAT_INTERVAL * 4)))
+
+# Owner recorded on the jobs this process runs
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# URL name -> (collection, row model, fields only set when the document is created)
+IMPORT_TARGETS = {
+    "clients": ("client_companies", ClientCompany, {}),
+    "demo-requests": ("demo_requests", DemoRequest, {"status": "new"})
+}
+LIST_FIELDS = {"services"}
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+os.makedirs(IMPORT_DIR, exist_ok=True)
+
+def source_path(job_id):
+    return os.path.join(IMPORT_DIR, f"{job_id}.src")
+
+def error_report_path(job_id):
+    return os.path.join(IMPORT_DIR, f"{job_id}.errors.ndjson")
+
+def detect_format(filename, fmt=None):
+    fmt = fmt or FORMATS.get(os.path.splitext(filename or "")[1].lower())
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError("Unknown format; use a .csv or .ndjson file or pass format=csv|ndjson")
+    return fmt
+
+def _clean_csv_row(row):
+    """CSV has no types: drop blanks so model defaults apply and split list cells on ';'"""
+    cleaned = {}
+    for field, value in row.items():
+        if field is None or value is None or value.strip() == "":
+            continue
+        value = value.strip()
+        cleaned[field] = [v.strip() for v in value.split(";") if v.strip()] if field in LIST_FIELDS else value
+    return cleaned
+
+def iter_rows(path, fmt):
+    """(line number, row dict or parse error) for every row, read one line at a time"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, _clean_csv_row(row)
+        else:
+            for line_num, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_num, e
+                    continue
+                yield line_num, row if isinstance(row, dict) else ValueError("Row is not a JSON object")
+
+def _next_batch(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            break
+    return batch
+
+def _append_errors(path, errors):
+    with open(path, "a", encoding="utf-8") as f:
+        for error in errors:
+            f.write(json.dumps(error, default=str) + "\n")
+
+def _validation_message(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+def normalize_email(email):
+    """Emails are stored trimmed and lowercased, so every writer matches the same document"""
+    return email.strip().lower() if isinstance(email, str) else email
+
+def build_ops(batch, model, on_insert, now):
+    """UpdateOne upserts keyed on email for the valid rows, plus error records for the rest"""
+    ops, lines, errors = [], [], []
+    for line_num, row in batch:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            validated = model.model_validate(row)
+        except (ValidationError, ValueError) as e:
+            errors.append({"line": line_num, "error": _validation_message(e), "row": row if isinstance(row, dict) else None})
+            continue
+        # Only overwrite the columns the row has; defaults apply to new documents
+        doc = validated.model_dump(exclude_unset=True)
+        defaults = {k: v for k, v in validated.model_dump().items() if k not in doc}
+        doc["email"] = normalize_email(doc["email"])
+        doc["updatedAt"] = now
+        ops.append(UpdateOne(
+            {"email": doc["email"]},
+            {"$set": doc, "$setOnInsert": {**defaults, **on_insert, "createdAt": now}},
+            upsert=True
+        ))
+        lines.append((line_num, row))
+    return ops, lines, errors
+
+# Documents without an email are exempt from the unique index
+UNIQUE_EMAIL = {"unique": True, "partialFilterExpression": {"email": {"$type": "string"}}}
+
+async def normalize_stored_emails(collection):
+    """Normalise emails stored before writers did; returns how many changed"""
+    changed = 0
+    while True:
+        docs = await collection.find(
+            {"email": {"$type": "string", "$regex": r"[A-Z]|^\s|\s$"}}, {"email": 1}
+        ).to_list(length=IMPORT_BATCH_SIZE)
+        if not docs:
+            return changed
+        await collection.bulk_write([
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"email": normalize_email(doc["email"])}}) for doc in docs
+        ], ordered=False)
+        changed += len(docs)
+
+async def ensure_unique_email(collection):
+    """Replace a non-unique email index with a unique one.
+
+    If normalising left duplicates behind, the index stays non-unique and the
+    duplicated emails are printed so they can be merged by hand.
+    """
+    index = (await collection.index_information()).get("email_1")
+    if index and index.get("unique"):
+        return
+    if index:
+        await collection.drop_index("email_1")
+    try:
+        await collection.create_index("email", **UNIQUE_EMAIL)
+    except OperationFailure as e:
+        await collection.create_index("email")
+        duplicates = await collection.aggregate([
+            {"$match": {"email": {"$type": "string"}}},
+            {"$group": {"_id": "$email", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": 20}
+        ]).to_list(length=20)
+        if duplicates:
+            print(f"✗ {collection.name}.email is not unique yet; merge these duplicates: {', '.join(d['_id'] for d in duplicates)}")
+        else:
+            print(f"✗ Unique index on {collection.name}.email failed: {e}")
+
+async def ensure_indexes(db):
+    for name, _, _ in IMPORT_TARGETS.values():
+        changed = await normalize_stored_emails(db[name])
+        if changed:
+            print(f"✓ Normalised {changed} {name} emails")
+    await ensure_unique_email(db.client_companies)
+    await db.demo_requests.create_index("email")
+    await db.import_jobs.create_index([("createdAt", -1)])
+    await db.import_jobs.create_index([("state", 1), ("heartbeatAt", 1)])
+
+async def interrupt_stale_jobs(db):
+    """Mark jobs whose owner stopped sending heartbeats as interrupted"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=JOB_STALE_AFTER)
+    result = await db.import_jobs.update_many(
+        {
+            "state": {"$in": ["queued", "running"]},
+            "owner": {"$ne": PROCESS_ID},
+            "$or": [
+                {"heartbeatAt": {"$lt": cutoff}},
+                # Jobs from before owners were recorded
+                {"heartbeatAt": {"$exists": False}, "createdAt": {"$lt": cutoff}}
+            ]
+        },
+        {"$set": {"state": "interrupted", "finishedAt": now}}
+    )
+    return result.modified_count
+
+class JobHeartbeat:
+    """Keeps this process's jobs marked alive and interrupts jobs whose owner died"""
+
+    def __init__(self, interval=JOB_HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self.db = None
+        self.task = None
+
+    async def beat(self):
+        await self.db.import_jobs.update_many(
+            {"owner": PROCESS_ID, "state": {"$in": ["queued", "running"]}},
+            {"$set": {"heartbeatAt": datetime.utcnow()}}
+        )
+        interrupted = await interrupt_stale_jobs(self.db)
+        if interrupted:
+            print(f"✓ Marked {interrupted} abandoned import jobs as interrupted")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.beat()
+            except Exception as e:
+                print(f"✗ Import job heartbeat failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self, db):
+        self.db = db
+        await ensure_indexes(db)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+job_heartbeat = JobHeartbeat()
+
+async def create_job(db, target, filename, fmt, created_by=None):
+    job = {
+        "target": target,
+        "filename": filename,
+        "format": fmt,
+        "state": "queued",
+        "processed": 0,
+        "inserted": 0,
+        "updated": 0,
+        "failed": 0,
+        "createdBy": created_by,
+        "owner": PROCESS_ID,
+        "createdAt": datetime.utcnow(),
+        "heartbeatAt": datetime.utcnow()
+    }
+    result = await db.import_jobs.insert_one(job)
+    return str(result.inserted_id)
+
+async def write_ops(collection, ops, lines, errors, counts, retry=True):
+    """bulk_write the upserts, adding to counts and errors.
+
+    A row whose upsert lost a race with another import for the same new email
+    fails with a duplicate key error; it is retried once and then updates the
+    document the other import inserted.
+    """
+    try:
+        result = await collection.bulk_write(ops, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        raced = []
+        for write_error in details.get("writeErrors", []):
+            if retry and write_error.get("code") == 11000:
+                raced.append(write_error["index"])
+                continue
+            line_num, row = lines[write_error["index"]]
+            errors.append({"line": line_num, "error": write_error.get("errmsg"), "row": row})
+        if raced:
+            await write_ops(collection, [ops[i] for i in raced], [lines[i] for i in raced], errors, counts, retry=False)
+    counts["inserted"] += details.get("nUpserted", 0)
+    counts["updated"] += details.get("nModified", 0)
+
+async def run_import(db, job_id, path, target, fmt, on_batch=None):
+    """Import path into target, updating the job document after every batch"""
+    collection, model, on_insert = IMPORT_TARGETS[target]
+    job_filter = {"_id": ObjectId(job_id)}
+    report = error_report_path(job_id)
+    counts = {"processed": 0, "inserted": 0, "updated": 0, "failed": 0}
+    await db.import_jobs.update_one(job_filter, {"$set": {
+        "state": "running", "owner": PROCESS_ID, "startedAt": datetime.utcnow(), "heartbeatAt": datetime.utcnow()
+    }})
+
+    try:
+        rows = iter_rows(path, fmt)
+        while True:
+            batch = await run_in_threadpool(_next_batch, rows, IMPORT_BATCH_SIZE)
+            if not batch:
+                break
+            ops, lines, errors = build_ops(batch, model, on_insert, datetime.utcnow())
+            if ops:
+                await write_ops(db[collection], ops, lines, errors, counts)
+            if errors:
+                await run_in_threadpool(_append_errors, report, errors)
+            counts["processed"] += len(batch)
+            counts["failed"] += len(errors)
+            await db.import_jobs.update_one(job_filter, {"$set": {**counts, "updatedAt": datetime.utcnow()}})
+            if on_batch:
+                on_batch(counts)
+    except Exception as e:
+        await db.import_jobs.update_one(job_filter, {"$set": {
+            **counts, "state": "failed", "error": str(e), "finishedAt": datetime.utcnow()
+        }})
+        raise
+
+    await stats.reconcile(db)
+    await admin_search.rebuild(db)
+    await db.import_jobs.update_one(job_filter, {"$set": {
+        **counts,
+        "state": "completed",
+        "errorReport": counts["failed"] > 0,
+        "finishedAt": datetime.utcnow()
+    }})
+    return counts
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Import clients or demo requests from CSV / NDJSON")
+    parser.add_argument("target", choices=list(IMPORT_TARGETS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="defaults to the file extension")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        db = client[os.environ.get("DB_NAME", "havosec")]
+        fmt = detect_format(args.path, args.format)
+        # Heartbeats keep the server from marking this job interrupted
+        await job_heartbeat.start(db)
+        job_id = await create_job(db, args.target, os.path.basename(args.path), fmt, "cli")
+        try:
+            counts = await run_import(
+                db, job_id, args.path, args.target, fmt,
+                on_batch=lambda c: print(f"  {c['processed']} rows, {c['failed']} failed", flush=True)
+            )
+        finally:
+            await job_heartbeat.stop()
+        client.close()
+        print(f"✓ Import {job_id} finished: {counts}")
+        if counts["failed"]:
+            print(f"  Error report: {error_report_path(job_id)}")
+
+    asyncio.run(main())
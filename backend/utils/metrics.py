@@ -0,0 +1,263 @@
+"""In-process Prometheus metrics.
+
+Histograms are fixed arrays of bucket counters updated with a bisect, so
+recording costs a couple of microseconds. There are no locks: an increment
+from a driver thread can very occasionally be lost, which is fine for
+monitoring.
+
+Everything is rendered in the Prometheus text format by /api/metrics:
+
+- http_request_duration_seconds{route,method,status} from MetricsMiddleware,
+  labelled with the matched route template (not the raw path)
+- http_requests_in_flight
+- websocket_connections, read from the notifications ConnectionManager
+- mongodb_command_duration_seconds{collection,command} from a pymongo
+  CommandListener
+- mongodb_pool_checkout_seconds from a pymongo ConnectionPoolListener
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from pymongo import monitoring
+import os
+import threading
+import time
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.children = {}
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value, *values):
+        self.labels(*values).observe(value)
+
+    def collect(self):
+        for values, child in list(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, child.counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, ('le', bound))} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, values, ('le', '+Inf'))} {child.count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, values)} {child.sum}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, values)} {child.count}"
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, amount=1, *values):
+        self.values[values] = self.values.get(values, 0) + amount
+
+    def collect(self):
+        for values, value in list(self.values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {value}"
+
+class Gauge:
+    """A settable value, or one computed at scrape time by `callback`"""
+    type = "gauge"
+
+    def __init__(self, name, help, callback=None):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.callback = callback
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def collect(self):
+        yield f"{self.name} {self.callback() if self.callback else self.value}"
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("route", "method", "status")
+))
+http_requests_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests being handled"))
+mongodb_command_duration = registry.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("collection", "command"), FAST_BUCKETS
+))
+mongodb_command_failures = registry.register(Counter(
+    "mongodb_command_failures_total", "MongoDB commands that returned an error", ("collection", "command")
+))
+mongodb_pool_checkout = registry.register(Histogram(
+    "mongodb_pool_checkout_seconds", "Time spent waiting for a pooled MongoDB connection", (), FAST_BUCKETS
+))
+
+def _websocket_connections():
+    from routes.notifications import manager
+    return sum(len(connections) for connections in list(manager.active_connections.values()))
+
+registry.register(Gauge("websocket_connections", "Open notification WebSockets", _websocket_connections))
+
+# ASGI scope of the request being handled, so code deeper in the stack (e.g. a
+# driver listener; Motor copies the context into its worker threads) can tell
+# which route it is serving once routing has filled in scope["route"]
+current_scope = ContextVar("current_scope", default=None)
+
+def route_template(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request (no per-request objects beyond a closure)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        current_scope.set(scope)
+        http_requests_in_flight.value += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.value -= 1
+            http_request_duration.labels(route_template(scope), scope["method"], status).observe(time.perf_counter() - started)
+
+def _collection_of(event):
+    if event.command_name == "getMore":
+        return event.command.get("collection", "-")
+    target = event.command.get(event.command_name)
+    return target if isinstance(target, str) else "-"
+
+class CommandMetrics(monitoring.CommandListener):
+    """Per-collection command latency; pymongo reports the duration on completion"""
+
+    def __init__(self):
+        self.collections = {}
+
+    def started(self, event):
+        self.collections[(event.connection_id, event.request_id)] = _collection_of(event)
+
+    def succeeded(self, event):
+        collection = self.collections.pop((event.connection_id, event.request_id), "-")
+        mongodb_command_duration.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self.collections.pop((event.connection_id, event.request_id), "-")
+        mongodb_command_duration.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        mongodb_command_failures.inc(1, collection, event.command_name)
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Checkout wait time. Checkout runs start to finish on one driver thread,
+    so the start time is kept thread-locally."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self.local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self.local, "started", None)
+        if started is not None:
+            mongodb_pool_checkout.observe(time.perf_counter() - started)
+            self.local.started = None
+
+    def connection_check_out_failed(self, event):
+        self.connection_checked_out(event)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+def mongo_listeners():
+    return [CommandMetrics(), PoolMetrics()]
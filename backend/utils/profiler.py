@@ -0,0 +1,334 @@
+"""On-demand wall-clock profiler for single requests.
+
+A request is profiled when it carries `X-Profile: <admin token>`, when an
+admin has switched profiling on (optionally for one route prefix), or when
+1-in-PROFILE_SAMPLE_EVERY sampling is configured. Otherwise the middleware
+only checks for the header, and no sampler thread runs.
+
+While a profiled request is in flight a sampler thread looks at its asyncio
+task every PROFILE_INTERVAL_MS. If the task is running, its frames are read
+from the event-loop thread's live stack. If it is suspended, its coroutine
+await chain is walked down to the awaited future. Time spent waiting on
+Mongo, threads or the network therefore shows up under the await that caused
+it. Each profile is saved as a speedscope JSON file and a collapsed-stack
+file (for flamegraph.pl) and is listed at /api/admin/diagnostics/profiles.
+
+The list is kept on disk next to the profiles (a <id>.meta.json summary for
+each), so every worker process sharing PROFILE_DIR sees the same profiles
+and the newest PROFILE_KEEP of them survive restarts. Writing, listing and
+pruning all run in the threadpool.
+"""
+from collections import Counter
+from datetime import datetime
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "profiles")
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "2"))
+PROFILE_SAMPLE_EVERY = int(os.environ.get("PROFILE_SAMPLE_EVERY", "0"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID = re.compile(r"^[0-9a-f]{12}$")
+PROFILE_SUFFIXES = (".meta.json", ".speedscope.json", ".collapsed.txt")
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _awaited_frame(awaitable):
+    return getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None) or getattr(awaitable, "ag_frame", None)
+
+def _next_awaitable(awaitable):
+    return getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) or getattr(awaitable, "ag_await", None)
+
+def task_stack(task, loop, loop_thread_id):
+    """Root-first frame labels for what `task` is doing right now"""
+    coro = task.get_coro()
+    # current_task with an explicit loop only reads the loop's running task, so it is safe off-thread
+    if asyncio.current_task(loop) is task:
+        frame = sys._current_frames().get(loop_thread_id)
+        outer = _awaited_frame(coro)
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            if frame is outer:
+                return stack[::-1]
+            frame = frame.f_back
+        # Raced with the task finishing its step; fall through to the await chain
+
+    stack = []
+    awaitable = coro
+    while awaitable is not None:
+        frame = _awaited_frame(awaitable)
+        if frame is None:
+            stack.append(f"[await {type(awaitable).__name__}]")
+            break
+        stack.append(_frame_label(frame))
+        awaitable = _next_awaitable(awaitable)
+    return stack
+
+class ProfileSession:
+    def __init__(self, method, path):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.task = asyncio.current_task()
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.samples = Counter()
+        self.started = time.perf_counter()
+        self.last_sample = self.started
+
+class Sampler:
+    """One background thread sampling every active session; exits when there are none"""
+
+    def __init__(self):
+        self.sessions = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, session):
+        with self.lock:
+            self.sessions.add(session)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self.thread.start()
+
+    def remove(self, session):
+        """Stop sampling `session`; once this returns its samples are no longer written"""
+        with self.lock:
+            self.sessions.discard(session)
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                if not self.sessions:
+                    self.thread = None
+                    return
+                sessions = list(self.sessions)
+            now = time.perf_counter()
+            stacks = []
+            for session in sessions:
+                try:
+                    stacks.append((session, task_stack(session.task, session.loop, session.thread_id)))
+                except Exception:
+                    continue
+            # Record under the lock, skipping sessions removed meanwhile: their samples are being saved
+            with self.lock:
+                for session, stack in stacks:
+                    if session not in self.sessions:
+                        continue
+                    if stack:
+                        # Weight by real elapsed time so a late wake-up doesn't skew the profile
+                        session.samples[tuple(stack)] += (now - session.last_sample) * 1000
+                    session.last_sample = now
+
+sampler = Sampler()
+
+def to_collapsed(samples):
+    return "".join(f"{';'.join(stack)} {max(1, round(ms * 1000))}\n" for stack, ms in samples.items())
+
+def to_speedscope(session, samples, duration_ms):
+    frames, index = [], {}
+    profile_samples, weights = [], []
+    for stack, ms in samples.items():
+        ids = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            ids.append(index[label])
+        profile_samples.append(ids)
+        weights.append(round(ms, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{session.method} {session.path}",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": round(duration_ms, 3),
+            "samples": profile_samples,
+            "weights": weights
+        }],
+        "exporter": "havosec-profiler"
+    }
+
+def _index_files():
+    """Summary files, newest first"""
+    entries = []
+    for path in glob.glob(os.path.join(PROFILE_DIR, "*.meta.json")):
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    return [path for _, path in sorted(entries, reverse=True)]
+
+def _read_summary(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _delete_profile(session_id):
+    for suffix in PROFILE_SUFFIXES:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, session_id + suffix))
+        except FileNotFoundError:
+            pass
+
+def _save_profile(summary, speedscope, collapsed):
+    """Write a profile and its summary, then prune all but the newest PROFILE_KEEP"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    session_id = summary["id"]
+    with open(os.path.join(PROFILE_DIR, f"{session_id}.speedscope.json"), "w") as f:
+        json.dump(speedscope, f)
+    with open(os.path.join(PROFILE_DIR, f"{session_id}.collapsed.txt"), "w") as f:
+        f.write(collapsed)
+    # The summary goes last: a listed profile always has its files
+    temp = os.path.join(PROFILE_DIR, f".{session_id}.meta.tmp")
+    with open(temp, "w") as f:
+        json.dump(summary, f, default=str)
+    os.replace(temp, os.path.join(PROFILE_DIR, f"{session_id}.meta.json"))
+
+    for path in _index_files()[PROFILE_KEEP:]:
+        _delete_profile(os.path.basename(path)[:-len(".meta.json")])
+
+def _list_profiles(limit):
+    summaries = (_read_summary(path) for path in _index_files()[:limit])
+    return [summary for summary in summaries if summary]
+
+def _find_profile(session_id):
+    if not PROFILE_ID.match(session_id):
+        return None
+    return _read_summary(os.path.join(PROFILE_DIR, f"{session_id}.meta.json"))
+
+def profile_path(session_id, fmt):
+    suffix = ".speedscope.json" if fmt == "speedscope" else ".collapsed.txt"
+    return os.path.join(PROFILE_DIR, session_id + suffix)
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.route_prefix = None
+        self.remaining = None
+        self.sample_every = PROFILE_SAMPLE_EVERY
+        self.seen = 0
+
+    @property
+    def armed(self):
+        return self.enabled or self.sample_every > 0
+
+    def configure(self, enabled, route_prefix=None, max_requests=None, sample_every=None):
+        self.enabled = enabled
+        self.route_prefix = route_prefix
+        self.remaining = max_requests
+        if sample_every is not None:
+            self.sample_every = sample_every
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "routePrefix": self.route_prefix,
+            "remaining": self.remaining,
+            "sampleEvery": self.sample_every
+        }
+
+    def _header_authorized(self, scope):
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                from fastapi import HTTPException
+                from routes.admin_auth import verify_token
+                try:
+                    verify_token(value.decode("latin-1"))
+                    return True
+                except HTTPException:
+                    return False
+        return False
+
+    def should_profile(self, scope):
+        if self._header_authorized(scope):
+            return True
+        if not self.armed:
+            return False
+        if self.enabled and (not self.route_prefix or scope["path"].startswith(self.route_prefix)):
+            if self.remaining is not None:
+                if self.remaining <= 0:
+                    self.enabled = False
+                    return False
+                self.remaining -= 1
+            return True
+        if self.sample_every > 0:
+            self.seen += 1
+            return self.seen % self.sample_every == 0
+        return False
+
+    async def list(self, limit=50):
+        """Stored profile summaries, newest first"""
+        from starlette.concurrency import run_in_threadpool
+        return await run_in_threadpool(_list_profiles, limit)
+
+    async def stored(self):
+        from starlette.concurrency import run_in_threadpool
+        return len(await run_in_threadpool(_index_files))
+
+    async def find(self, session_id):
+        from starlette.concurrency import run_in_threadpool
+        return await run_in_threadpool(_find_profile, session_id)
+
+profiler = Profiler()
+
+class ProfilerMiddleware:
+    """Profiles selected HTTP requests and adds an X-Profile-Id response header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.should_profile(scope):
+            return await self.app(scope, receive, send)
+
+        from starlette.concurrency import run_in_threadpool
+        from utils.metrics import route_template
+
+        session = ProfileSession(scope["method"], scope["path"])
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", session.id.encode())]}
+            await send(message)
+
+        sampler.add(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.remove(session)
+            duration_ms = (time.perf_counter() - session.started) * 1000
+            samples = dict(session.samples)
+            summary = {
+                "id": session.id,
+                "method": session.method,
+                "path": session.path,
+                "route": route_template(scope),
+                "status": status,
+                "durationMs": round(duration_ms, 2),
+                "samples": len(samples),
+                "createdAt": datetime.utcnow().isoformat()
+            }
+            await run_in_threadpool(
+                _save_profile, summary, to_speedscope(session, samples, duration_ms), to_collapsed(samples)
+            )
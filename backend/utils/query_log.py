@@ -0,0 +1,286 @@
+"""Query diagnostics: per-shape timings, a slow-query log and periodic explains.
+
+A pymongo CommandListener groups every read/write command by collection,
+command and *shape* (the filter/sort/pipeline with values replaced by 1) and
+keeps count, total and max time plus the routes that issued it. Commands over
+SLOW_QUERY_MS are printed and kept in a short ring buffer.
+
+Every QUERY_EXPLAIN_INTERVAL seconds the most expensive shapes are explained
+(queryPlanner only, nothing is executed) using a command recorded for that
+shape with its values redacted (see redact), and flagged when the winning plan scans the whole collection
+(COLLSCAN) or sorts in memory (SORT). Results are served from
+/api/admin/diagnostics/queries.
+"""
+from bson import ObjectId
+from bson.regex import Regex
+from collections import deque
+from datetime import datetime
+from pymongo import monitoring
+import re
+from utils.metrics import current_scope, route_template
+import asyncio
+import copy
+import json
+import os
+import threading
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+QUERY_EXPLAIN_INTERVAL = float(os.environ.get("QUERY_EXPLAIN_INTERVAL", "600"))
+QUERY_EXPLAIN_TOP = int(os.environ.get("QUERY_EXPLAIN_TOP", "50"))
+MAX_SHAPES = 2000
+
+# command -> fields holding its query shape
+SHAPE_FIELDS = {
+    "find": ("filter", "sort"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort"),
+    "update": ("updates",),
+    "delete": ("deletes",)
+}
+# Keys that belong to the session/connection, not the query
+SESSION_KEYS = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference", "readConcern",
+                "writeConcern", "startTransaction", "autocommit", "apiVersion", "apiStrict"}
+
+def shape_of(value):
+    """value with every literal replaced by 1, keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: shape_of(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [shape_of(item) for item in value]
+        return [1] if value else []
+    return 1
+
+# Command fields that carry user-supplied values; redacted in the stored sample
+REDACTED_FIELDS = {"filter", "query", "pipeline", "update", "updates", "deletes", "projection", "fields", "let"}
+# Strings that name fields, collections or options rather than hold data
+STRUCTURE_KEYS = {"$options", "from", "localField", "foreignField", "as", "includeArrayIndex", "$count", "$out"}
+# "$field" / "$$variable" references in expressions (a bcrypt hash starts with "$2b$", so not those)
+FIELD_PATH = re.compile(r"^\$\$?[A-Za-z_][\w.]*$")
+
+def redact(value, key=None):
+    """value with every literal replaced by a placeholder of the same type.
+
+    Keeps what explain needs to plan the query (field names, operators, $field
+    paths, lookup targets) and nothing a user typed or stored: no emails,
+    names, tokens or password hashes.
+    """
+    if isinstance(value, dict):
+        return {k: redact(item, k) for k, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, key) for item in value]
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return value if FIELD_PATH.match(value) or key in STRUCTURE_KEYS else "x"
+    if isinstance(value, datetime):
+        return datetime(1970, 1, 1)
+    if isinstance(value, ObjectId):
+        return ObjectId("0" * 24)
+    if isinstance(value, (Regex, re.Pattern)):
+        return Regex("x")
+    return "x"
+
+def command_sample(command):
+    """The command without session fields and with its values redacted"""
+    return {
+        k: redact(v) if k in REDACTED_FIELDS else v
+        for k, v in command.items() if k not in SESSION_KEYS
+    }
+
+def command_shape(command_name, command):
+    shape = {}
+    for field in SHAPE_FIELDS[command_name]:
+        value = command.get(field)
+        if value is None:
+            continue
+        if field in ("updates", "deletes"):
+            # Batched writes share one filter shape in practice; the first stands for all
+            shape["q"] = shape_of(value[0].get("q", {})) if value else {}
+        elif field in ("key", "sort"):
+            # Field names and sort directions are part of the shape, not values
+            shape[field] = value if isinstance(value, str) else dict(value)
+        else:
+            shape[field] = shape_of(value)
+    return shape
+
+def plan_stages(plan):
+    """Every `stage` name anywhere under an explain's winning plan"""
+    stages = []
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+def winning_plans(explain):
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield value
+            else:
+                yield from winning_plans(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from winning_plans(item)
+
+class QueryLog(monitoring.CommandListener):
+    def __init__(self):
+        self.pending = {}
+        self.shapes = {}
+        self.slow = deque(maxlen=200)
+        self.lock = threading.Lock()
+        self.db = None
+        self.task = None
+
+    def started(self, event):
+        if event.command_name not in SHAPE_FIELDS:
+            return
+        scope = current_scope.get()
+        self.pending[(event.connection_id, event.request_id)] = (event.command, event.database_name, scope)
+
+    def _finished(self, event, failed=False):
+        entry = self.pending.pop((event.connection_id, event.request_id), None)
+        if entry is None:
+            return
+        command, database, scope = entry
+        command_name = event.command_name
+        collection = command.get(command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        elapsed_ms = event.duration_micros / 1000
+        route = route_template(scope) if scope else "background"
+        shape = command_shape(command_name, command)
+        key = (collection, command_name, json.dumps(shape, sort_keys=True, default=str))
+
+        with self.lock:
+            stats = self.shapes.get(key)
+            # Once MAX_SHAPES are tracked new shapes get no stats, but are still logged when slow
+            if stats is None and len(self.shapes) < MAX_SHAPES:
+                stats = self.shapes[key] = {
+                    "collection": collection,
+                    "command": command_name,
+                    "shape": shape,
+                    "count": 0,
+                    "totalMs": 0.0,
+                    "maxMs": 0.0,
+                    "slowCount": 0,
+                    "failures": 0,
+                    "routes": set(),
+                    "sample": None,
+                    "database": database,
+                    "explain": None
+                }
+            if stats is not None:
+                stats["count"] += 1
+                stats["totalMs"] += elapsed_ms
+                stats["maxMs"] = max(stats["maxMs"], elapsed_ms)
+                stats["failures"] += failed
+                if len(stats["routes"]) < 10:
+                    stats["routes"].add(route)
+                if stats["sample"] is None:
+                    stats["sample"] = command_sample(command)
+                if elapsed_ms >= SLOW_QUERY_MS:
+                    stats["slowCount"] += 1
+
+        if elapsed_ms >= SLOW_QUERY_MS:
+            self.slow.append({
+                "at": datetime.utcnow(),
+                "ms": round(elapsed_ms, 2),
+                "collection": collection,
+                "command": command_name,
+                "shape": shape,
+                "route": route
+            })
+            print(f"✗ Slow query {elapsed_ms:.0f}ms {collection}.{command_name} {key[2]} route={route}")
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+    def top(self, limit=20, sort="totalMs", flagged_only=False):
+        with self.lock:
+            shapes = list(self.shapes.values())
+        if flagged_only:
+            shapes = [s for s in shapes if s["explain"] and s["explain"]["flags"]]
+        shapes.sort(key=lambda s: -s[sort])
+        return [{
+            "collection": s["collection"],
+            "command": s["command"],
+            "shape": s["shape"],
+            "count": s["count"],
+            "totalMs": round(s["totalMs"], 2),
+            "avgMs": round(s["totalMs"] / s["count"], 2) if s["count"] else 0,
+            "maxMs": round(s["maxMs"], 2),
+            "slowCount": s["slowCount"],
+            "failures": s["failures"],
+            "routes": sorted(s["routes"]),
+            "explain": s["explain"]
+        } for s in shapes[:limit]]
+
+    async def explain_shape(self, stats):
+        sample = copy.deepcopy(stats["sample"])
+        if stats["command"] == "aggregate" and any("$out" in stage or "$merge" in stage for stage in sample.get("pipeline", [])):
+            return
+        client = self.db.client
+        try:
+            result = await client[stats["database"]].command({"explain": sample, "verbosity": "queryPlanner"})
+        except Exception as e:
+            stats["explain"] = {"error": str(e), "flags": [], "explainedAt": datetime.utcnow()}
+            return
+        stages = [stage for plan in winning_plans(result) for stage in plan_stages(plan)]
+        flags = []
+        if "COLLSCAN" in stages:
+            flags.append("COLLSCAN")
+        if "SORT" in stages:
+            flags.append("IN_MEMORY_SORT")
+        stats["explain"] = {"stages": sorted(set(stages)), "flags": flags, "explainedAt": datetime.utcnow()}
+
+    async def explain_top(self):
+        """Explain the QUERY_EXPLAIN_TOP most expensive shapes; returns how many were flagged"""
+        with self.lock:
+            candidates = sorted(self.shapes.values(), key=lambda s: -s["totalMs"])[:QUERY_EXPLAIN_TOP]
+        for stats in candidates:
+            await self.explain_shape(stats)
+        flagged = [s for s in candidates if s["explain"] and s["explain"]["flags"]]
+        for s in flagged:
+            print(f"✗ {s['collection']}.{s['command']} {json.dumps(s['shape'], default=str)}: {', '.join(s['explain']['flags'])}")
+        return len(flagged)
+
+    def reset(self):
+        with self.lock:
+            self.shapes.clear()
+            self.slow.clear()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(QUERY_EXPLAIN_INTERVAL)
+            try:
+                await self.explain_top()
+            except Exception as e:
+                print(f"✗ Query explain failed: {e}")
+
+    def start(self, db):
+        self.db = db
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+query_log = QueryLog()
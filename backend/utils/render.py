@@ -0,0 +1,232 @@
+"""Blog post rendering: markdown/HTML -> sanitized HTML, reading time and table of contents.
+
+A post's `contentFormat` says what its content is. "markdown" goes through
+CommonMark and then the sanitizer; "html" (the default, and what every post
+written before the flag existed holds) is only sanitized, so indented HTML is
+never mistaken for a markdown code block.
+
+Posts are rendered once when they are written and the output is stored on the
+post, so read paths never render. Re-render every post after changing the
+renderer (bump RENDERER_VERSION first):
+
+    python -m utils.render            # posts rendered by an older version
+    python -m utils.render --all      # every post
+"""
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+from html.parser import HTMLParser
+from utils.slugs import slugify
+import asyncio
+import os
+
+RENDERER_VERSION = 2
+WORDS_PER_MINUTE = 200
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "2"))
+
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "code", "del", "div", "em", "figcaption", "figure",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i", "img", "li", "ol", "p", "pre", "s", "span",
+    "strong", "sub", "sup", "table", "tbody", "td", "th", "thead", "tr", "u", "ul"
+}
+ALLOWED_ATTRS = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+    "code": {"class"},
+    "pre": {"class"},
+    "span": {"class"},
+    "div": {"class"}
+}
+URL_ATTRS = {"href", "src"}
+SAFE_SCHEMES = ("http", "https", "mailto")
+DROP_WITH_CONTENT = {"script", "style", "iframe", "object", "embed", "noscript", "template", "svg", "math"}
+VOID_TAGS = {"br", "hr", "img"}
+TOC_LEVELS = {"h2": 2, "h3": 3}
+CONTENT_FORMATS = ("html", "markdown")
+DEFAULT_CONTENT_FORMAT = "html"
+
+_markdown = None
+
+def _markdown_renderer():
+    # Built on first render so importing the blog routes stays cheap at start-up
+    global _markdown
+    if _markdown is None:
+        from markdown_it import MarkdownIt
+        _markdown = MarkdownIt("commonmark", {"html": True}).enable("table").enable("strikethrough")
+    return _markdown
+
+def _is_safe_url(value):
+    value = value.strip()
+    scheme, sep, _ = value.partition(":")
+    if not sep or "/" in scheme or "?" in scheme or "#" in scheme:
+        return True  # relative URL
+    return scheme.strip().lower() in SAFE_SCHEMES
+
+class _Sanitizer(HTMLParser):
+    """Allow-list HTML sanitizer that also collects headings and word counts"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open_tags = []
+        self.skip_depth = 0
+        self.words = 0
+        self.toc = []
+        self.heading_ids = set()
+        self.heading = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_WITH_CONTENT:
+            self.skip_depth += 1
+            return
+        if self.skip_depth or tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRS.get(tag, set())
+        kept = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRS and not _is_safe_url(value):
+                continue
+            kept.append(f' {name}="{escape(value)}"')
+        if tag == "a":
+            kept.append(' rel="noopener noreferrer nofollow"')
+
+        if tag in TOC_LEVELS and self.heading is None:
+            # The id is only known once the heading text has been read
+            self.heading = {"tag": tag, "index": len(self.out), "attrs": "".join(kept), "text": []}
+            self.out.append("")
+        else:
+            self.out.append(f"<{tag}{''.join(kept)}>")
+
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_WITH_CONTENT:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+            return
+        if self.skip_depth or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.out.append(f"</{current}>")
+            if self.heading and current == self.heading["tag"]:
+                self._finish_heading()
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        self.words += len(data.split())
+        if self.heading is not None:
+            self.heading["text"].append(data)
+        self.out.append(escape(data, quote=False))
+
+    def _finish_heading(self):
+        heading = self.heading
+        self.heading = None
+        text = " ".join("".join(heading["text"]).split())
+        base = slugify(text) or "section"
+        anchor = base
+        n = 1
+        while anchor in self.heading_ids:
+            n += 1
+            anchor = f"{base}-{n}"
+        self.heading_ids.add(anchor)
+        self.out[heading["index"]] = f'<{heading["tag"]} id="{anchor}"{heading["attrs"]}>'
+        self.toc.append({"level": TOC_LEVELS[heading["tag"]], "id": anchor, "text": text})
+
+    def result(self):
+        self.close()
+        while self.open_tags:
+            self.handle_endtag(self.open_tags[-1])
+        return "".join(self.out)
+
+def render_post(content, content_format=None):
+    """Render raw post content (markdown or HTML) into the stored read-side fields"""
+    html = content or ""
+    if (content_format or DEFAULT_CONTENT_FORMAT) == "markdown":
+        html = _markdown_renderer().render(html)
+    sanitizer = _Sanitizer()
+    sanitizer.feed(html)
+    html = sanitizer.result()
+    return {
+        "contentHtml": html,
+        "readingTime": max(1, round(sanitizer.words / WORDS_PER_MINUTE)),
+        "toc": sanitizer.toc,
+        "renderVersion": RENDERER_VERSION
+    }
+
+_pool = None
+
+def get_render_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _pool
+
+def shutdown_render_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def render_post_async(content, content_format=None):
+    """Render on the worker pool so large posts don't block the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_render_pool(), render_post, content, content_format)
+
+async def rerender_posts(db, everything=False, batch_size=200, workers=None):
+    """Re-render stored posts across all cores, writing results in bulk"""
+    from pymongo import UpdateOne
+
+    query = {} if everything else {"renderVersion": {"$ne": RENDERER_VERSION}}
+    loop = asyncio.get_running_loop()
+    rendered = 0
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        cursor = db.blog_posts.find(query, {"content": 1, "contentFormat": 1})
+        while True:
+            batch = await cursor.to_list(length=batch_size)
+            if not batch:
+                break
+            results = await asyncio.gather(*[
+                loop.run_in_executor(pool, render_post, post.get("content", ""), post.get("contentFormat"))
+                for post in batch
+            ])
+            await db.blog_posts.bulk_write([
+                UpdateOne({"_id": post["_id"]}, {"$set": result}) for post, result in zip(batch, results)
+            ], ordered=False)
+            rendered += len(batch)
+
+    return rendered
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Re-render stored blog posts")
+    parser.add_argument("--all", action="store_true", help="re-render every post, not only stale ones")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        db = client[os.environ.get("DB_NAME", "havosec")]
+        count = await rerender_posts(db, everything=args.all, workers=args.workers)
+        client.close()
+        print(f"✓ Re-rendered {count} blog posts")
+
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+"""Fast JSON responses for MongoDB documents.
+
+MongoJSONResponse encodes with orjson and handles ObjectId (as its hex string)
+and datetime natively, so documents don't need converting in Python first.
+It is the app's default response class. FastAPI still runs jsonable_encoder
+over anything a route *returns*, so list endpoints return a MongoJSONResponse
+themselves to skip that pass.
+
+find_page() fetches a page with `_id` already turned into a string `id` by
+the server ($toString in an aggregation), which removes the per-document
+`doc["id"] = str(doc.pop("_id"))` loop. Documents read any other way go
+through public_id().
+"""
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+import orjson
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class MongoJSONResponse(JSONResponse):
+    def render(self, content):
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+def public_id(doc):
+    """doc with `_id` replaced by its string form as `id`"""
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+# Pipeline tail replacing `_id` with its string form as `id`
+PUBLIC_ID_STAGES = [{"$addFields": {"id": {"$toString": "$_id"}}}, {"$project": {"_id": 0}}]
+
+async def find_page(collection, query, sort, skip=0, limit=50, projection=None):
+    """One sorted page of documents carrying a string `id` instead of `_id`"""
+    pipeline = [{"$match": query}, {"$sort": sort}]
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit:
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": projection})
+    return await collection.aggregate(pipeline + PUBLIC_ID_STAGES).to_list(length=limit or None)
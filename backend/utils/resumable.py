@@ -0,0 +1,163 @@
+"""Resumable (tus-style) uploads.
+
+A client creates an upload with its total size, then sends the bytes in any
+order as PATCH requests carrying an Upload-Offset header; each chunk is written
+in place into a sparse partial file, so chunks can arrive in parallel. The
+file is only created when the first chunk arrives, so nothing is reserved on
+disk for a stated size, and a caller may have at most RESUMABLE_MAX_OPEN
+uploads in progress.
+The byte ranges received so far are tracked, merged, on the
+`resumable_uploads` document, so it grows with the number of gaps rather than
+the number of chunks (a sequential upload is always one range), and at most
+RESUMABLE_MAX_RANGES separate ranges are allowed. After a dropped connection
+the client asks for them (HEAD) and only resends what is missing. When the whole file is present it is hashed and
+committed to the upload store like any other upload.
+
+Abandoned uploads expire after RESUMABLE_EXPIRE_HOURS of inactivity and are
+swept (document and partial file) by a background task.
+"""
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+from utils.upload_store import TEMP_DIR
+import asyncio
+import os
+import time
+
+RESUMABLE_EXPIRE_HOURS = float(os.environ.get("RESUMABLE_EXPIRE_HOURS", "24"))
+RESUMABLE_MAX_CHUNK = int(os.environ.get("RESUMABLE_MAX_CHUNK", str(16 * 1024 * 1024)))
+RESUMABLE_SWEEP_INTERVAL = float(os.environ.get("RESUMABLE_SWEEP_INTERVAL", "600"))
+RESUMABLE_MAX_OPEN = int(os.environ.get("RESUMABLE_MAX_OPEN", "5"))
+RESUMABLE_MAX_RANGES = int(os.environ.get("RESUMABLE_MAX_RANGES", "1000"))
+PARTIAL_PREFIX = "resumable-"
+
+def partial_path(upload_id):
+    return os.path.join(TEMP_DIR, f"{PARTIAL_PREFIX}{upload_id}")
+
+def expires_at():
+    return datetime.utcnow() + timedelta(hours=RESUMABLE_EXPIRE_HOURS)
+
+def merge_ranges(chunks):
+    """Collapse [start, end) pairs into sorted, non-overlapping ranges"""
+    merged = []
+    for start, end in sorted(chunks):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def contiguous_offset(ranges):
+    """Bytes received without a gap from the start of the file"""
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+def extends_range(ranges, start):
+    """Whether a chunk at `start` begins inside or right after a received range, so it adds no new one"""
+    return any(low <= start <= high for low, high in ranges)
+
+def format_ranges(ranges):
+    return ",".join(f"{start}-{end - 1}" for start, end in ranges)
+
+def open_partial(upload_id):
+    return os.open(partial_path(upload_id), os.O_WRONLY | os.O_CREAT, 0o600)
+
+def write_at(fd, data, offset):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+def remove_partial(upload_id):
+    try:
+        os.remove(partial_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+async def ensure_indexes(db):
+    await db.resumable_uploads.create_index("expiresAt")
+    await db.resumable_uploads.create_index([("caller", 1), ("state", 1)])
+
+async def open_upload_count(db, caller):
+    return await db.resumable_uploads.count_documents({"caller": caller, "state": "uploading"})
+
+async def record_chunk(db, upload_id, start, end):
+    """Merge a received range into the upload's ranges; returns the updated upload document.
+
+    Parallel chunks race on `version`: a writer that loses re-reads the ranges
+    and merges again.
+    """
+    while True:
+        upload = await db.resumable_uploads.find_one({"_id": upload_id})
+        if upload is None:
+            return None
+        version = upload.get("version")
+        updated = await db.resumable_uploads.find_one_and_update(
+            {"_id": upload_id, "version": version},
+            {"$set": {
+                "chunks": merge_ranges([*upload.get("chunks", []), [start, end]]),
+                "version": (version or 0) + 1,
+                "expiresAt": expires_at()
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is not None:
+            return updated
+
+class ResumableSweeper:
+    """Periodically deletes expired resumable uploads and orphaned partial files"""
+
+    def __init__(self, interval=RESUMABLE_SWEEP_INTERVAL):
+        self.interval = interval
+        self.db = None
+        self.task = None
+
+    async def sweep(self):
+        now = datetime.utcnow()
+        removed = 0
+        async for upload in self.db.resumable_uploads.find({"expiresAt": {"$lt": now}}, {"_id": 1}):
+            await self.db.resumable_uploads.delete_one({"_id": upload["_id"]})
+            await run_in_threadpool(remove_partial, upload["_id"])
+            removed += 1
+
+        # Partial files whose document is gone (e.g. the process died mid-finalize)
+        cutoff = time.time() - RESUMABLE_EXPIRE_HOURS * 3600
+        for filename in await run_in_threadpool(os.listdir, TEMP_DIR):
+            if not filename.startswith(PARTIAL_PREFIX):
+                continue
+            upload_id = filename[len(PARTIAL_PREFIX):]
+            path = os.path.join(TEMP_DIR, filename)
+            try:
+                stale = os.path.getmtime(path) < cutoff
+            except FileNotFoundError:
+                continue
+            if stale and not await self.db.resumable_uploads.find_one({"_id": upload_id}, {"_id": 1}):
+                await run_in_threadpool(remove_partial, upload_id)
+                removed += 1
+        return removed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    print(f"✓ Removed {removed} expired resumable uploads")
+            except Exception as e:
+                print(f"✗ Resumable upload sweep failed: {e}")
+
+    async def start(self, db):
+        self.db = db
+        await ensure_indexes(db)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+resumable_sweeper = ResumableSweeper()
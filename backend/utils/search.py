@@ -0,0 +1,212 @@
+"""In-memory admin search over clients, demo requests and users.
+
+Every indexed field is normalised to lowercase and broken into trigrams (for
+substring queries of 3+ characters) and word prefixes of 1-2 characters (for
+very short queries); each posting maps to the documents containing it.
+Handlers keep the index current with upsert()/remove() as they write, and the
+whole index is rebuilt every SEARCH_REFRESH_INTERVAL seconds to pick up
+writes made by other processes.
+"""
+from collections import defaultdict
+import asyncio
+import heapq
+import os
+import re
+
+SEARCH_REFRESH_INTERVAL = float(os.environ.get("SEARCH_REFRESH_INTERVAL", "300"))
+SEARCH_MAX_RESULTS = 50
+
+# type -> (collection, {field: weight}, title field, subtitle fields)
+SOURCES = {
+    "client": ("client_companies", {"name": 3, "email": 2, "industry": 1}, "name", ["email", "industry"]),
+    "demoRequest": ("demo_requests", {"company": 3, "email": 2, "firstName": 1, "lastName": 1}, "company", ["email", "status"]),
+    "user": ("users", {"email": 3, "firstName": 1, "lastName": 1, "company": 2}, "email", ["firstName", "lastName", "company"])
+}
+WORD = re.compile(r"[a-z0-9]+")
+
+def normalize(text):
+    return " ".join(str(text).lower().split()) if text else ""
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def short_prefixes(text):
+    return {word[:n] for word in WORD.findall(text) for n in (1, 2) if len(word) >= n}
+
+class SearchIndex:
+    def __init__(self):
+        self.docs = {}
+        self.postings = defaultdict(set)
+
+    def _keys_for(self, fields):
+        keys = set()
+        for text in fields.values():
+            keys |= trigrams(text)
+            keys |= short_prefixes(text)
+        return keys
+
+    def upsert(self, doc_type, doc):
+        """Index (or re-index) one raw MongoDB document of the given type"""
+        if doc is None or doc_type not in SOURCES:
+            return
+        _, weights, title, subtitle = SOURCES[doc_type]
+        key = (doc_type, str(doc["_id"]))
+        self.remove(doc_type, key[1])
+        fields = {name: normalize(doc.get(name)) for name in weights if doc.get(name)}
+        self.docs[key] = {
+            "fields": fields,
+            # " word1 word2 " so whole-word and word-prefix tests are one substring search
+            "words": {name: " " + " ".join(WORD.findall(text)) + " " for name, text in fields.items()},
+            "result": {
+                "type": doc_type,
+                "id": key[1],
+                "title": doc.get(title) or "",
+                "subtitle": " · ".join(str(doc[name]) for name in subtitle if doc.get(name))
+            }
+        }
+        for posting in self._keys_for(fields):
+            self.postings[posting].add(key)
+
+    def remove(self, doc_type, doc_id):
+        entry = self.docs.pop((doc_type, str(doc_id)), None)
+        if not entry:
+            return
+        for posting in self._keys_for(entry["fields"]):
+            keys = self.postings.get(posting)
+            if keys is not None:
+                keys.discard((doc_type, str(doc_id)))
+                if not keys:
+                    del self.postings[posting]
+
+    def _candidates(self, term):
+        wanted = trigrams(term) if len(term) >= 3 else {term}
+        sets = sorted((self.postings.get(posting, set()) for posting in wanted), key=len)
+        if not sets:
+            return set()
+        candidates = set(sets[0])
+        for keys in sets[1:]:
+            candidates &= keys
+            if not candidates:
+                break
+        return candidates
+
+    def _score(self, entry, term, weights):
+        best = 0
+        word_prefix = " " + term
+        for name, text in entry["fields"].items():
+            if term not in text:
+                continue
+            if text == term:
+                score = 100
+            elif text.startswith(term):
+                score = 60
+            elif word_prefix + " " in entry["words"][name]:
+                score = 50
+            elif word_prefix in entry["words"][name]:
+                score = 40
+            else:
+                score = 20
+            # Prefer tighter matches: "acme" over "acme holdings international"
+            score = score * weights[name] + 10 * len(term) / len(text)
+            best = max(best, score)
+        return best
+
+    def search(self, query, types=None, limit=20):
+        """Documents matching every word of the query, best first"""
+        terms = normalize(query).split()
+        if not terms:
+            return []
+        # Most selective word first, so the intersection shrinks quickly
+        candidate_sets = sorted((self._candidates(term) for term in terms), key=len)
+        candidates = set(candidate_sets[0])
+        for keys in candidate_sets[1:]:
+            candidates &= keys
+
+        scored = []
+        for key in candidates:
+            doc_type = key[0]
+            if types and doc_type not in types:
+                continue
+            entry = self.docs[key]
+            weights = SOURCES[doc_type][1]
+            scores = [self._score(entry, term, weights) for term in terms]
+            if all(scores):
+                scored.append((sum(scores), entry["result"]))
+        top = heapq.nlargest(min(limit, SEARCH_MAX_RESULTS), scored, key=lambda item: item[0])
+        return [{**result, "score": round(score, 2)} for score, result in top]
+
+async def build_index(db, types=None):
+    index = SearchIndex()
+    for doc_type in types or SOURCES:
+        collection, weights, title, subtitle = SOURCES[doc_type]
+        projection = {name: 1 for name in {*weights, title, *subtitle}}
+        async for doc in db[collection].find({}, projection):
+            index.upsert(doc_type, doc)
+    return index
+
+class AdminSearch:
+    """Holds the live index and rebuilds it periodically"""
+
+    def __init__(self, interval=SEARCH_REFRESH_INTERVAL):
+        self.interval = interval
+        self.index = SearchIndex()
+        self.task = None
+        self.replay = None
+
+    def upsert(self, doc_type, doc):
+        self.index.upsert(doc_type, doc)
+        if self.replay is not None:
+            self.replay.append(("upsert", doc_type, doc))
+
+    def remove(self, doc_type, doc_id):
+        self.index.remove(doc_type, doc_id)
+        if self.replay is not None:
+            self.replay.append(("remove", doc_type, doc_id))
+
+    def search(self, query, types=None, limit=20):
+        return self.index.search(query, types, limit)
+
+    async def rebuild(self, db):
+        # Changes made while the new index is being read are replayed onto it before the swap
+        self.replay = []
+        try:
+            index = await build_index(db)
+            for action, doc_type, arg in self.replay:
+                getattr(index, action)(doc_type, arg)
+            self.index = index
+        finally:
+            self.replay = None
+
+    async def reload(self, db, doc_type, ids):
+        """Re-read specific documents after a bulk change (missing ones are dropped)"""
+        collection = SOURCES[doc_type][0]
+        found = set()
+        async for doc in db[collection].find({"_id": {"$in": list(ids)}}):
+            self.upsert(doc_type, doc)
+            found.add(str(doc["_id"]))
+        for doc_id in ids:
+            if str(doc_id) not in found:
+                self.remove(doc_type, doc_id)
+
+    async def _run(self, db):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.rebuild(db)
+            except Exception as e:
+                print(f"✗ Search index rebuild failed: {e}")
+
+    async def start(self, db):
+        await self.rebuild(db)
+        self.task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+admin_search = AdminSearch()
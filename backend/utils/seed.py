@@ -1,6 +1,31 @@
-from datetime import datetime, timedelta
+"""Initial data: admin user, website content, sample blog posts and events.
+
+Seeding is versioned by a marker document in `meta`. Once the current
+SEED_VERSION has been applied, ensure_seeded() costs a single read. Bump
+SEED_VERSION when seed_database() gains new data. Run it explicitly as a
+deploy step with:
+
+    python -m utils.seed
+"""
+from datetime import datetime
 import bcrypt
 
+SEED_VERSION = 1
+
+async def ensure_seeded(db, force=False):
+    """Seed unless the current version is already applied; True when seeding ran"""
+    marker = await db.meta.find_one({"_id": "seed"})
+    if not force and marker and marker.get("version", 0) >= SEED_VERSION:
+        return False
+    await seed_database(db)
+    await db.meta.update_one(
+        {"_id": "seed"},
+        {"$set": {"version": SEED_VERSION, "appliedAt": datetime.utcnow()}},
+        upsert=True
+    )
+    print(f"✓ Seed version {SEED_VERSION} applied")
+    return True
+
 async def seed_database(db):
     """Seed database with initial data"""
     
@@ -73,14 +98,21 @@ async def seed_database(db):
                 "updatedAt": datetime.utcnow()
             }
         ]
+        from utils.render import render_post
+        for post in posts:
+            post.update(render_post(post["content"]))
         await db.blog_posts.insert_many(posts)
         print("✓ Blog posts seeded")
     
     # Seed security events for client dashboard
     events_count = await db.security_events.count_documents({})
     if events_count == 0:
+        from utils.high_water import reserve_seq
         events = generate_security_events()
-        await db.security_events.insert_many(events)
+        async with reserve_seq(db.security_events, len(events)) as first:
+            for i, event in enumerate(events):
+                event["seq"] = first + i
+            await db.security_events.insert_many(events)
         print("✓ Security events seeded")
 
 def get_default_content(section):
@@ -121,44 +153,28 @@ def get_default_content(section):
     return defaults.get(section, {})
 
 def generate_security_events():
-    import random
-    events = []
-    event_types = ['attack_blocked', 'intrusion_attempt', 'malware_detected', 'phishing_blocked', 'ddos_mitigated', 'vulnerability_scan']
-    severities = ['low', 'medium', 'high', 'critical']
-    statuses = ['detected', 'blocked', 'investigating', 'resolved']
-    countries = ['US', 'CN', 'RU', 'KP', 'IR', 'TR', 'BR', 'IN']
-    descriptions = [
-        'Suspicious login attempt detected',
-        'SQL injection attack blocked',
-        'Malware signature detected in upload',
-        'DDoS attack mitigated',
-        'Brute force attack on admin panel',
-        'Phishing attempt blocked',
-        'Vulnerability scan detected'
-    ]
-    
-    for i in range(100):
-        random_days = random.randint(0, 30)
-        random_hours = random.randint(0, 23)
-        event_time = datetime.utcnow() - timedelta(days=random_days, hours=random_hours)
-        
-        events.append({
-            "eventType": random.choice(event_types),
-            "severity": random.choice(severities),
-            "status": random.choice(statuses),
-            "description": random.choice(descriptions),
-            "source": {
-                "ip": f"{random.randint(1,255)}.{random.randint(1,255)}.{random.randint(1,255)}.{random.randint(1,255)}",
-                "country": random.choice(countries)
-            },
-            "target": {
-                "endpoint": f"/api/{random.choice(['login', 'dashboard', 'admin', 'upload', 'search'])}",
-                "service": random.choice(['web', 'api', 'database', 'auth']),
-                "port": random.choice([80, 443, 22, 3306])
-            },
-            "tags": ['automated'],
-            "createdAt": event_time,
-            "updatedAt": event_time
-        })
-    
-    return events
+    """A month of sample events; see utils/event_generator.py for benchmark volumes"""
+    from utils.event_generator import generate_events
+    return generate_events(100, days=30, ip_pool=500, bursts=2)
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import os
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Seed the database (once per SEED_VERSION)")
+    parser.add_argument("--force", action="store_true", help="run even if this version was already applied")
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        db = client[os.environ.get("DB_NAME", "havosec")]
+        if not await ensure_seeded(db, force=args.force):
+            print(f"✓ Seed version {SEED_VERSION} already applied")
+        client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+import re
+
+def slugify(text):
+    text = text.lower()
+    text = re.sub(r'[^\w\s-]', '', text)
+    text = re.sub(r'[-\s]+', '-', text)
+    return text.strip('-')
+
+class SlugRegistry:
+    """Slug -> post id routing table backed by the uniquely indexed blog_slugs collection.
+
+    Every slug a post has ever had stays registered, so links to a post that
+    was re-slugged by a title change keep resolving and can be redirected.
+    """
+
+    def __init__(self):
+        self.slugs = {}
+
+    async def ensure_indexes(self, db):
+        await db.blog_slugs.create_index("slug", unique=True)
+        await db.blog_slugs.create_index("postId")
+
+    async def load(self, db):
+        """Warm the in-memory map and register posts that predate the registry"""
+        self.slugs = {}
+        async for entry in db.blog_slugs.find({}, {"slug": 1, "postId": 1}):
+            self.slugs[entry["slug"]] = entry["postId"]
+
+        registered = set(self.slugs.values())
+        async for post in db.blog_posts.find({}, {"slug": 1, "title": 1}):
+            if post["_id"] in registered:
+                continue
+            slug = await self.claim(db, post["_id"], post.get("slug") or post.get("title", ""))
+            if slug != post.get("slug"):
+                await db.blog_posts.update_one({"_id": post["_id"]}, {"$set": {"slug": slug}})
+
+    async def claim(self, db, post_id, text):
+        """Register a slug for post_id, suffixing it (-2, -3, ...) on collision"""
+        base = slugify(text) or "post"
+
+        while True:
+            pattern = f"^{re.escape(base)}(-[0-9]+)?$"
+            taken = {}
+            async for entry in db.blog_slugs.find({"slug": {"$regex": pattern}}, {"slug": 1, "postId": 1}):
+                taken[entry["slug"]] = entry["postId"]
+
+            candidate = base
+            suffix = 1
+            while candidate in taken and taken[candidate] != post_id:
+                suffix += 1
+                candidate = f"{base}-{suffix}"
+
+            if taken.get(candidate) == post_id:
+                break
+            try:
+                await db.blog_slugs.insert_one({
+                    "slug": candidate,
+                    "postId": post_id,
+                    "createdAt": datetime.utcnow()
+                })
+                break
+            except DuplicateKeyError:
+                # Another writer took the candidate in the meantime; rescan
+                continue
+
+        self.slugs[candidate] = post_id
+        return candidate
+
+    async def resolve(self, db, slug, refresh=False):
+        """Return the post id registered for slug, or None"""
+        if not refresh and slug in self.slugs:
+            return self.slugs[slug]
+
+        entry = await db.blog_slugs.find_one({"slug": slug}, {"postId": 1})
+        if not entry:
+            self.slugs.pop(slug, None)
+            return None
+        self.slugs[slug] = entry["postId"]
+        return entry["postId"]
+
+    async def release(self, db, post_id):
+        """Drop every slug (current and redirects) owned by a deleted post"""
+        await db.blog_slugs.delete_many({"postId": post_id})
+        self.slugs = {slug: owner for slug, owner in self.slugs.items() if owner != post_id}
+
+slug_registry = SlugRegistry()
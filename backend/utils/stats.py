@@ -0,0 +1,92 @@
+"""Admin dashboard counters.
+
+The counts live in one `stats` document kept current with $inc by the
+create/update/delete handlers, so the dashboard is a single find_one. A
+background job recounts everything (concurrently) every
+STATS_RECONCILE_INTERVAL seconds to correct any drift, e.g. from writes made
+outside the API.
+"""
+from datetime import datetime
+import asyncio
+import os
+
+STATS_RECONCILE_INTERVAL = float(os.environ.get("STATS_RECONCILE_INTERVAL", "300"))
+STATS_ID = "dashboard"
+
+# section -> (collection, {counter: equality filter})
+COUNTERS = {
+    "blog": ("blog_posts", {"total": {}, "published": {"status": "published"}}),
+    "demoRequests": ("demo_requests", {"total": {}, "pending": {"status": "new"}}),
+    "clients": ("client_companies", {"total": {}, "active": {"isActive": True}})
+}
+
+def _matches(doc, query):
+    return doc is not None and all(doc.get(field) == value for field, value in query.items())
+
+def apply_set(before, update_data):
+    """The document as it will look after {"$set": update_data}"""
+    return {**before, **update_data} if before is not None else None
+
+async def record_change(db, section, before, after):
+    """Adjust `section`'s counters for one document going from before to after (None = absent)"""
+    _, counters = COUNTERS[section]
+    inc = {}
+    for name, query in counters.items():
+        delta = _matches(after, query) - _matches(before, query)
+        if delta:
+            inc[f"{section}.{name}"] = delta
+    if inc:
+        await db.stats.update_one({"_id": STATS_ID}, {"$inc": inc}, upsert=True)
+
+async def _count_section(db, collection, counters):
+    names = list(counters)
+    counts = await asyncio.gather(*(db[collection].count_documents(counters[name]) for name in names))
+    return dict(zip(names, counts))
+
+async def reconcile(db):
+    """Recount every counter from the collections and overwrite the stats document"""
+    sections = list(COUNTERS)
+    results = await asyncio.gather(*(_count_section(db, *COUNTERS[section]) for section in sections))
+    overview = dict(zip(sections, results))
+    await db.stats.update_one(
+        {"_id": STATS_ID},
+        {"$set": {**overview, "reconciledAt": datetime.utcnow()}},
+        upsert=True
+    )
+    return overview
+
+async def read(db):
+    doc = await db.stats.find_one({"_id": STATS_ID})
+    if doc is None:
+        return await reconcile(db)
+    return {section: {name: doc.get(section, {}).get(name, 0) for name in COUNTERS[section][1]} for section in COUNTERS}
+
+class StatsReconciler:
+    """Runs reconcile() at startup and then on an interval"""
+
+    def __init__(self, interval=STATS_RECONCILE_INTERVAL):
+        self.interval = interval
+        self.task = None
+
+    async def _run(self, db):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await reconcile(db)
+            except Exception as e:
+                print(f"✗ Stats reconciliation failed: {e}")
+
+    async def start(self, db):
+        await reconcile(db)
+        self.task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+stats_reconciler = StatsReconciler()
@@ -0,0 +1,307 @@
+"""Blob storage backends.
+
+STORAGE_BACKEND=local (default) keeps blobs on this host's disk;
+STORAGE_BACKEND=s3 keeps them in an S3-compatible bucket (AWS, MinIO, moto)
+configured with S3_BUCKET, S3_ENDPOINT_URL, S3_REGION and the usual AWS
+credential variables. Both backends can issue short-lived URLs so browsers
+upload (PUT) and download (GET) blobs without proxying bytes through the API.
+
+The S3 backend keeps node-local copies of blobs it had to read (for resizing
+or hashing) under uploads/cache, evicting the least recently used ones once
+the copies pass STORAGE_CACHE_MAX_BYTES, and dropping a blob's copy when the
+blob is deleted.
+"""
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from urllib.parse import urlencode
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local").lower()
+PRESIGN_EXPIRES = int(os.environ.get("PRESIGN_EXPIRES", "900"))
+UPLOAD_SIGNING_SECRET = os.environ.get(
+    "UPLOAD_SIGNING_SECRET", os.environ.get("JWT_SECRET", "havosec-super-secret-jwt-key-2025")
+)
+LOCAL_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "blobs")
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "cache")
+STORAGE_CACHE_MAX_BYTES = int(os.environ.get("STORAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1GB
+
+def shard(key):
+    """Two-level fan-out (ab/cd/<key>) so no single directory or prefix gets huge"""
+    return f"{key[:2]}/{key[2:4]}/{key}"
+
+def hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def sign_direct_upload(key, size, expires):
+    message = f"{key}:{size}:{expires}".encode()
+    return hmac.new(UPLOAD_SIGNING_SECRET.encode(), message, hashlib.sha256).hexdigest()
+
+def verify_direct_upload(key, size, expires, signature):
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_direct_upload(key, size, expires), signature)
+
+class LocalStorage:
+    is_local = True
+
+    def __init__(self, root=LOCAL_ROOT):
+        self.root = root
+
+    def local_path(self, key):
+        return os.path.join(self.root, *shard(key).split("/"))
+
+    def _put(self, temp_path, key):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+    async def put_file(self, temp_path, key, content_type=None):
+        await run_in_threadpool(self._put, temp_path, key)
+
+    def _stat(self, key):
+        try:
+            stat = os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return {"size": stat.st_size, "modified": datetime.utcfromtimestamp(stat.st_mtime)}
+
+    async def stat(self, key):
+        """{"size", "modified"} for a stored blob, or None"""
+        return await run_in_threadpool(self._stat, key)
+
+    async def exists(self, key):
+        return await self.stat(key) is not None
+
+    def _verify(self, key, size, sha256):
+        stat = self._stat(key)
+        return stat is not None and stat["size"] == size and hash_file(self.local_path(key)) == sha256
+
+    async def verify(self, key, size, sha256):
+        """True if the stored blob has exactly this size and SHA-256"""
+        return await run_in_threadpool(self._verify, key, size, sha256)
+
+    def _delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    async def delete(self, key):
+        await run_in_threadpool(self._delete, key)
+
+    async def local_copy(self, key):
+        return self.local_path(key)
+
+    def _list(self):
+        keys = []
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            keys.extend(files)
+        return keys
+
+    async def list_keys(self):
+        return await run_in_threadpool(self._list)
+
+    def presign_put(self, key, content_type, size, sha256):
+        """Signed URL for the API's own direct-upload endpoint (no cloud storage to hand off to)"""
+        expires = int(time.time()) + PRESIGN_EXPIRES
+        query = urlencode({"size": size, "expires": expires, "signature": sign_direct_upload(key, size, expires)})
+        return {
+            "url": f"/api/uploads/direct/{key}?{query}",
+            "method": "PUT",
+            "headers": {"Content-Type": content_type}
+        }
+
+    def presign_get(self, key):
+        return f"/api/uploads/images/{key}"
+
+class S3Storage:
+    is_local = False
+
+    def __init__(self, cache_root=CACHE_ROOT, cache_max_bytes=STORAGE_CACHE_MAX_BYTES):
+        import boto3
+
+        self.cache_root = cache_root
+        self.cache_max_bytes = cache_max_bytes
+        # Bytes in the local cache; counted on first use
+        self.cache_bytes = None
+        self.cache_lock = threading.Lock()
+        self.bucket = os.environ["S3_BUCKET"]
+        self.prefix = os.environ.get("S3_PREFIX", "blobs/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            region_name=os.environ.get("S3_REGION") or None
+        )
+
+    def object_key(self, key):
+        return f"{self.prefix}{shard(key)}"
+
+    def _put(self, temp_path, key, content_type):
+        extra = {"ContentType": content_type} if content_type else {}
+        self.client.upload_file(temp_path, self.bucket, self.object_key(key), ExtraArgs=extra)
+        os.remove(temp_path)
+
+    async def put_file(self, temp_path, key, content_type=None):
+        await run_in_threadpool(self._put, temp_path, key, content_type)
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.object_key(key), ChecksumMode="ENABLED")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _stat(self, key):
+        head = self._head(key)
+        if head is None:
+            return None
+        return {"size": head["ContentLength"], "modified": head["LastModified"].replace(tzinfo=None)}
+
+    async def stat(self, key):
+        return await run_in_threadpool(self._stat, key)
+
+    async def exists(self, key):
+        return await self.stat(key) is not None
+
+    def _verify(self, key, size, sha256):
+        head = self._head(key)
+        if head is None or head["ContentLength"] != size:
+            return False
+        checksum = head.get("ChecksumSHA256")
+        if checksum and "-" not in checksum:
+            # Whole-object checksum S3 verified on upload (multipart ones end in -<parts>)
+            return base64.b64decode(checksum).hex() == sha256
+        return hash_file(self._download(key)) == sha256
+
+    async def verify(self, key, size, sha256):
+        """True if the stored object has exactly this size and SHA-256"""
+        return await run_in_threadpool(self._verify, key, size, sha256)
+
+    def _delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+        path = self.cache_path(key)
+        with self.cache_lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            if self.cache_bytes is not None:
+                self.cache_bytes -= size
+
+    async def delete(self, key):
+        await run_in_threadpool(self._delete, key)
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_root, *shard(key).split("/"))
+
+    def _cached_files(self):
+        files = []
+        for root, dirs, names in os.walk(self.cache_root):
+            for name in names:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _trim_cache(self, added):
+        """Count a new cached file; evict least recently used copies while over the cap"""
+        with self.cache_lock:
+            if self.cache_bytes is None:
+                self.cache_bytes = sum(size for _, size, _ in self._cached_files())
+            else:
+                self.cache_bytes += added
+            if self.cache_bytes <= self.cache_max_bytes:
+                return
+            # Evict down to 90% so every download doesn't trigger another scan
+            target = self.cache_max_bytes * 0.9
+            for _, size, path in sorted(self._cached_files()):
+                if self.cache_bytes <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                self.cache_bytes -= size
+
+    def _download(self, key):
+        path = self.cache_path(key)
+        try:
+            # Mark as recently used for eviction
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        self.client.download_file(self.bucket, self.object_key(key), temp)
+        os.replace(temp, path)
+        self._trim_cache(os.path.getsize(path))
+        return path
+
+    async def local_copy(self, key):
+        """Blobs are immutable, so a node-local copy (e.g. for resizing) never goes stale"""
+        return await run_in_threadpool(self._download, key)
+
+    def _list(self):
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            keys.extend(item["Key"].rsplit("/", 1)[-1] for item in page.get("Contents", []))
+        return keys
+
+    async def list_keys(self):
+        return await run_in_threadpool(self._list)
+
+    def presign_put(self, key, content_type, size, sha256):
+        # S3 rejects the PUT unless the body matches the checksum, which keeps
+        # content-addressed keys honest without the API reading the bytes
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self.object_key(key),
+                "ContentType": content_type,
+                "ContentLength": size,
+                "ChecksumSHA256": checksum
+            },
+            ExpiresIn=PRESIGN_EXPIRES
+        )
+        return {
+            "url": url,
+            "method": "PUT",
+            "headers": {"Content-Type": content_type, "x-amz-checksum-sha256": checksum}
+        }
+
+    def presign_get(self, key):
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self.object_key(key)},
+            ExpiresIn=PRESIGN_EXPIRES
+        )
+
+def create_storage():
+    if STORAGE_BACKEND == "s3":
+        return S3Storage()
+    return LocalStorage()
+
+storage = create_storage()
@@ -0,0 +1,346 @@
+"""Content-addressed storage and catalog for uploads.
+
+Each distinct file is stored once as a blob keyed by its SHA-256 alone (so
+the same bytes uploaded as .jpg and .jpeg share one blob), sharded as
+ab/cd/<key> in the configured storage backend (see utils.storage) and tracked
+in `upload_blobs` with a reference count. Every upload gets its own
+user-facing name in the `uploads` catalog, which also records size, type,
+dimensions, hash and uploader at write time; the blob is garbage-collected
+when its last reference is deleted. Blob URLs are <sha256><ext>, the
+extension only telling clients (and the variant generator) the format; they
+embed the hash, so they never change content.
+
+Deleting a blob first marks its `upload_blobs` document `deleting`, removes
+the stored bytes, and only then drops the document. A commit of the same
+bytes meanwhile waits for the document to go and then stores the bytes
+again, so a delete can never remove a file that a new reference points at.
+
+Rebuild the catalog from what is in storage (and migrate files from the old
+flat uploads/images directory into the blob store) with:
+
+    python -m utils.upload_store reconcile
+
+which also moves blobs stored under older <sha256><ext> keys to plain hash keys.
+"""
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+from utils.images import read_dimensions
+from utils.storage import storage, hash_file
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import uuid
+
+UPLOAD_ROOT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads")
+LEGACY_DIR = os.path.join(UPLOAD_ROOT, "images")
+TEMP_DIR = os.path.join(UPLOAD_ROOT, "blobs", ".tmp")
+BLOB_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]+)?$")
+# A delete still marked in progress after this long was abandoned (the process died)
+BLOB_DELETE_STALE = timedelta(seconds=60)
+BLOB_DELETE_WAIT = 0.05
+
+os.makedirs(TEMP_DIR, exist_ok=True)
+
+class FileTooLarge(Exception):
+    pass
+
+def is_blob_name(filename):
+    """<sha256> or <sha256><ext>, as used in blob URLs"""
+    return bool(BLOB_NAME.match(filename))
+
+def blob_key(name):
+    """Storage key of a blob URL name (the extension is not part of it)"""
+    return name[:64]
+
+def blob_name(digest):
+    return digest
+
+def public_name(ref):
+    """<sha256><ext> for a catalog entry; the extension comes from its upload name"""
+    return f"{blob_key(ref['blob'])}{os.path.splitext(ref['name'])[1].lower()}"
+
+def blob_url(ref):
+    return f"/api/uploads/images/{public_name(ref)}"
+
+def _write_chunk(out, hasher, chunk):
+    out.write(chunk)
+    hasher.update(chunk)
+
+async def stream_chunks_to_temp(chunks, max_size):
+    """Copy an async iterator of bytes (e.g. a raw request body) to a temp file, hashing as it goes.
+
+    Returns (temp_path, sha256 hex digest, size). Raises FileTooLarge as soon
+    as more than max_size bytes have been read.
+    """
+    temp_path = os.path.join(TEMP_DIR, uuid.uuid4().hex)
+    hasher = hashlib.sha256()
+    size = 0
+    out = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise FileTooLarge()
+            await run_in_threadpool(_write_chunk, out, hasher, chunk)
+        await run_in_threadpool(out.close)
+    except BaseException:
+        await run_in_threadpool(out.close)
+        await run_in_threadpool(_remove, temp_path)
+        raise
+    return temp_path, hasher.hexdigest(), size
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+async def ensure_indexes(db):
+    await db.uploads.create_index("name", unique=True)
+    await db.uploads.create_index("blob")
+    await db.uploads.create_index([("createdAt", -1)])
+    await db.uploads.create_index([("contentType", 1), ("createdAt", -1)])
+    await db.uploads.create_index([("uploadedBy", 1), ("createdAt", -1)])
+    await db.pending_uploads.create_index("expiresAt", expireAfterSeconds=0)
+
+async def commit(db, temp_path, digest, size, content_type, name, original_name, uploaded_by=None):
+    """Register a finished temp file under `name`, storing its blob only if it is new"""
+    key = blob_name(digest)
+    width, height = await run_in_threadpool(read_dimensions, temp_path)
+
+    previous = await _add_blob_ref(db, key, size, content_type, width, height)
+    if previous is None or previous.get("deleting") or not await storage.exists(key):
+        await storage.put_file(temp_path, key, content_type)
+    else:
+        # Already stored: the duplicate bytes are simply discarded
+        await run_in_threadpool(_remove, temp_path)
+
+    return await _add_name(db, key, digest, size, content_type, width, height, name, original_name, uploaded_by)
+
+async def register_stored(db, key, size, content_type, name, original_name, uploaded_by=None, dimensions=(None, None)):
+    """Register a blob that was uploaded straight to storage (presigned PUT).
+
+    Returns None, without adding a reference, if the blob is gone by the time
+    the reference is taken (a concurrent delete removed it).
+    """
+    width, height = dimensions
+    previous = await _add_blob_ref(db, key, size, content_type, width, height)
+    if (previous is None or previous.get("deleting")) and not await storage.exists(key):
+        await _drop_blob_ref(db, key)
+        return None
+    return await _add_name(db, key, key[:64], size, content_type, width, height, name, original_name, uploaded_by)
+
+async def _add_blob_ref(db, key, size, content_type, width, height):
+    """Take a reference; returns the blob document as it was before (None if new).
+
+    Waits while a delete of the blob is in progress, so the caller never
+    counts on bytes that are about to disappear.
+    """
+    while True:
+        stale = datetime.utcnow() - BLOB_DELETE_STALE
+        try:
+            return await db.upload_blobs.find_one_and_update(
+                {"_id": key, "$or": [{"deleting": {"$ne": True}}, {"deletingAt": {"$lt": stale}}]},
+                {
+                    "$inc": {"refCount": 1},
+                    "$unset": {"deleting": "", "deletingAt": ""},
+                    "$setOnInsert": {
+                        "size": size,
+                        "contentType": content_type,
+                        "width": width,
+                        "height": height,
+                        "createdAt": datetime.utcnow()
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # The document exists but is being deleted: wait for the delete to finish
+            await asyncio.sleep(BLOB_DELETE_WAIT)
+
+async def _drop_blob_ref(db, key):
+    """Release one reference; returns True if the blob itself was deleted"""
+    blob = await db.upload_blobs.find_one_and_update(
+        {"_id": key},
+        {"$inc": {"refCount": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not blob or blob["refCount"] > 0:
+        return False
+    # Claim the delete; fails if a new reference arrived in the meantime
+    claimed = await db.upload_blobs.find_one_and_update(
+        {"_id": key, "refCount": {"$lte": 0}, "deleting": {"$ne": True}},
+        {"$set": {"deleting": True, "deletingAt": datetime.utcnow()}}
+    )
+    if not claimed:
+        return False
+    try:
+        await storage.delete(key)
+    finally:
+        # Only now may a new commit recreate the document (and store the bytes again)
+        await db.upload_blobs.delete_one({"_id": key, "deleting": True})
+    return True
+
+async def _add_name(db, key, digest, size, content_type, width, height, name, original_name, uploaded_by):
+    ref = {
+        "name": name,
+        "blob": key,
+        "hash": digest,
+        "originalName": original_name,
+        "size": size,
+        "contentType": content_type,
+        "width": width,
+        "height": height,
+        "uploadedBy": uploaded_by,
+        "createdAt": datetime.utcnow()
+    }
+    await db.uploads.insert_one(ref)
+    ref.pop("_id", None)
+    return ref
+
+async def blob_exists(db, key):
+    return await db.upload_blobs.find_one({"_id": key}, {"_id": 1}) is not None
+
+async def find(db, name):
+    return await db.uploads.find_one({"name": name}, {"_id": 0})
+
+async def release(db, name, on_blob_removed=None):
+    """Drop the reference `name`; delete the blob when nothing else points at it.
+
+    Returns the removed reference, or None if `name` was unknown.
+    """
+    ref = await db.uploads.find_one_and_delete({"name": name})
+    if not ref:
+        return None
+
+    if await _drop_blob_ref(db, ref["blob"]) and on_blob_removed:
+        on_blob_removed(ref["blob"])
+    return ref
+
+async def list_uploads(db, limit=50, offset=0, content_type=None, uploaded_by=None, search=None):
+    """One page of the catalog, newest first, plus the total matching count"""
+    query = {}
+    if content_type:
+        query["contentType"] = content_type
+    if uploaded_by:
+        query["uploadedBy"] = uploaded_by
+    if search:
+        query["originalName"] = {"$regex": re.escape(search), "$options": "i"}
+
+    cursor = db.uploads.find(query, {"_id": 0}).sort("createdAt", -1).skip(offset).limit(limit)
+    uploads = await cursor.to_list(length=limit)
+    total = await db.uploads.count_documents(query)
+    return uploads, total
+
+CONTENT_TYPES = {
+    ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+    ".gif": "image/gif", ".webp": "image/webp", ".svg": "image/svg+xml",
+    ".pcap": "application/vnd.tcpdump.pcap", ".pcapng": "application/vnd.tcpdump.pcap",
+    ".log": "text/plain", ".txt": "text/plain", ".json": "application/json",
+    ".zip": "application/zip", ".gz": "application/gzip", ".pdf": "application/pdf"
+}
+
+async def reconcile(db):
+    """Rebuild catalog state from what is in storage.
+
+    - files in the legacy flat directory move into the blob store, keeping
+      their filename as the user-facing name
+    - blobs stored under <sha256><ext> keys move to plain <sha256> keys
+    - stored blobs without a catalog entry get one (named after the blob)
+    - catalog entries whose blob is missing are dropped
+    - blob reference counts are recomputed from the catalog
+    """
+    stats = {"migrated": 0, "rekeyed": 0, "registered": 0, "dropped": 0, "blobs": 0}
+    await ensure_indexes(db)
+
+    if os.path.isdir(LEGACY_DIR):
+        for filename in os.listdir(LEGACY_DIR):
+            path = os.path.join(LEGACY_DIR, filename)
+            if filename.startswith(".") or not os.path.isfile(path):
+                continue
+            if await db.uploads.find_one({"name": filename}, {"_id": 1}):
+                continue
+            ext = os.path.splitext(filename)[1].lower()
+            digest = await run_in_threadpool(hash_file, path)
+            stat = os.stat(path)
+            temp_path = os.path.join(TEMP_DIR, uuid.uuid4().hex)
+            await run_in_threadpool(os.replace, path, temp_path)
+            await commit(db, temp_path, digest, stat.st_size, CONTENT_TYPES.get(ext), filename, filename)
+            await db.uploads.update_one({"name": filename}, {"$set": {"createdAt": datetime.utcfromtimestamp(stat.st_mtime)}})
+            stats["migrated"] += 1
+
+    for old_key in [key for key in await storage.list_keys() if is_blob_name(key) and key != blob_key(key)]:
+        new_key = blob_key(old_key)
+        if not await storage.exists(new_key):
+            temp_path = os.path.join(TEMP_DIR, uuid.uuid4().hex)
+            await run_in_threadpool(shutil.copyfile, await storage.local_copy(old_key), temp_path)
+            await storage.put_file(temp_path, new_key, CONTENT_TYPES.get(os.path.splitext(old_key)[1]))
+        await db.uploads.update_many({"blob": old_key}, {"$set": {"blob": new_key}})
+        await storage.delete(old_key)
+        stats["rekeyed"] += 1
+
+    on_disk = {key for key in await storage.list_keys() if is_blob_name(key)}
+    referenced = set(await db.uploads.distinct("blob"))
+
+    for key in on_disk - referenced:
+        # Keys carry no extension; recover one from the type recorded for the blob, if any
+        blob = await db.upload_blobs.find_one({"_id": key}) or {}
+        content_type = blob.get("contentType")
+        ext = next((ext for ext, known in CONTENT_TYPES.items() if known == content_type), "")
+        width, height = await run_in_threadpool(read_dimensions, await storage.local_copy(key))
+        stat = await storage.stat(key)
+        await db.uploads.insert_one({
+            "name": f"{key}{ext}",
+            "blob": key,
+            "hash": key[:64],
+            "originalName": f"{key}{ext}",
+            "size": stat["size"],
+            "contentType": content_type,
+            "width": width,
+            "height": height,
+            "uploadedBy": None,
+            "createdAt": stat["modified"]
+        })
+        stats["registered"] += 1
+
+    missing = list(referenced - on_disk)
+    if missing:
+        result = await db.uploads.delete_many({"blob": {"$in": missing}})
+        stats["dropped"] = result.deleted_count
+
+    counts = await db.uploads.aggregate([
+        {"$group": {"_id": "$blob", "refCount": {"$sum": 1}, "size": {"$first": "$size"},
+                    "contentType": {"$first": "$contentType"}, "width": {"$first": "$width"},
+                    "height": {"$first": "$height"}, "createdAt": {"$min": "$createdAt"}}}
+    ]).to_list(length=None)
+    keys = []
+    for blob in counts:
+        key = blob.pop("_id")
+        keys.append(key)
+        await db.upload_blobs.update_one({"_id": key}, {"$set": blob}, upsert=True)
+    await db.upload_blobs.delete_many({"_id": {"$nin": keys}})
+    stats["blobs"] = len(keys)
+    return stats
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Upload store maintenance")
+    parser.add_argument("command", choices=["reconcile"])
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+        db = client[os.environ.get("DB_NAME", "havosec")]
+        stats = await reconcile(db)
+        client.close()
+        print(f"✓ Upload catalog reconciled: {stats}")
+
+    asyncio.run(main())
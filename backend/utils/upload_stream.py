@@ -0,0 +1,155 @@
+"""Streaming multipart parsing for the upload endpoints.
+
+`File(...)` parameters make Starlette spool every file in the request to a
+SpooledTemporaryFile before the handler runs, so a per-file size limit only
+applies once the whole body has been received, and the spool is then copied
+into the blob store a second time. receive_files() reads request.stream()
+itself: each file part is hashed and written straight to its own temp file
+in the upload store as it arrives, and a part that goes over the size limit
+(or has a disallowed extension) stops being written at once. The total body
+size is bounded by UploadLimitRoute, which counts bytes as they are received.
+"""
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+import hashlib
+import os
+import uuid
+
+from utils.upload_store import TEMP_DIR
+
+class StreamedFile:
+    """One file part: where it was written, or why it was rejected"""
+
+    def __init__(self, filename, content_type):
+        self.filename = filename
+        self.content_type = content_type
+        self.temp_path = None
+        self.digest = None
+        self.size = 0
+        # None, "type" (extension not allowed) or "size" (over max_file_size)
+        self.rejected = None
+        self._out = None
+        self._hasher = hashlib.sha256()
+
+def _open_temp():
+    path = os.path.join(TEMP_DIR, uuid.uuid4().hex)
+    return path, open(path, "wb")
+
+def _write(part, chunk):
+    part._out.write(chunk)
+    part._hasher.update(chunk)
+
+def _discard(part):
+    if part._out:
+        part._out.close()
+        part._out = None
+    if part.temp_path and os.path.exists(part.temp_path):
+        os.remove(part.temp_path)
+    part.temp_path = None
+
+def discard(files):
+    """Remove the temp files of parts that were not committed"""
+    for part in files:
+        _discard(part)
+
+async def receive_files(request: Request, max_file_size, max_files, allowed_extensions=None):
+    """Parse a multipart body into temp files; other form fields are ignored.
+
+    Parts with no filename are skipped. Raises HTTPException(400) for a
+    malformed body or more than `max_files` files.
+    """
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    files = []
+    # Parser callbacks are synchronous; file I/O for each fed chunk happens after parser.write
+    events = []
+    headers = {}
+    header = [b"", b""]
+
+    def on_header_field(data, start, end):
+        header[0] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header[1] += data[start:end]
+
+    def on_header_end():
+        headers[header[0].lower()] = header[1]
+        header[0] = header[1] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition"))
+        filename = options.get(b"filename")
+        part = None
+        if filename is not None:
+            part = StreamedFile(
+                filename.decode("utf-8", "replace"),
+                headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+            )
+        headers.clear()
+        events.append(("begin", part))
+
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+
+    current = None
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except Exception:
+                raise HTTPException(status_code=400, detail="Malformed multipart body")
+            for kind, value in events:
+                if kind == "begin":
+                    current = value
+                    if current is None:
+                        continue
+                    files.append(current)
+                    if len(files) > max_files:
+                        raise HTTPException(status_code=400, detail=f"Too many files. Maximum is {max_files} per request")
+                    ext = os.path.splitext(current.filename)[1].lower()
+                    if allowed_extensions is not None and ext not in allowed_extensions:
+                        current.rejected = "type"
+                    else:
+                        current.temp_path, current._out = await run_in_threadpool(_open_temp)
+                elif kind == "data":
+                    if current is None or current.rejected:
+                        continue
+                    current.size += len(value)
+                    if current.size > max_file_size:
+                        current.rejected = "size"
+                        await run_in_threadpool(_discard, current)
+                    else:
+                        await run_in_threadpool(_write, current, value)
+                elif current is not None:
+                    if not current.rejected:
+                        await run_in_threadpool(current._out.close)
+                        current._out = None
+                        current.digest = current._hasher.hexdigest()
+                    current = None
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        await run_in_threadpool(discard, files)
+        raise
+
+    if current is not None:
+        # Body ended in the middle of a part
+        await run_in_threadpool(discard, files)
+        raise HTTPException(status_code=400, detail="Malformed multipart body")
+    return files
@@ -0,0 +1,60 @@
+"""Start-up work that runs after the server is already accepting connections.
+
+Index checks, cache loads and the first search index build are passed in as
+named steps and run concurrently in the background. A failing step is retried
+with backoff until it succeeds. /api/health/ready reports 503 until every step
+is done; /api/health/live only says the process is up.
+"""
+import asyncio
+import time
+
+WARMUP_MAX_BACKOFF = 30
+
+class Warmup:
+    def __init__(self):
+        self.steps = []
+        self.pending = set()
+        self.failures = {}
+        self.task = None
+        self.ready = False
+
+    async def _run_step(self, name, step):
+        delay = 1
+        while True:
+            try:
+                await step()
+                break
+            except Exception as e:
+                self.failures[name] = str(e)
+                print(f"✗ Warmup step {name} failed: {e}; retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WARMUP_MAX_BACKOFF)
+        self.failures.pop(name, None)
+        self.pending.discard(name)
+
+    async def _run(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_step(name, step) for name, step in self.steps))
+        self.ready = True
+        print(f"✓ Warmup finished in {time.perf_counter() - started:.2f}s")
+
+    def start(self, steps):
+        """Run `steps`, (name, async callable taking no arguments) pairs, in the background"""
+        self.steps = steps
+        self.ready = False
+        self.pending = {name for name, _ in self.steps}
+        self.task = asyncio.create_task(self._run())
+
+    def status(self):
+        return {"ready": self.ready, "pending": sorted(self.pending), "failures": self.failures}
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+warmup = Warmup()
@@ -0,0 +1,331 @@
+"""Async load test for the HavoSec API.
+
+    python benchmarks/loadtest.py --start-server --seed --duration 30 \\
+        --mix browse=40,login=5,dashboard=40,ingest=10 --ws-clients 200 \\
+        --output results.json --baseline benchmarks/baseline.json
+
+--seed drops and refills a dedicated database (DB_NAME, default havosec_bench)
+with realistic volumes; --start-server runs uvicorn against it on --port.
+Without them the test targets --base-url and expects an already seeded
+database. Either way nothing is sent before /api/health/ready answers 200.
+
+Each scenario in --mix gets that many virtual users, each looping one
+iteration after another (closed loop) for --duration seconds. --ws-clients
+notification sockets stay open for the whole run, spread over --ws-users
+seeded users. The `ingest` scenario pushes notifications to those users, and
+their delivery latency is reported as "WS notification delivery".
+
+Per endpoint we report throughput, errors and p50/p95/p99/max latency. With
+--baseline, any endpoint whose p95 grew, or whose throughput fell, by more
+than --tolerance is reported as a regression and the exit status is 1.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from time import perf_counter
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+
+import bcrypt
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from scenarios import BENCH_PASSWORD, SCENARIOS, websocket_listener
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+from utils.event_generator import EventModel
+BENCH_EMAIL = "bench-user-{}@bench.havosec.test"
+# Differences below this are noise on any machine, whatever the percentage
+NOISE_FLOOR_MS = 2.0
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, name, seconds, ok):
+        if ok:
+            self.latencies[name].append(seconds * 1000)
+        else:
+            self.errors[name] += 1
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank: the smallest value with at least pct% of samples at or below it
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return round(sorted_values[rank], 2)
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for name in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = sorted(recorder.latencies[name])
+        errors = recorder.errors[name]
+        total = len(values) + errors
+        endpoints[name] = {
+            "count": total,
+            "errors": errors,
+            "errorRate": round(errors / total, 4) if total else 0,
+            "rps": round(total / elapsed, 2),
+            "mean": round(sum(values) / len(values), 2) if values else None,
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": round(values[-1], 2) if values else None
+        }
+    return endpoints
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline` as human-readable strings"""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline["endpoints"].get(name)
+        if not previous or not previous["count"] or not current["count"]:
+            continue
+        if current["p95"] is not None and previous["p95"] is not None:
+            if current["p95"] > previous["p95"] * (1 + tolerance) and current["p95"] - previous["p95"] > NOISE_FLOOR_MS:
+                regressions.append(f"{name}: p95 {previous['p95']}ms -> {current['p95']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['rps']}/s -> {current['rps']}/s")
+        if current["errorRate"] > previous["errorRate"] + 0.01:
+            regressions.append(f"{name}: error rate {previous['errorRate']:.2%} -> {current['errorRate']:.2%}")
+    return regressions
+
+def print_table(endpoints):
+    print(f"{'endpoint':<40} {'count':>8} {'err':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, s in endpoints.items():
+        cells = [s[key] if s[key] is not None else "-" for key in ("p50", "p95", "p99", "max")]
+        print(f"{name:<40} {s['count']:>8} {s['errors']:>6} {s['rps']:>8} " + " ".join(f"{c:>8}" for c in cells))
+
+async def seed(db, scale):
+    """Replace the benchmark database contents with generated data"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    for name in ("users", "blog_posts", "security_events", "notifications", "demo_requests", "client_companies", "stats"):
+        await db[name].drop()
+
+    # One hash for every user: logins still pay the full bcrypt cost, seeding doesn't
+    password = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt()).decode()
+    users = [{
+        "email": BENCH_EMAIL.format(i),
+        "password": password,
+        "firstName": f"Bench{i}",
+        "lastName": "User",
+        "company": f"Bench Company {i % 200}",
+        "role": "viewer",
+        "isActive": True,
+        "emailVerified": True,
+        "createdAt": now - timedelta(days=rng.randint(0, 365))
+    } for i in range(int(1000 * scale))]
+    user_ids = (await db.users.insert_many(users)).inserted_ids
+
+    categories = ["Technology", "Best Practices", "Threat Intel", "Compliance", "News"]
+    posts = [{
+        "title": f"Benchmark Post {i}",
+        "slug": f"benchmark-post-{i}",
+        "content": "<p>" + "Security research and analysis. " * rng.randint(50, 400) + "</p>",
+        "excerpt": "Generated for load testing.",
+        "author": "HavoSec Team",
+        "category": rng.choice(categories),
+        "tags": rng.sample(["AI", "Cloud", "Zero Trust", "SOC", "Malware", "Phishing"], 2),
+        "status": "published" if rng.random() < 0.9 else "draft",
+        "createdAt": now - timedelta(minutes=i * 37),
+        "updatedAt": now - timedelta(minutes=i * 37)
+    } for i in range(int(500 * scale))]
+    await db.blog_posts.insert_many(posts)
+
+    events = int(50000 * scale)
+    model = EventModel(seed=42, days=30)
+    batch = []
+    for hour, count in enumerate(model.bucket_counts(events)):
+        batch.extend(model.generate_hour(hour, count))
+        if len(batch) >= 5000:
+            await db.security_events.insert_many(batch)
+            batch = []
+    if batch:
+        await db.security_events.insert_many(batch)
+
+    notifications = [{
+        "userId": str(rng.choice(user_ids)),
+        "type": rng.choice(["info", "warning", "security"]),
+        "title": "Benchmark notification",
+        "message": "Generated for load testing",
+        "read": rng.random() < 0.7,
+        "createdAt": now - timedelta(minutes=rng.randint(0, 20000))
+    } for _ in range(int(20000 * scale))]
+    await db.notifications.insert_many(notifications)
+
+    await db.demo_requests.insert_many([{
+        "firstName": "Bench", "lastName": str(i), "email": f"demo-{i}@bench.havosec.test",
+        "company": f"Prospect {i}", "status": rng.choice(["pending", "contacted", "scheduled", "completed"]),
+        "createdAt": now - timedelta(hours=i)
+    } for i in range(int(2000 * scale))])
+    await db.client_companies.insert_many([{
+        "name": f"Client {i}", "email": f"client-{i}@bench.havosec.test", "industry": rng.choice(categories),
+        "status": "active", "createdAt": now - timedelta(days=i % 365)
+    } for i in range(int(500 * scale))])
+    print(f"✓ Seeded {len(users)} users, {len(posts)} posts, {events} events")
+
+async def load_fixture(db):
+    users = await db.users.find({"email": {"$regex": r"^bench-user-"}}, {"email": 1}).to_list(length=None)
+    if not users:
+        raise SystemExit("✗ No benchmark users found; run with --seed")
+    return {
+        "emails": [u["email"] for u in users],
+        "user_ids": [str(u["_id"]) for u in users],
+        "posts": await db.blog_posts.count_documents({"status": "published"})
+    }
+
+def start_server(port, mongo_url, db_name):
+    env = {**os.environ, "MONGO_URL": mongo_url, "DB_NAME": db_name}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+
+async def wait_until_ready(base_url, timeout=300):
+    """Wait for /api/health/ready: until the server's warm-up (sequence backfill,
+    search index, ...) has finished, requests would measure warm-up contention"""
+    deadline = perf_counter() + timeout
+    pending = None
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while perf_counter() < deadline:
+            try:
+                response = await client.get("/api/health/ready")
+                if response.status_code == 200:
+                    return
+                pending = response.json().get("pending")
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"✗ Server at {base_url} was not ready within {timeout}s (pending: {pending})")
+
+class Context:
+    def __init__(self, client, fixture, args):
+        self.client = client
+        self.fixture = fixture
+        self.recorder = Recorder()
+        self.sent = {}
+        self.think_time = args.think_time
+        self.poll_interval = args.poll_interval
+        self.ws_users = max(1, args.ws_users)
+        self.ws_url = args.base_url.replace("http", "ws", 1)
+
+async def run(args, fixture):
+    mix = {name: int(count) for name, count in (item.split("=") for item in args.mix.split(","))}
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"✗ Unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(SCENARIOS)})")
+
+    limits = httpx.Limits(max_connections=sum(mix.values()) * 4 + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        ctx = Context(client, fixture, args)
+        stop = asyncio.Event()
+
+        listeners = [
+            asyncio.create_task(websocket_listener(ctx, fixture["user_ids"][i % ctx.ws_users], stop))
+            for i in range(args.ws_clients)
+        ]
+
+        async def virtual_user(scenario):
+            vu = {}
+            while not stop.is_set():
+                await scenario(ctx, vu)
+
+        users = [asyncio.create_task(virtual_user(SCENARIOS[name])) for name, count in mix.items() for _ in range(count)]
+        started = perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*users, *listeners)
+        elapsed = perf_counter() - started
+
+    return {
+        "meta": {
+            "startedAt": datetime.utcnow().isoformat(),
+            "durationSeconds": round(elapsed, 2),
+            "mix": mix,
+            "wsClients": args.ws_clients,
+            "wsUsers": ctx.ws_users,
+            "baseUrl": args.base_url,
+            "git": git_revision()
+        },
+        "endpoints": summarize(ctx.recorder, elapsed)
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args):
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    server = None
+    try:
+        if args.seed:
+            if "bench" not in args.db_name:
+                raise SystemExit(f"✗ Refusing to reseed {args.db_name!r}; use a database name containing 'bench'")
+            await seed(db, args.scale)
+        fixture = await load_fixture(db)
+        if args.start_server:
+            server = start_server(args.port, args.mongo_url, args.db_name)
+        await wait_until_ready(args.base_url)
+        if args.warmup:
+            warmup = argparse.Namespace(**{**vars(args), "duration": args.warmup})
+            await run(warmup, fixture)
+        results = await run(args, fixture)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        client.close()
+
+    print_table(results["endpoints"])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"✗ {line}")
+        if regressions:
+            return 1
+        print(f"✓ No regressions against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+
+    parser = argparse.ArgumentParser(description="Load test the HavoSec API")
+    parser.add_argument("--base-url", help="defaults to http://127.0.0.1:<port>")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--start-server", action="store_true", help="run uvicorn against the benchmark database")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.environ.get("BENCH_DB_NAME", "havosec_bench"))
+    parser.add_argument("--seed", action="store_true", help="drop and regenerate the benchmark data first")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for seeded volumes")
+    parser.add_argument("--mix", default="browse=20,login=5,dashboard=20,ingest=5", help="scenario=virtual users,...")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run (and discarded) before measuring")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between browse/ingest iterations")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="pause between dashboard polls")
+    parser.add_argument("--ws-clients", type=int, default=100)
+    parser.add_argument("--ws-users", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed fractional p95/throughput change")
+    args = parser.parse_args()
+    args.base_url = args.base_url or f"http://127.0.0.1:{args.port}"
+
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,113 @@
+"""Load-test scenarios.
+
+Each scenario is an async function running ONE iteration for a virtual user;
+the runner calls it in a loop until the test ends. `vu` is a per-virtual-user
+dict for state such as a login token, `ctx` is shared by all users.
+"""
+from time import perf_counter
+import asyncio
+import json
+import random
+import uuid
+
+import httpx
+import websockets
+
+BENCH_PASSWORD = "BenchPass123!"
+# Seconds a notification's send time is kept for matching its pushes
+SENT_TTL = 30
+
+async def timed(ctx, name, method, url, **kwargs):
+    """Send one request and record its latency under `name`; returns the response or None on failure"""
+    started = perf_counter()
+    try:
+        response = await ctx.client.request(method, url, **kwargs)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        response, ok = None, False
+    ctx.recorder.add(name, perf_counter() - started, ok)
+    return response if ok else None
+
+async def login(ctx, vu):
+    """Login storm: clients signing in back to back (bcrypt dominated)"""
+    email = random.choice(ctx.fixture["emails"])
+    await timed(ctx, "POST /api/auth/login", "POST", "/api/auth/login",
+                json={"email": email, "password": BENCH_PASSWORD})
+
+async def browse(ctx, vu):
+    """Public site visitor: content, blog list, trending, a few posts"""
+    await timed(ctx, "GET /api/content/", "GET", "/api/content/")
+    offset = random.randrange(0, max(ctx.fixture["posts"], 1), 10)
+    response = await timed(ctx, "GET /api/blog/", "GET", "/api/blog/",
+                           params={"status": "published", "limit": 10, "offset": offset})
+    await timed(ctx, "GET /api/blog/trending", "GET", "/api/blog/trending")
+    if response is not None:
+        posts = response.json()["posts"]
+        for post in random.sample(posts, min(2, len(posts))):
+            await timed(ctx, "GET /api/blog/{id}", "GET", f"/api/blog/{post['id']}")
+    await asyncio.sleep(ctx.think_time)
+
+async def dashboard(ctx, vu):
+    """Signed-in client polling the security dashboard"""
+    if "token" not in vu:
+        email = random.choice(ctx.fixture["emails"])
+        response = await timed(ctx, "POST /api/auth/login", "POST", "/api/auth/login",
+                               json={"email": email, "password": BENCH_PASSWORD})
+        if response is None:
+            await asyncio.sleep(1)
+            return
+        vu["token"] = response.json()["token"]
+    headers = {"Authorization": f"Bearer {vu['token']}"}
+    await asyncio.gather(
+        timed(ctx, "GET /api/dashboard/overview", "GET", "/api/dashboard/overview", headers=headers),
+        timed(ctx, "GET /api/dashboard/attack-insights", "GET", "/api/dashboard/attack-insights", headers=headers),
+        timed(ctx, "GET /api/dashboard/activity-logs", "GET", "/api/dashboard/activity-logs", headers=headers),
+        timed(ctx, "GET /api/notifications/", "GET", "/api/notifications/", headers=headers,
+              params={"unread_only": True})
+    )
+    await asyncio.sleep(ctx.poll_interval)
+
+async def ingest(ctx, vu):
+    """Security notifications written and pushed to connected users"""
+    user_id = random.choice(ctx.fixture["user_ids"][:ctx.ws_users])
+    marker = uuid.uuid4().hex
+    now = perf_counter()
+    ctx.sent[marker] = now
+    # Oldest first; several sockets may receive one marker, so they expire rather than being popped
+    while now - next(iter(ctx.sent.values())) > SENT_TTL:
+        del ctx.sent[next(iter(ctx.sent))]
+    await timed(ctx, "POST /api/notifications/", "POST", "/api/notifications/", json={
+        "userId": user_id,
+        "type": "security",
+        "title": f"bench {marker}",
+        "message": "Synthetic load-test event"
+    })
+    await asyncio.sleep(ctx.think_time)
+
+SCENARIOS = {
+    "browse": browse,
+    "login": login,
+    "dashboard": dashboard,
+    "ingest": ingest
+}
+
+async def websocket_listener(ctx, user_id, stop):
+    """One open notification socket recording how long each pushed notification took to arrive"""
+    url = ctx.ws_url + f"/api/notifications/ws/{user_id}"
+    started = perf_counter()
+    try:
+        async with websockets.connect(url, open_timeout=30) as ws:
+            ctx.recorder.add("WS connect", perf_counter() - started, True)
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = perf_counter()
+                message = json.loads(raw)
+                title = (message.get("data") or {}).get("title") or ""
+                sent = ctx.sent.get(title.removeprefix("bench "))
+                if message.get("type") == "notification" and sent is not None:
+                    ctx.recorder.add("WS notification delivery", received - sent, True)
+    except (OSError, websockets.WebSocketException, asyncio.TimeoutError):
+        ctx.recorder.add("WS connect", perf_counter() - started, False)
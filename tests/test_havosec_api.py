@@ -29,6 +29,25 @@ class TestHealthCheck:
         assert data["service"] == "HavoSec API"
         print("✓ Health check passed")
 
+    def test_liveness_and_readiness(self):
+        """Test /api/health/live and /api/health/ready once warm-up has finished"""
+        response = requests.get(f"{BASE_URL}/api/health/live")
+        assert response.status_code == 200
+        assert response.json()["status"] == "alive"
+
+        response = requests.get(f"{BASE_URL}/api/health/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        print("✓ Liveness and readiness passed")
+    
+    def test_metrics_endpoint(self):
+        """Test /api/metrics exposes per-route latency histograms"""
+        requests.get(f"{BASE_URL}/api/health")
+        response = requests.get(f"{BASE_URL}/api/metrics")
+        assert response.status_code == 200
+        assert 'http_request_duration_seconds_count{route="/api/health",method="GET",status="200"}' in response.text
+        print("✓ Metrics endpoint passed")
+
 
 class TestPublicContentAPI:
     """Public content API tests - fetching dynamic website content"""
@@ -94,6 +113,17 @@ class TestPublicBlogAPI:
         data = response.json()
         assert len(data["posts"]) <= 2
         print(f"✓ Pagination works: got {len(data['posts'])} posts with limit=2")
+    
+    def test_get_trending_posts(self):
+        """Test GET /api/blog/trending returns posts ranked by decayed view score"""
+        response = requests.get(f"{BASE_URL}/api/blog/trending?limit=3")
+        assert response.status_code == 200
+        data = response.json()
+        assert "posts" in data
+        assert len(data["posts"]) <= 3
+        scores = [post["trendingScore"] for post in data["posts"]]
+        assert scores == sorted(scores, reverse=True)
+        print(f"✓ Trending posts: {len(data['posts'])}")
 
 
 class TestClientAuth:
@@ -393,6 +423,98 @@ class TestAdminBlogManagement:
         assert verify_response.status_code == 404
         print("✓ Post deletion verified")
 
+    def test_admin_reads_are_not_views(self, admin_token):
+        """Test GET /api/admin/blog/{id} does not count as a public view"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        payload = {"title": f"TEST_Views Post {int(time.time())}", "content": "<p>Views test</p>", "status": "published"}
+        post_id = requests.post(f"{BASE_URL}/api/admin/blog/", headers=headers, json=payload).json()["post"]["id"]
+
+        for _ in range(3):
+            assert requests.get(f"{BASE_URL}/api/admin/blog/{post_id}", headers=headers).status_code == 200
+        # Longer than the view counter's flush interval
+        time.sleep(3)
+        post = requests.get(f"{BASE_URL}/api/admin/blog/{post_id}", headers=headers).json()["post"]
+        assert post.get("views", 0) == 0
+        assert "trending" not in post
+        print("✓ Admin reads left views unchanged")
+
+        requests.delete(f"{BASE_URL}/api/admin/blog/{post_id}", headers=headers)
+
+    def test_duplicate_titles_get_unique_slugs(self, admin_token):
+        """Test posts with the same title get distinct slugs and resolve by slug"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        payload = {"title": f"TEST_Slug Post {int(time.time())}", "content": "<p>Slug test</p>"}
+        first = requests.post(f"{BASE_URL}/api/admin/blog/", headers=headers, json=payload).json()["post"]
+        second = requests.post(f"{BASE_URL}/api/admin/blog/", headers=headers, json=payload).json()["post"]
+        assert first["slug"] != second["slug"]
+        assert second["slug"].startswith(first["slug"])
+        
+        response = requests.get(f"{BASE_URL}/api/blog/{second['slug']}")
+        assert response.status_code == 200
+        assert response.json()["post"]["id"] == second["id"]
+        print(f"✓ Unique slugs: {first['slug']}, {second['slug']}")
+        
+        # Renaming keeps the old slug as a redirect
+        requests.put(f"{BASE_URL}/api/admin/blog/{first['id']}", headers=headers, json={"title": payload["title"] + " Renamed"})
+        response = requests.get(f"{BASE_URL}/api/blog/{first['slug']}")
+        assert response.status_code == 200
+        assert response.json()["redirectTo"] != first["slug"]
+        print(f"✓ Old slug redirects to {response.json()['redirectTo']}")
+        
+        for post in (first, second):
+            requests.delete(f"{BASE_URL}/api/admin/blog/{post['id']}", headers=headers)
+
+    def test_rendered_html_is_sanitized(self, admin_token):
+        """Test javascript: URLs and script/style/svg elements are stripped from contentHtml"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        payload = {
+            "title": f"TEST_Sanitize Post {int(time.time())}",
+            "content": (
+                '<p>Safe <a href="javascript:alert(1)">click</a> <a href="https://havosec.com">site</a></p>'
+                '<script>alert(1)</script><style>p { color: red }</style>'
+                '<svg onload="alert(1)"><text>svg text</text></svg>'
+                '<img src="JaVaScRiPt:alert(1)" onerror="alert(1)">'
+            )
+        }
+        post = requests.post(f"{BASE_URL}/api/admin/blog/", headers=headers, json=payload).json()["post"]
+        html = post["contentHtml"]
+        assert "javascript" not in html.lower()
+        assert 'href="https://havosec.com"' in html
+        for dropped in ("<script", "alert(1)", "<style", "color: red", "<svg", "svg text", "onerror", "onload"):
+            assert dropped not in html
+        print("✓ Rendered HTML sanitized")
+
+        requests.delete(f"{BASE_URL}/api/admin/blog/{post['id']}", headers=headers)
+
+    def test_legacy_html_is_not_rendered_as_markdown(self, admin_token):
+        """Test indented HTML posts keep their markup instead of turning into code blocks"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        payload = {
+            "title": f"TEST_Legacy HTML Post {int(time.time())}",
+            "content": "<div>\n    <p>Indented paragraph</p>\n\n    <ul>\n        <li>Item *one*</li>\n    </ul>\n</div>"
+        }
+        post = requests.post(f"{BASE_URL}/api/admin/blog/", headers=headers, json=payload).json()["post"]
+        assert post["contentFormat"] == "html"
+        assert "<pre>" not in post["contentHtml"] and "&lt;p&gt;" not in post["contentHtml"]
+        assert "<p>Indented paragraph</p>" in post["contentHtml"]
+        assert "<li>Item *one*</li>" in post["contentHtml"]
+        print("✓ Legacy HTML rendered without markdown")
+
+        # Switching the post to markdown re-renders the stored content
+        response = requests.put(f"{BASE_URL}/api/admin/blog/{post['id']}", headers=headers, json={
+            "content": "## Heading\n\nSome *emphasis*", "contentFormat": "markdown"
+        })
+        assert response.status_code == 200
+        updated = requests.get(f"{BASE_URL}/api/admin/blog/{post['id']}", headers=headers).json()["post"]
+        assert '<h2 id="heading">Heading</h2>' in updated["contentHtml"]
+        assert "<em>emphasis</em>" in updated["contentHtml"]
+        print("✓ Markdown post rendered")
+
+        response = requests.put(f"{BASE_URL}/api/admin/blog/{post['id']}", headers=headers, json={"contentFormat": "rst"})
+        assert response.status_code == 400
+
+        requests.delete(f"{BASE_URL}/api/admin/blog/{post['id']}", headers=headers)
+
 
 class TestDemoRequests:
     """Demo request submission tests"""
@@ -419,6 +541,192 @@ class TestDemoRequests:
         return data["id"]
 
 
+class TestAdminBulkOperations:
+    """Admin bulk update/delete tests"""
+
+    @pytest.fixture
+    def admin_token(self):
+        """Get admin token for authenticated requests"""
+        response = requests.post(f"{BASE_URL}/api/admin/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        return response.json()["token"]
+
+    def test_bulk_update_demo_requests(self, admin_token):
+        """Test POST /api/admin/bulk/demo-requests dry run and update"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        ids = [
+            requests.post(f"{BASE_URL}/api/demo/", json={"email": f"bulk_{i}_{int(time.time())}@test.com"}).json()["id"]
+            for i in range(3)
+        ]
+        payload = {"action": "update", "ids": ids, "set": {"status": "contacted"}, "dryRun": True}
+        response = requests.post(f"{BASE_URL}/api/admin/bulk/demo-requests", headers=headers, json=payload)
+        assert response.status_code == 200
+        assert response.json()["matched"] == 3
+        assert all(item["status"] == "wouldUpdate" for item in response.json()["results"])
+
+        payload["dryRun"] = False
+        response = requests.post(f"{BASE_URL}/api/admin/bulk/demo-requests", headers=headers, json=payload)
+        assert response.json()["succeeded"] == 3
+        print(f"✓ Bulk updated {len(ids)} demo requests")
+
+        response = requests.post(f"{BASE_URL}/api/admin/bulk/demo-requests", headers=headers, json={"action": "delete", "ids": ids})
+        assert response.json()["succeeded"] == 3
+
+    def test_bulk_requires_admin(self):
+        """Test bulk endpoints reject unauthenticated calls"""
+        response = requests.post(f"{BASE_URL}/api/admin/bulk/clients", json={"action": "delete", "filter": {"isActive": False}})
+        assert response.status_code == 401
+
+
+class TestAdminImport:
+    """Admin bulk import tests"""
+
+    @pytest.fixture
+    def admin_token(self):
+        """Get admin token for authenticated requests"""
+        response = requests.post(f"{BASE_URL}/api/admin/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        return response.json()["token"]
+
+    def import_clients(self, headers, email):
+        csv = f"name,email,industry\nTEST_Import Co,{email},Finance\n".encode()
+        response = requests.post(f"{BASE_URL}/api/admin/import/clients", headers=headers,
+                                 files={"file": ("clients.csv", csv, "text/csv")})
+        assert response.status_code == 202
+        for _ in range(50):
+            job = requests.get(f"{BASE_URL}{response.json()['statusUrl']}", headers=headers).json()
+            if job["state"] not in ("queued", "running"):
+                return job
+            time.sleep(0.1)
+        raise AssertionError("Import did not finish")
+
+    def test_mixed_case_reimport_updates_client(self, admin_token):
+        """Test re-importing a client with a differently cased email updates it instead of adding one"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        email = f"import_{int(time.time())}@test.com"
+
+        job = self.import_clients(headers, email)
+        assert job["state"] == "completed"
+        assert job["inserted"] == 1
+
+        job = self.import_clients(headers, email.replace("import_", "Import_").upper())
+        assert job["state"] == "completed"
+        assert job["inserted"] == 0
+        assert job["updated"] == 1
+
+        clients = requests.get(f"{BASE_URL}/api/admin/clients/", headers=headers, params={"limit": 1000}).json()["clients"]
+        matching = [c for c in clients if c["email"].lower() == email]
+        assert [c["email"] for c in matching] == [email]
+        print(f"✓ Re-import updated {email}")
+
+        requests.delete(f"{BASE_URL}/api/admin/clients/{matching[0]['id']}", headers=headers)
+
+
+class TestAdminSearch:
+    """Admin search tests"""
+
+    @pytest.fixture
+    def admin_token(self):
+        """Get admin token for authenticated requests"""
+        response = requests.post(f"{BASE_URL}/api/admin/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        return response.json()["token"]
+
+    def test_search_finds_new_demo_request(self, admin_token):
+        """Test GET /api/admin/search/ sees a demo request as soon as it is created"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        company = f"TEST_Searchable {int(time.time())}"
+        demo_id = requests.post(f"{BASE_URL}/api/demo/", json={"email": "search@test.com", "company": company}).json()["id"]
+
+        response = requests.get(f"{BASE_URL}/api/admin/search/", headers=headers, params={"q": company.lower()})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results[0]["id"] == demo_id
+        assert results[0]["type"] == "demoRequest"
+        print(f"✓ Search found {company} in {response.json()['tookMs']}ms")
+
+        requests.delete(f"{BASE_URL}/api/admin/demo-requests/{demo_id}", headers=headers)
+
+
+class TestRequestProfiler:
+    """On-demand request profiler tests"""
+
+    @pytest.fixture
+    def admin_token(self):
+        """Get admin token for authenticated requests"""
+        response = requests.post(f"{BASE_URL}/api/admin/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        return response.json()["token"]
+
+    def test_profile_header(self, admin_token):
+        """Test X-Profile with an admin token stores a retrievable profile"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = requests.get(f"{BASE_URL}/api/content/", headers={"X-Profile": admin_token})
+        assert response.status_code == 200
+        profile_id = response.headers["X-Profile-Id"]
+
+        response = requests.get(f"{BASE_URL}/api/admin/diagnostics/profiles/{profile_id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["profiles"][0]["type"] == "sampled"
+
+        response = requests.get(f"{BASE_URL}/api/admin/diagnostics/profiles/{profile_id}",
+                                headers=headers, params={"format": "collapsed"})
+        assert response.status_code == 200
+        print(f"✓ Profile {profile_id} retrievable")
+
+    def test_unprofiled_request(self):
+        """Test requests without a valid X-Profile token are not profiled"""
+        response = requests.get(f"{BASE_URL}/api/content/", headers={"X-Profile": "invalid"})
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+        print("✓ Invalid profile token ignored")
+
+
+class TestAdmissionControl:
+    """Admission control / load shedding tests"""
+
+    def test_admission_status(self):
+        """Test admission classes are reported to admins"""
+        login = requests.post(f"{BASE_URL}/api/admin/auth/login", json={
+            "email": ADMIN_EMAIL,
+            "password": ADMIN_PASSWORD
+        })
+        headers = {"Authorization": f"Bearer {login.json()['token']}"}
+        response = requests.get(f"{BASE_URL}/api/admin/diagnostics/admission", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert {"auth", "dashboard", "uploads", "public"} <= set(data["classes"])
+        print(f"✓ Admission classes: {', '.join(data['classes'])}")
+
+    def test_burst_is_shed_or_served(self):
+        """Test a burst of logins gets answers or fast 503s with Retry-After"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        def login(_):
+            return requests.post(f"{BASE_URL}/api/auth/login", json={
+                "email": "nobody@example.com",
+                "password": "WrongPass123!"
+            })
+
+        with ThreadPoolExecutor(max_workers=48) as pool:
+            responses = list(pool.map(login, range(48)))
+        for response in responses:
+            assert response.status_code in (401, 503)
+            if response.status_code == 503:
+                assert int(response.headers["Retry-After"]) >= 1
+        assert requests.get(f"{BASE_URL}/api/health").status_code == 200
+        shed = sum(r.status_code == 503 for r in responses)
+        print(f"✓ Burst of {len(responses)} logins, {shed} shed")
+
+
 class TestClientDashboard:
     """Client dashboard API tests (requires authentication)"""
     
@@ -498,6 +806,61 @@ class TestClientDashboard:
         assert "services" in data["systemHealth"]
         print(f"✓ System health: {len(data['systemHealth']['services'])} services monitored")
 
+    def test_batch_dashboard_load(self, client_token):
+        """Test POST /api/batch returns every dashboard widget in one response"""
+        headers = {"Authorization": f"Bearer {client_token}"}
+        paths = ["/api/dashboard/overview", "/api/dashboard/defense-metrics",
+                 "/api/dashboard/activity-logs?limit=10", "/api/notifications/"]
+        response = requests.post(f"{BASE_URL}/api/batch/", headers=headers, json={
+            "requests": [{"id": path, "path": path} for path in paths]
+        })
+        assert response.status_code == 200
+        items = response.json()["responses"]
+        assert [item["id"] for item in items] == paths
+        assert all(item["status"] == 200 for item in items)
+        overview = items[0]["body"]["overview"]
+        assert overview["events7d"] == items[1]["body"]["defenseMetrics"]["totalDetected"]
+        print(f"✓ Batch returned {len(items)} widgets")
+
+    def test_activity_logs_since_cursor(self, client_token):
+        """Test polling activity logs with since returns 204 when nothing is new"""
+        headers = {"Authorization": f"Bearer {client_token}"}
+        response = requests.get(f"{BASE_URL}/api/dashboard/activity-logs", headers=headers)
+        assert response.status_code == 200
+        cursor = response.json()["cursor"]
+        response = requests.get(f"{BASE_URL}/api/dashboard/activity-logs", headers=headers, params={"since": cursor})
+        assert response.status_code == 204
+        response = requests.get(f"{BASE_URL}/api/dashboard/activity-logs", headers=headers, params={"since": "bogus"})
+        assert response.status_code == 400
+        print("✓ Activity log polling with since")
+
+    def test_notifications_since_cursor(self, client_token):
+        """Test polling notifications with since returns only new ones"""
+        headers = {"Authorization": f"Bearer {client_token}"}
+        response = requests.get(f"{BASE_URL}/api/notifications/", headers=headers)
+        assert response.status_code == 200
+        cursor = response.json()["cursor"]
+        response = requests.get(f"{BASE_URL}/api/notifications/", headers=headers, params={"since": cursor})
+        assert response.status_code == 204
+
+        user_id = requests.get(f"{BASE_URL}/api/auth/me", headers=headers).json()["user"]["id"]
+        requests.post(f"{BASE_URL}/api/notifications/", json={"userId": user_id, "title": "Delta", "message": "New"})
+        response = requests.get(f"{BASE_URL}/api/notifications/", headers=headers, params={"since": cursor})
+        assert response.status_code == 200
+        data = response.json()
+        assert [n["title"] for n in data["notifications"]] == ["Delta"]
+        assert data["cursor"] > cursor
+        print("✓ Notification polling returns only new notifications")
+
+    def test_batch_without_auth(self):
+        """Test batched sub-requests report their own 401"""
+        response = requests.post(f"{BASE_URL}/api/batch/", json={
+            "requests": [{"path": "/api/dashboard/overview"}, {"path": "/api/health"}]
+        })
+        assert response.status_code == 200
+        assert [item["status"] for item in response.json()["responses"]] == [401, 200]
+        print("✓ Batch without auth returns per-item status")
+
 
 class TestAdminDashboard:
     """Admin dashboard tests"""
@@ -0,0 +1,101 @@
+"""
+Since-Polling Cursor Tests
+Tests for: sequence reservations, inserts committed out of order, stale reservations
+Runs against an in-process MongoDB mock (mongomock-motor); no server needed.
+"""
+import pytest
+import asyncio
+import os
+import sys
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from utils import high_water  # noqa: E402
+from utils.high_water import current_cursor, find_since, insert_sequenced, reserve_seq  # noqa: E402
+
+
+@pytest.fixture
+def events():
+    """An empty collection and a fresh set of marks"""
+    high_water.high_water.marks.clear()
+    return mongomock_motor.AsyncMongoMockClient()["havosec_test"].security_events
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class TestOutOfOrderCommits:
+    """A seq reserved first but inserted last must still be delivered"""
+
+    def test_both_inserts_delivered(self, events):
+        """Test a poll holds its cursor below an open reservation, then returns both documents"""
+        async def scenario():
+            async with reserve_seq(events) as first:
+                # Reserved after `first` but committed before it
+                await insert_sequenced(events, {"name": "second"}, "events")
+                assert await find_since(events, "events", {}, "0", 50) is None
+                assert await current_cursor(events, "events") == "0"
+                await events.insert_one({"name": "first", "seq": first})
+
+            docs, cursor, has_more = await find_since(events, "events", {}, "0", 50)
+            return [doc["name"] for doc in docs], cursor, has_more
+
+        names, cursor, has_more = run(scenario())
+        assert names == ["first", "second"]
+        assert cursor == "2"
+        assert not has_more
+        print("✓ Both out-of-order inserts delivered")
+
+    def test_poll_stops_below_open_reservation(self, events):
+        """Test documents below the lowest open reservation are returned and the rest wait"""
+        async def scenario():
+            await insert_sequenced(events, {"name": "a"}, "events")
+            async with reserve_seq(events) as held:
+                await insert_sequenced(events, {"name": "c"}, "events")
+                docs, cursor, _ = await find_since(events, "events", {}, "0", 50)
+                assert [doc["name"] for doc in docs] == ["a"]
+                assert cursor == "1"
+                await events.insert_one({"name": "b", "seq": held})
+            docs, cursor, _ = await find_since(events, "events", {}, cursor, 50)
+            return [doc["name"] for doc in docs], cursor
+
+        names, cursor = run(scenario())
+        assert names == ["b", "c"]
+        assert cursor == "3"
+        print("✓ Poll resumed from below the open reservation")
+
+    def test_reservations_are_closed(self, events):
+        """Test finished and failed inserts leave no open reservations behind"""
+        async def scenario():
+            for i in range(3):
+                await insert_sequenced(events, {"i": i}, "events")
+            with pytest.raises(RuntimeError):
+                async with reserve_seq(events, 5):
+                    raise RuntimeError("insert failed")
+            return await events.database.sequences.find_one({"_id": events.name})
+
+        counter = run(scenario())
+        assert counter["seq"] == 8
+        assert counter["open"] == []
+        assert high_water.settled_seq(counter) == 8
+        print("✓ No open reservations left")
+
+    def test_stale_reservation_stops_holding_back(self, events, monkeypatch):
+        """Test a reservation whose writer never finished is ignored after the timeout"""
+        async def scenario():
+            counters = events.database.sequences
+            token, update = high_water._reservation(1)
+            await counters.update_one({"_id": events.name}, update, upsert=True)
+            await insert_sequenced(events, {"name": "after"}, "events")
+            assert await find_since(events, "events", {}, "0", 50) is None
+            monkeypatch.setattr(high_water, "SEQ_RESERVATION_TIMEOUT", -1)
+            docs, cursor, _ = await find_since(events, "events", {}, "0", 50)
+            return [doc["name"] for doc in docs], cursor
+
+        names, cursor = run(scenario())
+        assert names == ["after"]
+        assert cursor == "2"
+        print("✓ Stale reservation ignored")
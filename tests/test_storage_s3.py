@@ -0,0 +1,152 @@
+"""
+S3 Storage Tests
+Tests for: presigned uploads, upload verification (/api/uploads/complete), node-local cache
+Runs against an in-process S3 mock (moto); no server or bucket needed.
+"""
+import pytest
+import base64
+import hashlib
+import io
+import os
+import sys
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+requests = pytest.importorskip("requests")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from utils.storage import S3Storage  # noqa: E402
+
+BUCKET = "havosec-test-blobs"
+
+
+def png_bytes(width=40, height=30):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    """An S3Storage backed by a moto bucket, with its cache in a temp dir"""
+    monkeypatch.setenv("S3_BUCKET", BUCKET)
+    monkeypatch.setenv("S3_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.delenv("S3_ENDPOINT_URL", raising=False)
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield S3Storage(cache_root=str(tmp_path / "cache"), cache_max_bytes=10 * 1024)
+
+
+def put_object(storage, key, data, checksum=True):
+    extra = {"ChecksumSHA256": base64.b64encode(hashlib.sha256(data).digest()).decode()} if checksum else {}
+    storage.client.put_object(Bucket=BUCKET, Key=storage.object_key(key), Body=data, **extra)
+
+
+class TestPresignedUpload:
+    """Browser uploads straight to the bucket with a presigned PUT"""
+
+    def test_presigned_put_stores_object(self, s3):
+        """Test the presigned URL and headers accept the announced bytes"""
+        data = png_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+        upload = s3.presign_put(sha256, "image/png", len(data), sha256)
+        assert upload["method"] == "PUT"
+        assert upload["headers"]["x-amz-checksum-sha256"] == base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+        response = requests.put(upload["url"], data=data, headers=upload["headers"])
+        assert response.status_code == 200
+        assert s3._stat(sha256)["size"] == len(data)
+        print("✓ Presigned PUT stored the object")
+
+    def test_presigned_get_points_at_object(self, s3):
+        """Test the presigned download URL serves the stored bytes"""
+        data = png_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+        put_object(s3, sha256, data)
+        response = requests.get(s3.presign_get(sha256))
+        assert response.status_code == 200
+        assert response.content == data
+        print("✓ Presigned GET served the object")
+
+
+class TestCompleteVerification:
+    """What /api/uploads/complete checks before registering an uploaded object"""
+
+    def test_verify_matching_object(self, s3):
+        """Test an object with the announced size and hash passes, with or without an S3 checksum"""
+        data = png_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+        put_object(s3, sha256, data)
+        assert s3._verify(sha256, len(data), sha256)
+
+        other = png_bytes(20, 10)
+        other_sha256 = hashlib.sha256(other).hexdigest()
+        put_object(s3, other_sha256, other, checksum=False)
+        assert s3._verify(other_sha256, len(other), other_sha256)
+        print("✓ Matching objects verified")
+
+    def test_verify_rejects_missing_or_mismatched_object(self, s3):
+        """Test a missing object, a wrong size or different bytes under the key are rejected"""
+        data = png_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+        assert not s3._verify(sha256, len(data), sha256)
+
+        # Different bytes of the same size under the announced key, uploaded without a checksum
+        tampered = bytes([data[0] ^ 0xFF]) + data[1:]
+        put_object(s3, sha256, tampered, checksum=False)
+        assert not s3._verify(sha256, len(data), sha256)
+        assert not s3._verify(sha256, len(data) + 1, sha256)
+        print("✓ Mismatched objects rejected")
+
+    def test_dimensions_read_from_object(self, s3):
+        """Test image dimensions come from the stored object via the node-local copy"""
+        from utils.images import read_dimensions
+        data = png_bytes(64, 48)
+        sha256 = hashlib.sha256(data).hexdigest()
+        put_object(s3, sha256, data)
+        assert read_dimensions(s3._download(sha256)) == (64, 48)
+        print("✓ Dimensions read from the object")
+
+
+class TestLocalCache:
+    """Node-local copies of S3 objects"""
+
+    def test_delete_evicts_cached_copy(self, s3):
+        """Test deleting a blob removes the object and its cached copy"""
+        data = png_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+        put_object(s3, sha256, data)
+        path = s3._download(sha256)
+        assert os.path.exists(path)
+
+        s3._delete(sha256)
+        assert not os.path.exists(path)
+        assert s3._stat(sha256) is None
+        assert s3.cache_bytes == 0
+        print("✓ Delete evicted the cached copy")
+
+    def test_cache_stays_under_cap(self, s3):
+        """Test the least recently used copies are evicted once the cache passes its cap"""
+        keys = []
+        for i in range(6):
+            data = os.urandom(3 * 1024)
+            sha256 = hashlib.sha256(data).hexdigest()
+            put_object(s3, sha256, data)
+            keys.append(sha256)
+
+        s3._download(keys[0])
+        for key in keys[1:]:
+            s3._download(key)
+            os.utime(s3.cache_path(keys[0]))  # keys[0] stays the most recently used
+            s3._download(keys[0])
+
+        cached = [key for key in keys if os.path.exists(s3.cache_path(key))]
+        assert sum(os.path.getsize(s3.cache_path(key)) for key in cached) <= s3.cache_max_bytes
+        assert keys[0] in cached
+        assert keys[1] not in cached
+        assert s3.cache_bytes == sum(os.path.getsize(s3.cache_path(key)) for key in cached)
+        print(f"✓ Cache kept {len(cached)} of {len(keys)} copies under the cap")